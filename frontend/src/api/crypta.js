@@ -39,6 +39,14 @@ export const fetchFilterResults = (base, params = {}) => {
     }
     return apiClient.get('/filter_results/', { params: q });
 };
+// Filter tree and grid together, in one round trip through the gateway.
+export const fetchDatabaseView = (base, params = {}) => {
+    const q = { base, ...params };
+    if (q.filters !== undefined) {
+        q.filters = JSON.stringify(q.filters);
+    }
+    return apiClient.get('/database_view/', { params: q });
+};
 export const fetchEmailCountPreview = (payload) =>
     apiClient.post('/email-count-preview/', payload);
 export const uploadTempFile = (file) => {
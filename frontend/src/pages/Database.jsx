@@ -13,8 +13,7 @@ import Dropdown from '../components/Dropdown';
 import SearchBar from '../components/SearchBar';
 import FilterTree from '../components/FilterTree';
 import { 
-    fetchFilterTree,
-    fetchFilterResults,
+    fetchDatabaseView,
     fetchEmailCountPreview,
     uploadTempFile,
     sendEmailRequest,
@@ -57,10 +56,9 @@ const Database = () => {
         const baseChanged = base !== prevBase;
         setPrevBase(base);
         const timeout = setTimeout(() => {
-            fetchFilterTree(base, { filters: appliedFilters })
-                .then(res => setFilterTree(res.data.filter_tree));
-            fetchFilterResults(base, { filters: appliedFilters })
+            fetchDatabaseView(base, { filters: appliedFilters })
                 .then(res => {
+                    setFilterTree(res.data.filter_tree);
                     const grid = res.data.grid;
                     setUnfilteredRows(grid.data);
                     setRows(grid.data);
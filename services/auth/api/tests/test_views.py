@@ -1,10 +1,17 @@
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from datetime import timedelta
 from unittest.mock import patch
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
 import pyotp
 
-from api.models import Role, Organization, CryptaGroup, QueryPermission, User, UserProfile
+from api.models import Role, Organization, CryptaGroup, QueryPermission, Token, User, UserProfile
 
 class DetailViewTests(APITestCase):
     def setUp(self):
@@ -98,3 +105,44 @@ class MicrosoftCallbackViewTests(APITestCase):
             resp = self.client.get(url, {'code': 'abc'})
             self.assertEqual(resp.status_code, status.HTTP_200_OK)
             self.assertTrue(User.objects.filter(sso_id='123').exists())
+
+class TokenKeyViewTests(APITestCase):
+    def test_shared_keys_are_not_published(self):
+        resp = self.client.get(reverse('token-jwks'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {'keys': []})
+
+    def test_public_keys_are_published(self):
+        public = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+        pem = public.public_bytes(serialization.Encoding.PEM,
+                                  serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        with override_settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'ALGORITHM': 'RS256',
+                                           'VERIFYING_KEY': pem}):
+            resp = self.client.get(reverse('token-jwks'))
+        [key] = resp.data['keys']
+        self.assertEqual((key['kty'], key['alg'], key['use']), ('RSA', 'RS256', 'sig'))
+        self.assertTrue(key['kid'])
+
+    @override_settings(REVOCATION_LIST_KEY='gateway-key')
+    def test_revoked_lists_unexpired_revoked_tokens(self):
+        user = User.objects.create_user(username="tester", email="t@e.com", password="pass")
+        later = timezone.now() + timedelta(hours=1)
+        access = AccessToken.for_user(user)
+        Token.objects.create(user=user, token=access['jti'], type=Token.TokenType.ACCESS,
+                             expiration=later, revoked=True)
+        Token.objects.create(user=user, type=Token.TokenType.ACCESS, expiration=later)
+        Token.objects.create(user=user, type=Token.TokenType.ACCESS, revoked=True,
+                             expiration=timezone.now() - timedelta(hours=1))
+        resp = self.client.get(reverse('token-revoked'), HTTP_X_SERVICE_KEY='gateway-key')
+        # The ids must compare equal to the jti claim of the revoked token.
+        self.assertEqual(resp.data, {'revoked': [access['jti']]})
+
+    def test_revoked_list_requires_the_service_key(self):
+        url = reverse('token-revoked')
+        with override_settings(REVOCATION_LIST_KEY='gateway-key'):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get(url, HTTP_X_SERVICE_KEY='guess').status_code,
+                             status.HTTP_403_FORBIDDEN)
+        with override_settings(REVOCATION_LIST_KEY=''):
+            self.assertEqual(self.client.get(url, HTTP_X_SERVICE_KEY='').status_code,
+                             status.HTTP_403_FORBIDDEN)
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import secrets
@@ -6,7 +7,7 @@ from django.utils import timezone
 from django.shortcuts import redirect
 from rest_framework import generics, status, serializers
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, BasePermission
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
@@ -16,6 +17,7 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 import pyotp
 import msal
+from jwt import algorithms as jwt_algorithms
 
 from .models import (
     Role,
@@ -45,6 +47,11 @@ GATEWAY_CALLBACK_URL = os.getenv('GATEWAY_CALLBACK_URL', 'http://localhost')
 User = get_user_model()
 
 
+def _key_id(pem):
+    """Stable id of a public key, sent as ``kid`` in the JWK set."""
+    return hashlib.sha256(pem.strip().encode()).hexdigest()[:16]
+
+
 # Create your views here.
 class LoggingTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Serializer that logs login attempts and stores issued tokens."""
@@ -216,6 +223,57 @@ class DecodeTokenView(generics.GenericAPIView):
             logger.debug('Decoded Token: %s', verified.payload)
             return Response(verified.payload)
 
+class PublicKeysView(generics.GenericAPIView):
+    """Publish the keys that verify access tokens as a JWK set.
+
+    Only public keys are published: with a symmetric algorithm the set is
+    empty and the gateway verifies with its copy of the shared key."""
+
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        logger.debug('Public key set requested')
+        algorithm = settings.SIMPLE_JWT.get('ALGORITHM', 'HS256')
+        pems = [settings.SIMPLE_JWT.get('VERIFYING_KEY')] + settings.JWT_PREVIOUS_VERIFYING_KEYS
+        keys = []
+        if not algorithm.startswith('HS'):
+            backend = jwt_algorithms.get_default_algorithms()[algorithm]
+            for pem in filter(None, pems):
+                jwk = backend.to_jwk(backend.prepare_key(pem), as_dict=True)
+                jwk.update(kid=_key_id(pem), alg=algorithm, use='sig')
+                keys.append(jwk)
+        return Response({'keys': keys})
+
+
+class IsGatewayService(BasePermission):
+    """Allow callers sending ``settings.REVOCATION_LIST_KEY`` in ``X-Service-Key``."""
+
+    def has_permission(self, request, view):
+        expected = settings.REVOCATION_LIST_KEY
+        given = request.headers.get('X-Service-Key', '')
+        if not expected:
+            logger.warning('REVOCATION_LIST_KEY is not set; refusing %s', request.path)
+            return False
+        return secrets.compare_digest(given.encode(), expected.encode())
+
+
+class RevokedTokensView(generics.GenericAPIView):
+    """List the ids (``jti``) of revoked tokens that have not expired yet.
+
+    Ids are given as simplejwt writes the ``jti`` claim: 32 hex digits, not
+    the hyphenated form of the stored UUID. Only the gateway may read the
+    list, since it names the tokens of every signed-out user."""
+
+    authentication_classes = []
+    permission_classes = [IsGatewayService]
+
+    def get(self, request, *args, **kwargs):
+        logger.debug('Revoked token list requested')
+        revoked = Token.objects.filter(revoked=True, expiration__gt=timezone.now()) \
+            .values_list('token', flat=True)
+        return Response({'revoked': [jti.hex for jti in revoked]})
+
+
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -90,8 +90,23 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # HS256 signs with a key shared with the gateway (AUTH_JWT_SIGNING_KEY
+    # there). With RS256/ES256 set JWT_SIGNING_KEY to the private PEM and
+    # JWT_VERIFYING_KEY to the public PEM; the gateway then fetches the
+    # public key from /api/v1/tokens/jwks/.
+    "ALGORITHM": os.getenv('JWT_ALGORITHM', 'HS256'),
+    "SIGNING_KEY": os.getenv('JWT_SIGNING_KEY') or SECRET_KEY,
+    "VERIFYING_KEY": os.getenv('JWT_VERIFYING_KEY', ''),
 }
 
+# Public PEMs of retired signing keys, comma separated. They stay in the
+# published key set until the tokens they signed have expired.
+JWT_PREVIOUS_VERIFYING_KEYS = [key for key in os.getenv('JWT_PREVIOUS_VERIFYING_KEYS', '').split(',') if key.strip()]
+
+# Key the gateway sends in X-Service-Key (AUTH_REVOCATION_LIST_KEY there) to
+# read /api/v1/tokens/revoked/. The list is refused to everyone while unset.
+REVOCATION_LIST_KEY = os.getenv('REVOCATION_LIST_KEY', '')
+
 # Application definition
 
 #Added api app, rest_framework and corsheaders
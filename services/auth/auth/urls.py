@@ -32,6 +32,8 @@ from api.views import (
     QueryPermissionDetailView,
     LoggingTokenObtainPairView,
     DecodeTokenView,
+    PublicKeysView,
+    RevokedTokensView,
     VerifyMfaView,
     MicrosoftLoginView,
     MicrosoftCallbackView,
@@ -68,6 +70,8 @@ urlpatterns = [
     path('api/v1/tokens/retrieve/', LoggingTokenObtainPairView.as_view(), name='get_token'),
     path('api/v1/tokens/refresh/', TokenRefreshView.as_view(), name='refresh_token'),
     path('api/v1/tokens/decode/', DecodeTokenView.as_view(), name='decode_token'),
+    path('api/v1/tokens/jwks/', PublicKeysView.as_view(), name='token-jwks'),
+    path('api/v1/tokens/revoked/', RevokedTokensView.as_view(), name='token-revoked'),
     path('api/v1/sso/login/', MicrosoftLoginView.as_view(), name='sso-login'),
     path('api/v1/sso/callback/', MicrosoftCallbackView.as_view(), name='sso-callback'),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
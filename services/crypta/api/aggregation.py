@@ -0,0 +1,213 @@
+"""Grouped metrics over the yearly parish statistics.
+
+``StatusAnimarum``, ``Offertory``, ``OctoberMassCount``,
+``RegisteredHousehold`` and ``Ethnicity`` rows each belong to one church
+and one year. Both entry points restrict them to the churches of an
+already filtered ``Location`` queryset and leave the arithmetic to the
+database:
+
+* :func:`aggregate` answers every requested metric of one source with a
+  single ``GROUP BY`` query;
+* :func:`time_series` groups by year and church (or vicariate, or the
+  whole diocese) and sends one ``UNION ALL`` of grouped branches, one per
+  metric, so a multi-year history is a single round trip.
+
+Metrics are named ``<source>.<field>:<function>``, e.g.
+``offertory.income:sum`` or ``october.total:avg``.
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models import Avg, F, FloatField, Max, Min, Sum, Value
+from django.db.models import fields as model_fields
+from django.db.models.functions import Cast
+
+from .models import Ethnicity, OctoberMassCount, Offertory, RegisteredHousehold, StatusAnimarum
+
+logger = logging.getLogger('api')
+
+# Per source: (model, foreign key to the church).
+SOURCES = {
+    "status_animarum": (StatusAnimarum, "lkp_church_id"),
+    "offertory": (Offertory, "lkp_church_id"),
+    "october": (OctoberMassCount, "lkp_church_id"),
+    "households": (RegisteredHousehold, "lkp_church_id"),
+    "ethnicity": (Ethnicity, "lkp_location_id"),
+}
+
+# Computed fields, per source.
+DERIVED_FIELDS = {
+    "october": {"total": F("week1") + F("week2") + F("week3") + F("week4")},
+}
+
+# Paths from the church, except for ``year`` which every source carries.
+DIMENSIONS = {
+    "vicariate": "lkp_vicariate_id__name",
+    "county": "lkp_county_id__name",
+    "year": None,
+    "type": "type",
+}
+
+FUNCTIONS = {"sum": Sum, "avg": Avg, "min": Min, "max": Max}
+
+# Per rollup: (key path, label path) from the church; ``None`` is the diocese.
+ROLLUPS = {
+    "church": ("pk", "name"),
+    "vicariate": ("lkp_vicariate_id", "lkp_vicariate_id__name"),
+    "diocese": None,
+}
+
+DIOCESE = "diocese"
+
+_NUMERIC_FIELDS = (model_fields.IntegerField, model_fields.DecimalField, model_fields.FloatField)
+
+
+def _metric_fields(source):
+    """Return ``{name: expression}`` of the fields a metric may read."""
+    model, _ = SOURCES[source]
+    found = {
+        field.name: F(field.name)
+        for field in model._meta.concrete_fields
+        if isinstance(field, _NUMERIC_FIELDS) and not field.is_relation and not field.primary_key
+    }
+    found.update(DERIVED_FIELDS.get(source, {}))
+    return found
+
+
+def parse_metric(name):
+    """Return ``(source, field, function)`` for a metric name.
+
+    Raises ``ValueError`` for anything outside the known sources, numeric
+    fields and functions."""
+    try:
+        path, func = name.rsplit(":", 1)
+        source, field = path.split(".", 1)
+    except ValueError:
+        raise ValueError(f"Metric {name!r} is not of the form source.field:function") from None
+    if source not in SOURCES:
+        raise ValueError(f"Unknown metric source {source!r}")
+    if field not in _metric_fields(source):
+        raise ValueError(f"Unknown metric field {source}.{field}")
+    if func not in FUNCTIONS:
+        raise ValueError(f"Unknown metric function {func!r}")
+    return source, field, func
+
+
+def _metric_expression(name):
+    source, field, func = parse_metric(name)
+    return source, FUNCTIONS[func](_metric_fields(source)[field])
+
+
+def _rows(source, locations):
+    """Rows of ``source`` belonging to the churches in ``locations``."""
+    model, church = SOURCES[source]
+    return model.objects.filter(**{f"{church}__in": locations.values("pk")}).order_by()
+
+
+def _number(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def aggregate(locations, group_by, metrics):
+    """Return one row per ``group_by`` value holding every metric.
+
+    ``locations`` is the permission and user filtered ``Location``
+    queryset. Groups without rows for a source report ``None`` for its
+    metrics. Rows are ordered by group, with the ``None`` group last."""
+    if group_by not in DIMENSIONS:
+        raise ValueError(f"Unknown group_by dimension {group_by!r}")
+    if not metrics:
+        raise ValueError("At least one metric is required")
+
+    by_source = {}
+    for name in dict.fromkeys(metrics):
+        source, expression = _metric_expression(name)
+        by_source.setdefault(source, {})[name] = expression
+
+    groups = {}
+    for source, annotations in by_source.items():
+        path = DIMENSIONS[group_by]
+        dimension = "year" if path is None else f"{SOURCES[source][1]}__{path}"
+        # Aliases cannot hold "." or ":"; map them back afterwards.
+        aliases = {f"metric_{idx}": name for idx, name in enumerate(annotations)}
+        rows = (_rows(source, locations)
+                .values(dimension)
+                .annotate(**{alias: annotations[name] for alias, name in aliases.items()}))
+        for row in rows:
+            group = groups.setdefault(row[dimension], dict.fromkeys(metrics))
+            for alias, name in aliases.items():
+                group[name] = _number(row[alias])
+        logger.debug('Aggregated %d %s groups by %s', len(rows), source, group_by)
+
+    ordered = sorted(groups, key=lambda key: (key is None, str(key) if key is not None else ""))
+    return [{group_by: key, **groups[key]} for key in ordered]
+
+
+def _is_integer(source, field):
+    if field in DERIVED_FIELDS.get(source, {}):
+        # Derived fields add up integer counts.
+        return True
+    model, _ = SOURCES[source]
+    return isinstance(model._meta.get_field(field), model_fields.IntegerField)
+
+
+def _series_branch(locations, idx, name, rollup, year_from, year_to):
+    """Grouped ``(key, label, year, metric, value)`` rows of one metric."""
+    source, expression = _metric_expression(name)
+    church = SOURCES[source][1]
+    rows = _rows(source, locations)
+    if year_from:
+        rows = rows.filter(year__gte=year_from)
+    if year_to:
+        rows = rows.filter(year__lte=year_to)
+    if ROLLUPS[rollup] is None:
+        series = {"series_key": Value(DIOCESE), "series_label": Value("Diocese")}
+    else:
+        key, label = ROLLUPS[rollup]
+        series = {"series_key": F(f"{church}__{key}"), "series_label": F(f"{church}__{label}")}
+    return (rows
+            .annotate(**series, series_year=F("year"))
+            .values("series_key", "series_label", "series_year")
+            .annotate(metric=Value(idx), value=Cast(expression, FloatField())))
+
+
+def time_series(locations, metrics, rollup="church", year_from=None, year_to=None):
+    """Return a columnar history of ``metrics`` for the churches in ``locations``.
+
+    The payload holds the sorted ``years`` once and, per church, vicariate
+    or the diocese (``rollup``), one list per metric aligned with them;
+    years without rows are ``None``. Years are ``choice_year`` values such
+    as ``2023-24`` and the range is inclusive."""
+    if rollup not in ROLLUPS:
+        raise ValueError(f"Unknown rollup {rollup!r}")
+    metrics = list(dict.fromkeys(metrics))
+    if not metrics:
+        raise ValueError("At least one metric is required")
+
+    branches = [_series_branch(locations, idx, name, rollup, year_from, year_to)
+                for idx, name in enumerate(metrics)]
+    union = branches[0].union(*branches[1:], all=True) if len(branches) > 1 else branches[0]
+    rows = list(union)
+    logger.debug('Time series of %d metrics returned %d grouped rows', len(metrics), len(rows))
+
+    # Values come back as floats; restore whole counts and sums.
+    integral = [func != "avg" and _is_integer(source, field)
+                for source, field, func in map(parse_metric, metrics)]
+    years = sorted({row["series_year"] for row in rows})
+    position = {year: idx for idx, year in enumerate(years)}
+    series = {}
+    for row in rows:
+        key, metric, value = row["series_key"], row["metric"], row["value"]
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {
+                "key": key,
+                "label": row["series_label"],
+                "values": {name: [None] * len(years) for name in metrics},
+            }
+        if value is not None and integral[metric]:
+            value = int(value)
+        entry["values"][metrics[metric]][position[row["series_year"]]] = value
+
+    ordered = sorted(series.values(), key=lambda entry: (entry["label"] is None, entry["label"] or ""))
+    return {"years": years, "metrics": metrics, "rollup": rollup, "series": ordered}
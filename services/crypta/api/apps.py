@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from .signals import (
+            connect_cache_invalidation, connect_grid_row_invalidation, connect_search_index,
+            connect_typeahead_invalidation, create_search_schema,
+        )
+
+        connect_cache_invalidation()
+        connect_grid_row_invalidation()
+        connect_search_index()
+        connect_typeahead_invalidation()
+        post_migrate.connect(create_search_schema, sender=self,
+                             dispatch_uid='crypta-search-schema')
@@ -0,0 +1,179 @@
+"""Batched facet counts for the filter tree.
+
+The filter tree used to run one ``values(path).annotate(Count(path))``
+query per entry in ``DYNAMIC_FILTER_FIELDS``, each re-running the
+permission and user-filter joins. :func:`compute_facets` instead selects the
+filtered ids once into a CTE and answers every facet from it:
+
+* paths that only follow forward relations are single-valued, so on
+  backends with ``GROUPING SETS`` (PostgreSQL, SQL Server) they are counted
+  together in one pass over the filtered rows;
+* every other path becomes one grouped branch of a ``UNION ALL`` query.
+
+That is at most two round trips no matter how many facets are configured.
+"""
+import logging
+
+from django.db import connections
+from django.db.models import CharField, Count, F, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.db.models.fields import BooleanField
+
+logger = logging.getLogger('api')
+
+FACET_IDS = 'facet_ids'
+GROUPING_SETS_VENDORS = ('postgresql', 'microsoft')
+
+
+def _resolve_path(model, path):
+    """Return ``(field, multi_valued)`` for a ``__`` separated ``path``."""
+    multi = False
+    field = None
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        if field.one_to_many or field.many_to_many:
+            multi = True
+        if field.is_relation:
+            model = field.related_model
+    return field, multi
+
+
+def facet_models(model, paths):
+    """Return ``(models, through_models)`` whose rows can change a facet count.
+
+    ``models`` holds ``model`` and every model the ``paths`` pass through;
+    ``through_models`` the auto-created tables behind many-to-many hops.
+    """
+    models, through = {model}, set()
+    for path in paths:
+        current = model
+        for part in path.split('__'):
+            field = current._meta.get_field(part)
+            if not field.is_relation:
+                break
+            if field.many_to_many:
+                rel = field if field.auto_created else field.remote_field
+                through.add(rel.through)
+            current = field.related_model
+            models.add(current)
+    return models, through
+
+
+def _restore(field, raw):
+    """Convert a value that was cast to text back to ``field``'s Python type."""
+    if raw is None:
+        return None
+    if isinstance(field, BooleanField):
+        if isinstance(raw, bool):
+            return raw
+        return str(raw).lower() in ('1', 't', 'true')
+    return field.to_python(raw)
+
+
+def _ids_cte(qs):
+    """Return ``(sql, params)`` for the ``WITH`` clause holding the filtered ids.
+
+    An unfiltered queryset needs no id set, so both parts are empty.
+    """
+    if not qs.query.where:
+        return '', []
+    ids_sql, ids_params = qs.values('pk').order_by().query.sql_with_params()
+    return f'WITH {FACET_IDS} (id) AS ({ids_sql}) ', ids_params
+
+
+def _facet_rows(model, cte):
+    """Rows of ``model`` restricted to the ids in the CTE, when there is one."""
+    rows = model._default_manager.all()
+    if cte[0]:
+        rows = rows.filter(pk__in=RawSQL(f'SELECT id FROM {FACET_IDS}', []))
+    return rows
+
+
+def _grouping_sets_counts(model, connection, cte, paths):
+    """Count single-valued ``paths`` in one ``GROUP BY GROUPING SETS`` pass."""
+    qn = connection.ops.quote_name
+    aliases = [f'f{idx}' for idx in range(len(paths))]
+    inner = (_facet_rows(model, cte)
+             .values(**{alias: F(path) for alias, path in zip(aliases, paths)})
+             .order_by())
+    inner_sql, inner_params = inner.query.sql_with_params()
+
+    cols = ', '.join(qn(a) for a in aliases)
+    flags = ', '.join(f'GROUPING({qn(a)})' for a in aliases)
+    sets = ', '.join(f'({qn(a)})' for a in aliases)
+    sql = (
+        f'{cte[0]}SELECT {cols}, {flags}, COUNT(*) FROM ({inner_sql}) facet_rows '
+        f'GROUP BY GROUPING SETS ({sets})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*cte[1], *inner_params])
+        rows = cursor.fetchall()
+
+    width = len(paths)
+    out = {path: [] for path in paths}
+    for row in rows:
+        for idx in range(width):
+            if row[width + idx] == 0:
+                out[paths[idx]].append((row[idx], row[-1]))
+                break
+    return out
+
+
+def _union_counts(model, connection, cte, paths, fields):
+    """Count ``paths`` with one ``UNION ALL`` of grouped branches."""
+    branches = [
+        _facet_rows(model, cte)
+        .annotate(
+            facet=Value(idx),
+            value=Cast(path, output_field=CharField(max_length=255)),
+        )
+        .values('facet', 'value')
+        .annotate(count=Count(path))
+        .order_by()
+        for idx, path in enumerate(paths)
+    ]
+    union = branches[0].union(*branches[1:], all=True) if len(branches) > 1 else branches[0]
+    union_sql, union_params = union.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{cte[0]}{union_sql}', [*cte[1], *union_params])
+        rows = cursor.fetchall()
+
+    out = {path: [] for path in paths}
+    for facet, value, count in rows:
+        path = paths[facet]
+        out[path].append((_restore(fields[path], value), count))
+    return out
+
+
+def compute_facets(qs, paths):
+    """Return ``{path: [(value, count), ...]}`` for every path over ``qs``.
+
+    ``None`` values are dropped and each path's buckets are sorted by value.
+    """
+    if qs.query.is_empty() or not paths:
+        return {path: [] for path in paths}
+
+    model = qs.model
+    connection = connections[qs.db]
+    fields, single, multi = {}, [], []
+    for path in paths:
+        fields[path], is_multi = _resolve_path(model, path)
+        (multi if is_multi else single).append(path)
+
+    cte = _ids_cte(qs)
+    counts = {}
+    if connection.vendor in GROUPING_SETS_VENDORS and len(single) > 1:
+        counts.update(_grouping_sets_counts(model, connection, cte, single))
+    else:
+        multi = single + multi
+    if multi:
+        counts.update(_union_counts(model, connection, cte, multi, fields))
+    logger.debug('Computed %d facets (%d via GROUPING SETS)', len(paths), len(paths) - len(multi))
+
+    result = {}
+    for path in paths:
+        buckets = [(val, cnt) for val, cnt in counts.get(path, []) if val is not None and cnt]
+        buckets.sort(key=lambda b: b[0])
+        result[path] = buckets
+    return result
@@ -0,0 +1,964 @@
+"""Builders for the flattened rows shown in the Database grid.
+
+Each builder reads only from the prefetch plan returned by
+:func:`prefetch_for_grid`, so building a page of rows costs a fixed number
+of queries no matter how many rows it holds. :func:`sql_grid_records`
+builds the same rows in one ``values()`` query instead."""
+import logging
+from datetime import date
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Prefetch, Q, Subquery
+
+from .constants import DISPLAY_TO_PATH, FIELD_CATEGORIES
+from .models import (
+    Assignment, CampusMinistry_Detail, Church_Detail, Church_Language,
+    Deacon_Detail, Hospital_Detail, Lay_Detail, Location, Location_Status,
+    MissionConnection, OctoberMassCount, Offertory, OtherEntity_Detail, Person,
+    Person_DegreeCertificate, Person_Email, Person_FacultiesGrant,
+    Person_Language, Person_Phone, Person_Relationship, Person_Status,
+    Person_Title, Priest_Detail, SchoolDetail, StatusAnimarum,
+)
+from .utilities.aggregates import StringAgg, encode_row, supports_string_agg
+from .utilities.semijoins import back_reference
+
+logger = logging.getLogger('api')
+
+PERSON_EMAIL_TYPES = ('Personal', 'Parish', 'Diocesan')
+PERSON_PHONE_TYPES = ('Cell', 'Home')
+
+
+def _name_in(field, names):
+    """Case-insensitive ``field IN names`` as a ``Q``."""
+    q = Q()
+    for name in names:
+        q |= Q(**{f"{field}__iexact": name})
+    return q
+
+
+def _by_name(prefetches):
+    """Key prefetch lookups by the attribute the row builders read."""
+    return {
+        p if isinstance(p, str) else (p.to_attr or p.prefetch_to): p
+        for p in prefetches
+    }
+
+
+def _person_grid_prefetches(today):
+    """Return the ``Prefetch`` plan backing the person grid columns.
+
+    Type and date conditions are pushed into the prefetch querysets and the
+    lookups each column formats are ``select_related``, so the rows are
+    partitioned in memory instead of being re-filtered per person."""
+    return _by_name([
+        Prefetch(
+            'person_email_set',
+            queryset=Person_Email.objects
+                .filter(_name_in('lkp_emailType_id__name', PERSON_EMAIL_TYPES))
+                .select_related('lkp_emailType_id'),
+            to_attr='grid_emails',
+        ),
+        Prefetch(
+            'person_phone_set',
+            queryset=Person_Phone.objects
+                .filter(_name_in('lkp_phoneType_id__name', PERSON_PHONE_TYPES))
+                .select_related('lkp_phoneType_id'),
+            to_attr='grid_phones',
+        ),
+        Prefetch(
+            'person_language_set',
+            queryset=Person_Language.objects
+                .select_related('lkp_language_id', 'lkp_languageProficiency_id'),
+            to_attr='grid_languages',
+        ),
+        Prefetch(
+            'person_degreecertificate_set',
+            queryset=Person_DegreeCertificate.objects
+                .select_related('lkp_degreeCertificate_id'),
+            to_attr='grid_degrees',
+        ),
+        Prefetch(
+            'person_facultiesgrant_set',
+            queryset=Person_FacultiesGrant.objects
+                .select_related('lkp_facultiesGrantType_id'),
+            to_attr='grid_faculties',
+        ),
+        Prefetch(
+            'person_status_set',
+            queryset=Person_Status.objects.select_related('lkp_status_id'),
+            to_attr='grid_statuses',
+        ),
+        Prefetch(
+            'person_title_set',
+            queryset=Person_Title.objects.select_related('lkp_title_id'),
+            to_attr='grid_titles',
+        ),
+        Prefetch(
+            'assignment_set',
+            queryset=Assignment.objects
+                .filter(date_assigned__lte=today)
+                .filter(Q(date_released__isnull=True) | Q(date_released__gte=today))
+                .select_related('lkp_assignmentType_id', 'lkp_location_id'),
+            to_attr='grid_assignments',
+        ),
+        Prefetch(
+            'first_person',
+            queryset=Person_Relationship.objects
+                .select_related('lkp_relationshipType_id', 'lkp_secondPerson_id'),
+            to_attr='grid_first_relationships',
+        ),
+        Prefetch(
+            'second_person',
+            queryset=Person_Relationship.objects
+                .select_related('lkp_relationshipType_id', 'lkp_firstPerson_id'),
+            to_attr='grid_second_relationships',
+        ),
+        Prefetch(
+            'priest_detail_set',
+            queryset=Priest_Detail.objects.select_related('lkp_placeOfBaptism_id'),
+            to_attr='grid_priest_details',
+        ),
+    ])
+
+
+def latest_per_church(model, church_field='lkp_church_id'):
+    """Return ``model`` rows restricted to each church's most recent year.
+
+    The correlated ``Subquery`` keeps this a single query when used as a
+    ``Prefetch`` queryset, instead of one ``order_by('-year').first()`` per
+    church. Years are ``'2024-25'`` style strings, so they sort as text."""
+    newest = (model.objects
+              .filter(**{church_field: OuterRef(church_field)})
+              .order_by('-year')
+              .values('year')[:1])
+    return model.objects.filter(year=Subquery(newest)).order_by(church_field, '-pk')
+
+
+def _location_grid_prefetches(today):
+    """Return the ``Prefetch`` plan backing the location grid columns."""
+    return _by_name([
+        "location_email_set",
+        "location_phone_set",
+        "social_outreach_program",
+        Prefetch(
+            'location_status_set',
+            queryset=Location_Status.objects.select_related('lkp_status_id'),
+            to_attr='grid_statuses',
+        ),
+        Prefetch(
+            'church_language_set',
+            queryset=Church_Language.objects.select_related('lkp_language_id'),
+            to_attr='grid_mass_languages',
+        ),
+        Prefetch(
+            'assignment_set',
+            queryset=Assignment.objects.select_related('lkp_assignmentType_id', 'lkp_person_id'),
+            to_attr='grid_assignments',
+        ),
+        Prefetch(
+            'mission',
+            queryset=MissionConnection.objects.select_related('lkp_parish_id'),
+            to_attr='grid_missions',
+        ),
+        Prefetch(
+            'parish',
+            queryset=MissionConnection.objects.select_related('lkp_mission_id'),
+            to_attr='grid_parishes',
+        ),
+        Prefetch(
+            'churchDetail_location',
+            queryset=Church_Detail.objects.order_by('pk'),
+            to_attr='grid_church_details',
+        ),
+        Prefetch(
+            'campusMinistry_location',
+            queryset=CampusMinistry_Detail.objects.order_by('pk'),
+            to_attr='grid_campus_ministries',
+        ),
+        Prefetch(
+            'hospital_location',
+            queryset=Hospital_Detail.objects.select_related('lkp_parishBoundary_id').order_by('pk'),
+            to_attr='grid_hospitals',
+        ),
+        Prefetch(
+            'school_location',
+            queryset=SchoolDetail.objects.order_by('pk'),
+            to_attr='grid_schools',
+        ),
+        Prefetch(
+            'offertory_church',
+            queryset=latest_per_church(Offertory),
+            to_attr='grid_latest_offertory',
+        ),
+        Prefetch(
+            'octoberCount_church',
+            queryset=latest_per_church(OctoberMassCount),
+            to_attr='grid_latest_october_count',
+        ),
+        Prefetch(
+            'statusAnimarum_church',
+            queryset=latest_per_church(StatusAnimarum),
+            to_attr='grid_latest_status_animarum',
+        ),
+    ])
+
+
+
+
+def _first(rows):
+    return rows[0] if rows else None
+
+
+# Returned by a column to leave its key out of the row, e.g. priest-only
+# columns on a person without a priest detail record.
+OMIT = object()
+
+# Child rows travel through ``StringAgg`` as text: fields are separated by
+# _UNIT, rows by _RECORD, and _NULL stands for ``NULL``.
+_NULL, _UNIT, _RECORD = "\x1d", "\x1f", "\x1e"
+
+
+class SQLColumn(NamedTuple):
+    """How the database computes a column for :func:`sql_grid_records`.
+
+    ``annotations(model, plan)`` returns the ``values()`` expressions the
+    column reads keyed by alias (columns reading the same alias share it),
+    and any ``FilteredRelation`` joins they go through; ``value(row)``
+    builds the cell from the resulting dict."""
+    annotations: Callable[[Any, Dict[str, Any]], Dict[str, Any]]
+    value: Callable[[Dict[str, Any]], Any]
+
+
+class GridColumn(NamedTuple):
+    """One display column of the grid.
+
+    ``value`` builds the cell from a prefetched row; ``requires`` names the
+    ``select_related`` fields, annotations and ``to_attr`` prefetches it
+    reads (see :func:`prefetch_for_grid`). ``sql`` computes the same cell
+    in the database instead. ``reads`` lists ``(prefetch attr or None,
+    lookup)`` pairs naming the data behind the cell, for
+    :func:`grid_dependencies`."""
+    name: str
+    value: Callable[[Any], Any]
+    requires: Tuple[str, ...] = ()
+    sql: Optional[SQLColumn] = None
+    reads: Tuple[Tuple[Optional[str], str], ...] = ()
+
+
+class _Rows(NamedTuple):
+    """Child rows feeding a joined column: the prefetch ``attr``, the
+    ``parts`` formatted for each row and an optional filter, given both as
+    a Python predicate (``keep``) and as a ``Q`` (``where``)."""
+    attr: str
+    parts: Tuple[str, ...]
+    keep: Optional[Callable[[Any], bool]] = None
+    where: Optional[Q] = None
+    key: str = ""
+    # Lookups the filter reads besides ``parts``.
+    filtered_on: Tuple[str, ...] = ()
+
+
+def _identity(value):
+    return value
+
+
+def _blank(value):
+    return value or ""
+
+
+def _iso(value):
+    return value.isoformat() if value else ""
+
+
+def _file_name(value):
+    # A FieldFile on instances, the stored name from values().
+    return getattr(value, "name", value) or ""
+
+
+def _person_name(prefix, first, middle, last):
+    """``Person.name`` from the individual name columns."""
+    return " ".join(p.title() for p in (prefix, first, middle, last) if p)
+
+
+def _path(obj, path):
+    for attr in path.split("__"):
+        if obj is None:
+            return None
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _alias(*parts):
+    return "grid_" + "_".join(p.replace("__", "_") for p in parts if p)
+
+
+def _relation(model, accessor):
+    for field in model._meta.get_fields():
+        if not field.is_relation:
+            continue
+        if field.name == accessor or (field.auto_created and field.get_accessor_name() == accessor):
+            return field
+    raise ValueError(f"{model.__name__} has no relation {accessor!r}")
+
+
+def _child_rows(model, plan, attr):
+    """The rows behind the prefetch ``attr``, correlated with the outer row."""
+    lookup = plan[attr]
+    through = lookup if isinstance(lookup, str) else lookup.prefetch_through
+    field = _relation(model, through)
+    queryset = getattr(lookup, "queryset", None)
+    if queryset is None:
+        queryset = field.related_model._default_manager.all()
+    return queryset.filter(**{back_reference(field): OuterRef("pk")})
+
+
+def _decode(text):
+    if not text:
+        return []
+    return [
+        [None if part == _NULL else part for part in record.split(_UNIT)]
+        for record in text.split(_RECORD)
+    ]
+
+
+def _field(name, *paths, fmt=_identity, requires=()):
+    """Column formatting the outer row's fields (``__`` follows FKs)."""
+    aliases = [_alias(path) for path in paths]
+    return GridColumn(
+        name,
+        lambda obj: fmt(*(_path(obj, path) for path in paths)),
+        requires,
+        SQLColumn(
+            lambda model, plan: {alias: F(path) for alias, path in zip(aliases, paths)},
+            lambda row: fmt(*(row[alias] for alias in aliases)),
+        ),
+        tuple((None, path) for path in paths),
+    )
+
+
+def _annotated(name, alias, relation):
+    """Column showing one of ``GRID_ANNOTATIONS``, which reads ``relation``."""
+    return GridColumn(
+        name,
+        lambda obj: getattr(obj, alias),
+        (alias,),
+        SQLColumn(lambda model, plan: {alias: GRID_ANNOTATIONS[alias]()}, lambda row: row[alias]),
+        ((None, relation),),
+    )
+
+
+def _joined(name, *sources, fmt=_identity, delimiter=", "):
+    """Column joining ``fmt(*parts)`` over the child rows of ``sources``."""
+    aliases = [_alias(source.attr, source.key) for source in sources]
+
+    def value(obj):
+        items = []
+        for source in sources:
+            rows = getattr(obj, source.attr)
+            if hasattr(rows, "all"):
+                rows = rows.all()
+            items.extend(
+                fmt(*(_path(row, part) for part in source.parts))
+                for row in rows
+                if source.keep is None or source.keep(row)
+            )
+        return delimiter.join(items)
+
+    def annotations(model, plan):
+        out = {}
+        for alias, source in zip(aliases, sources):
+            rows = _child_rows(model, plan, source.attr)
+            if source.where is not None:
+                rows = rows.filter(source.where)
+            out[alias] = StringAgg(rows, encode_row([F(p) for p in source.parts], _NULL, _UNIT), _RECORD)
+        return out
+
+    def sql_value(row):
+        return delimiter.join(
+            fmt(*parts) for alias in aliases for parts in _decode(row[alias])
+        )
+
+    reads = tuple((s.attr, part) for s in sources for part in (*s.parts, *s.filtered_on))
+    return GridColumn(name, value, tuple(s.attr for s in sources), SQLColumn(annotations, sql_value), reads)
+
+
+def _has(name, attr):
+    """Column telling whether the prefetch ``attr`` has any rows."""
+    has = _alias("has", attr)
+    return GridColumn(
+        name,
+        lambda obj: bool(getattr(obj, attr)),
+        (attr,),
+        SQLColumn(lambda model, plan: {has: Exists(_child_rows(model, plan, attr))}, lambda row: row[has]),
+        ((attr, ""),),
+    )
+
+
+def _only_with(attr, column):
+    """Leave ``column`` out of rows without a record in the prefetch ``attr``."""
+    has = _alias("has", attr)
+    sql = column.sql
+    return column._replace(
+        value=lambda obj: OMIT if _first(getattr(obj, attr)) is None else column.value(obj),
+        requires=(attr, *column.requires),
+        sql=SQLColumn(
+            lambda model, plan: {has: Exists(_child_rows(model, plan, attr)), **sql.annotations(model, plan)},
+            lambda row: sql.value(row) if row[has] else OMIT,
+        ),
+        reads=((attr, ""), *column.reads),
+    )
+
+
+def _first_row(model, plan, attr):
+    """Join the first row of the prefetch ``attr`` as a ``FilteredRelation``.
+
+    The row's pk is picked by one subquery in the join condition, shared by
+    every detail column reading ``attr``, instead of one subquery per field."""
+    lookup = plan[attr]
+    relation = _relation(model, lookup if isinstance(lookup, str) else lookup.prefetch_through).name
+    first = Subquery(_child_rows(model, plan, attr).values("pk")[:1])
+    return FilteredRelation(relation, condition=Q(**{f"{relation}__pk": first}))
+
+
+def _detail_field(attr, name, paths, fmt=_identity):
+    paths = (paths,) if isinstance(paths, str) else paths
+    aliases = [_alias(attr, path) for path in paths]
+    first = _alias("first", attr)
+    return _only_with(attr, GridColumn(
+        name,
+        lambda obj: fmt(*(_path(_first(getattr(obj, attr)), path) for path in paths)),
+        (attr,),
+        SQLColumn(
+            lambda model, plan: {
+                first: _first_row(model, plan, attr),
+                **{alias: F(f"{first}__{path}") for alias, path in zip(aliases, paths)},
+            },
+            lambda row: fmt(*(row[alias] for alias in aliases)),
+        ),
+        tuple((attr, path) for path in paths),
+    ))
+
+
+def _detail_columns(attr, specs):
+    """Columns read from the first row of a one-per-record detail prefetch.
+
+    ``specs`` are ``(name, paths[, fmt])``. The columns are left out of the
+    row when there is no detail record."""
+    return [_detail_field(attr, *spec) for spec in specs]
+
+
+def _typed(attr, type_fk, type_name, part):
+    return _Rows(
+        attr, (part,),
+        keep=lambda row: getattr(row, type_fk).name.lower() == type_name.lower(),
+        where=Q(**{f"{type_fk}__name__iexact": type_name}),
+        key=type_name.lower(),
+        filtered_on=(type_fk,),
+    )
+
+
+_PERSON_NAME = ("prefix", "name_first", "name_middle", "name_last")
+
+
+def _span(start, end, *, sep=" → "):
+    return f"({start}{sep}{end or 'present'})"
+
+
+# Factories for the per-row ``Exists`` flags, shared by both grid paths.
+GRID_ANNOTATIONS = {
+    "grid_is_deacon": lambda: Exists(Deacon_Detail.objects.filter(lkp_person_id=OuterRef('pk'))),
+    "grid_is_lay": lambda: Exists(Lay_Detail.objects.filter(lkp_person_id=OuterRef('pk'))),
+    "grid_is_other_entity": lambda: Exists(
+        OtherEntity_Detail.objects.filter(lkp_location_id=OuterRef('pk'))
+    ),
+}
+
+
+PERSON_COLUMNS = (
+    # core Person fields
+    _field("Full Name", *_PERSON_NAME, fmt=_person_name),
+    _field("First Name", "name_first"),
+    _field("Middle Name", "name_middle"),
+    _field("Last Name", "name_last"),
+    _field("Person Type", "personType"),
+    _field("Prefix", "prefix", fmt=_blank),
+    _field("Suffix", "suffix", fmt=_blank),
+    _field("Birth Date", "date_birth", fmt=_iso),
+    _field("Baptism Date", "date_baptism", fmt=_iso),
+    _field("Retirement Date", "date_retired", fmt=_iso),
+    _field("Deceased Date", "date_deceased", fmt=_iso),
+    _field("Safe Env Trng", "is_safeEnvironmentTraining"),
+    _field("Paid Employee", "is_paidEmployee"),
+
+    # flattened addresses
+    *(
+        _field(f"{prefix} {label}", f"{fk}__{part}", fmt=_blank, requires=(fk,))
+        for prefix, fk in (("Residence", "lkp_residence_id"), ("Mailing", "lkp_mailing_id"))
+        for label, part in (("Addr", "address1"), ("City", "city"), ("State", "state"),
+                            ("Zip Code", "zip_code"), ("Country", "country"))
+    ),
+
+    # emails & phones
+    *(
+        _joined(f"{name} Emails", _typed("grid_emails", "lkp_emailType_id", name, "email"))
+        for name in PERSON_EMAIL_TYPES
+    ),
+    *(
+        _joined(f"{name} Phones", _typed("grid_phones", "lkp_phoneType_id", name, "phoneNumber"))
+        for name in PERSON_PHONE_TYPES
+    ),
+
+    # languages
+    _joined("Languages",
+            _Rows("grid_languages", ("lkp_language_id__name", "lkp_languageProficiency_id__name")),
+            fmt=lambda language, proficiency: f"{language} ({proficiency})"),
+
+    _joined("Ecclesiastical Offices",
+            _Rows("grid_titles", ("lkp_title_id__name",),
+                  keep=lambda t: t.lkp_title_id.is_ecclesiastical,
+                  where=Q(lkp_title_id__is_ecclesiastical=True), key="ecclesiastical")),
+
+    # degrees & certificates
+    _joined("Degrees",
+            _Rows("grid_degrees", ("lkp_degreeCertificate_id__institute", "date_acquired", "date_expiration")),
+            fmt=lambda institute, acquired, expires: f"{institute} (acquired {acquired}, expires {expires})",
+            delimiter="; "),
+
+    # faculties grants
+    _joined("Faculties Grants",
+            _Rows("grid_faculties", ("lkp_facultiesGrantType_id__name", "date_granted")),
+            fmt=lambda grant, granted: f"{grant} (granted {granted})",
+            delimiter="; "),
+
+    # status history
+    _joined("Status History",
+            _Rows("grid_statuses", ("lkp_status_id__name", "date_assigned", "date_released")),
+            fmt=lambda status, start, end: f"{status} {_span(start, end)}",
+            delimiter="; "),
+
+    # titles
+    _joined("Titles",
+            _Rows("grid_titles", ("lkp_title_id__name", "date_assigned", "date_expiration")),
+            fmt=lambda title, start, end: f"{title} {_span(start, end)}",
+            delimiter="; "),
+
+    # current assignments
+    _joined("Assignments",
+            _Rows("grid_assignments", ("lkp_assignmentType_id__title", "lkp_location_id__name",
+                                       "term", "date_assigned", "date_released")),
+            fmt=lambda title, location, term, start, end:
+                f"{title}@{location} (term {term}, {start}→{end or 'present'})",
+            delimiter="; "),
+
+    # relationships (both directions)
+    _joined("Relationships",
+            _Rows("grid_first_relationships",
+                  ("lkp_relationshipType_id__name", *(f"lkp_secondPerson_id__{p}" for p in _PERSON_NAME))),
+            _Rows("grid_second_relationships",
+                  ("lkp_relationshipType_id__name", *(f"lkp_firstPerson_id__{p}" for p in _PERSON_NAME))),
+            fmt=lambda kind, *name: f"{kind}: {_person_name(*name)}",
+            delimiter="; "),
+
+    # detail flags
+    _has("Is Priest?", "grid_priest_details"),
+    _annotated("Is Deacon?", "grid_is_deacon", "deacon_detail"),
+    _annotated("Is Lay?", "grid_is_lay", "lay_detail"),
+
+    # priest‐specific fields (if any), taken from the first detail record
+    *_detail_columns("grid_priest_details", (
+        ("Priest Ordination", "date_priestOrdination", _iso),
+        ("Diocesan/Religious", "diocesanReligious", _blank),
+        ("Place of Baptism", "lkp_placeOfBaptism_id__name", _blank),
+        ("Birth (City,State)", ("birth_city", "birth_state"),
+         lambda city, state: f"{city or ''}, {state or ''}"),
+        ("Priest Notes", "notes", _blank),
+    )),
+)
+
+
+def _street_city(address, street, city):
+    return f"{street}, {city}" if address else ""
+
+
+LOCATION_COLUMNS = (
+    # — Basic info —
+    _field("Name", "name"),
+    _field("Type", "type"),
+
+    # — Location & jurisdiction —
+    _field("Vicariate", "lkp_vicariate_id__name", fmt=_blank, requires=("lkp_vicariate_id",)),
+    _field("County", "lkp_county_id__name", fmt=_blank, requires=("lkp_county_id",)),
+
+    # — Addresses —
+    *(
+        _field(name, fk, f"{fk}__address1", f"{fk}__city", fmt=_street_city, requires=(fk,))
+        for name, fk in (("Physical Addr", "lkp_physicalAddress_id"),
+                         ("Mailing Addr", "lkp_mailingAddress_id"))
+    ),
+
+    # — Contact —
+    _field("Website", "website", fmt=_blank),
+    _joined("Emails", _Rows("location_email_set", ("email",))),
+    _joined("Phones", _Rows("location_phone_set", ("phoneNumber",))),
+
+    # — Status history —
+    _joined("Status History",
+            _Rows("grid_statuses", ("lkp_status_id__name", "date_assigned", "date_released")),
+            fmt=lambda status, start, end: f"{status} {_span(start, end, sep='→')}",
+            delimiter="; "),
+
+    # — “Other Entity” flag —
+    _annotated("Is Other Entity", "grid_is_other_entity", "otherentity_detail"),
+
+    # — Assignments & relationships —
+    _joined("Assignments",
+            _Rows("grid_assignments", ("lkp_assignmentType_id__title",
+                                       *(f"lkp_person_id__{p}" for p in _PERSON_NAME),
+                                       "date_assigned", "date_released")),
+            fmt=lambda title, prefix, first, middle, last, start, end:
+                f"{title}@{_person_name(prefix, first, middle, last)} {_span(start, end, sep='→')}",
+            delimiter="; "),
+    _joined("Missions", _Rows("grid_missions", ("lkp_parish_id__name",))),
+    _joined("Parishes", _Rows("grid_parishes", ("lkp_mission_id__name",))),
+
+    # — Church‐specific details (if any) —
+    *_detail_columns("grid_church_details", (
+        ("Parish Name", "parishUniqueName"),
+        ("Is Mission", "is_mission"),
+        ("Boundary File", "boundary", _file_name),
+        ("City Served", "cityServed", _blank),
+        ("Date Established", "date_established", _iso),
+        ("First Dedication", "date_firstDedication", _iso),
+        ("Second Dedication", "date_secondDedication", _iso),
+        ("Church Notes", "notes", _blank),
+    )),
+    _only_with("grid_church_details", _joined(
+        "Mass Languages",
+        _Rows("grid_mass_languages", ("lkp_language_id__name", "massTime")),
+        fmt=lambda language, time: f"{language} @ {time}",
+        delimiter="; ",
+    )),
+    *_detail_columns("grid_church_details", (
+        ("Site Plan", "pastoralPlan", _file_name),
+        ("DOC Parish", "is_doc"),
+        ("Tax ID", "tax_id", _blank),
+        ("Geo ID", "geo_id", _blank),
+        ("Parish ID", "parish_id", _blank),
+        ("Church Type", "type", _blank),
+        ("Seating Capacity", "seatingCapacity", _blank),
+        ("Has Home School Program", "has_homeschoolProgram"),
+        ("Has Child Card Day Care", "has_childCareDayCare"),
+        ("Has Scouting Program", "has_scoutingProgram"),
+        ("Has Chapel on Campus", "has_chapelOnCampus"),
+        ("Has Adoration Chapel on Campus", "has_adorationChapelOnCampus"),
+        ("Has Columbarium", "has_columbarium"),
+        ("Has Cemetary", "has_cemetary"),
+        ("Has School on Site", "has_schoolOnSite"),
+        ("Is Non-Parochial School Using Facilities", "is_nonParochialSchoolUsingFacilities"),
+        ("Office Contact", "temp_officeContact"),
+        ("Office Contact Email", "temp_officeContactEmail"),
+    )),
+
+    # — Campus ministry details (if any) —
+    *_detail_columns("grid_campus_ministries", (
+        ("Campus Mass At Parish", "is_massAtParish"),
+        ("Served By", "universityServed", _blank),
+        # CampusMinistry_Detail has no schedule field; reading one used to
+        # raise for every campus ministry row.
+        ("Mass Schedule", (), lambda: ""),
+        ("Hours", "campusMinistryHours", _blank),
+    )),
+
+    # — Hospital details (if any) —
+    *_detail_columns("grid_hospitals", (
+        ("Facility Type", "facilityType"),
+        ("Diocese", "diocese"),
+        ("Parish Boundary", "lkp_parishBoundary_id__name", _blank),
+    )),
+
+    *_detail_columns("grid_schools", (
+        ("School Code", "schoolCode"),
+        ("School Type", "schoolType"),
+        ("Grade Levels", "gradeLevels"),
+        ("MACS School", "is_MACS"),
+        ("Priests Teaching", "academicPriest"),
+        ("Brothers Teaching", "academicBrother"),
+        ("Sisters Teaching", "academicSister"),
+        ("Lay Staff Teaching", "academicLay"),
+        ("Canonical Status", "canonicalStatus"),
+        ("Chapel on Site", "is_schoolChapel"),
+    )),
+
+    *_detail_columns("grid_latest_offertory", (
+        ("Offertory", "income"),
+    )),
+    *_detail_columns("grid_latest_october_count", (
+        ("October Mass Count", ("week1", "week2", "week3", "week4"),
+         lambda w1, w2, w3, w4: w1 + w2 + w3 + w4),
+    )),
+
+    # Latest year only; the oldest year used to leak through here.
+    *_detail_columns("grid_latest_status_animarum", (
+        ("# Deacons", "fullTime_deacons"),
+        ("# Brothers", "fullTime_brothers"),
+        ("# Sisters", "fullTime_sisters"),
+        ("# Lay", "fullTime_other"),
+        ("# Staff", "partTime_staff"),
+        ("Volunteers", "volunteers"),
+        ("Max Mass Size", "maxMass"),
+        ("Baptisms 1-7", "baptismAge_1_7"),
+        ("Baptisms 8-17", "baptismAge_8_17"),
+        ("Baptisms 18+", "baptismAge_18"),
+        ("Full Communion RCIA", "fullCommunionRCIA"),
+        ("First Communion", "firstCommunion"),
+        ("Confirmation", "confirmation"),
+        ("Catholic Marriages", "marriage_catholic"),
+        ("Interfaith Marriages", "marriage_interfaith"),
+        ("Deaths", "deaths"),
+        ("Children in Faith Formation", "childrenInFaithFormation"),
+        ("Kids: PreK - 5", "school_prek_5"),
+        ("Kids: 6-8", "school_grade6_8"),
+        ("Kids: 9-12", "school_grade9_12"),
+        ("Youth Ministy", "youthMinistry"),
+        ("Adult Education", "adult_education"),
+        ("Adult Sacrament Prep", "adult_sacramentPrep"),
+        ("# Paid Catechists", "catechist_paid"),
+        ("# Volunteer Catechists", "catechist_vol"),
+        ("RCIA/RCIC", "rcia_rcic"),
+        ("# Volunteers Youth", "volunteersWorkingYouth"),
+        ("# Referrals to Catholic Charities", "referrals_catholicCharities"),
+    )),
+    _only_with("grid_latest_status_animarum", _joined(
+        "Social Outreach Programs", _Rows("social_outreach_program", ("name",)),
+    )),
+)
+
+
+# Per base: (model, columns, select_related fields, prefetch plan).
+GRID_PLANS = {
+    "person": (
+        Person,
+        PERSON_COLUMNS,
+        ("lkp_residence_id", "lkp_mailing_id"),
+        _person_grid_prefetches,
+    ),
+    "location": (
+        Location,
+        LOCATION_COLUMNS,
+        ("lkp_physicalAddress_id", "lkp_mailingAddress_id", "lkp_vicariate_id", "lkp_county_id"),
+        _location_grid_prefetches,
+    ),
+}
+
+
+def _plan(base):
+    return GRID_PLANS["person" if base == "person" else "location"]
+
+
+def grid_columns(base, names=None):
+    """Return the registry columns for ``base``, restricted to ``names``.
+
+    Columns keep registry order whatever order ``names`` is in. Raises
+    ``ValueError`` for names the registry does not know."""
+    columns = _plan(base)[1]
+    if not names:
+        return columns
+    wanted = set(names)
+    unknown = wanted - {c.name for c in columns}
+    if unknown:
+        raise ValueError(f"Unknown grid columns: {', '.join(sorted(unknown))}")
+    return tuple(c for c in columns if c.name in wanted)
+
+
+def prefetch_for_grid(qs, base, today=None, columns=None):
+    """Attach only the joins, annotations and prefetches ``columns`` read.
+
+    ``columns`` comes from :func:`grid_columns`; ``None`` means every column."""
+    logger.debug('Preparing grid prefetch plan for base "%s"', base)
+    today = today or date.today()
+    _, all_columns, selects, prefetches = _plan(base)
+    needs = {req for col in (columns or all_columns) for req in col.requires}
+
+    selected = [name for name in selects if name in needs]
+    if selected:
+        qs = qs.select_related(*selected)
+    annotated = {name: make() for name, make in GRID_ANNOTATIONS.items() if name in needs}
+    if annotated:
+        qs = qs.annotate(**annotated)
+    lookups = [p for name, p in prefetches(today).items() if name in needs]
+    if lookups:
+        qs = qs.prefetch_related(*lookups)
+    return qs
+
+
+def build_grid_record(obj, base, columns=None):
+    """Return the flattened grid row for ``obj`` holding ``columns``."""
+    if columns is None:
+        columns = grid_columns(base)
+    rec = {"id": obj.pk}
+    for col in columns:
+        val = col.value(obj)
+        if val is not OMIT:
+            rec[col.name] = val
+    return rec
+
+
+def grid_dependencies(base):
+    """Map every model the grid rows of ``base`` read to the lookups reaching it.
+
+    Lookups are relative to the base model, ``""`` standing for the base
+    model itself, e.g. ``{Language: {"person_language__lkp_language_id"}}``.
+    A change to an instance ``obj`` of such a model affects the rows
+    matching ``Q(**{lookup: obj.pk})``."""
+    model, columns, _, prefetches = _plan(base)
+    plan = prefetches(date.today())
+    found = {model: {""}}
+    for col in columns:
+        for attr, path in col.reads:
+            current, prefix = model, ""
+            if attr:
+                lookup = plan[attr]
+                field = _relation(model, lookup if isinstance(lookup, str) else lookup.prefetch_through)
+                current, prefix = field.related_model, field.name
+                found.setdefault(current, set()).add(prefix)
+            for part in path.split("__") if path else ():
+                try:
+                    field = current._meta.get_field(part)
+                except FieldDoesNotExist:
+                    break
+                if not field.is_relation:
+                    break
+                current = field.related_model
+                prefix = f"{prefix}__{part}" if prefix else part
+                found.setdefault(current, set()).add(prefix)
+    return found
+
+
+def sql_grid_records(qs, base, columns=None, today=None, chunk_size=None):
+    """Yield the grid rows of ``qs`` computed by the database.
+
+    Each row comes from a single ``values()`` query: flat columns are
+    joined in, child lists are ``StringAgg`` subqueries and detail fields
+    are read through a join on their first row, so no model instances are
+    built. The rows equal :func:`build_grid_record` output."""
+    model, all_columns, _, prefetches = _plan(base)
+    columns = columns or all_columns
+    plan = prefetches(today or date.today())
+    annotations = {}
+    for col in columns:
+        annotations.update(col.sql.annotations(model, plan))
+    relations = {alias: expr for alias, expr in annotations.items()
+                 if isinstance(expr, FilteredRelation)}
+    values = {alias: expr for alias, expr in annotations.items() if alias not in relations}
+    rows = qs.alias(**relations).values("pk", **values)
+    for row in rows.iterator(chunk_size=chunk_size) if chunk_size else rows:
+        rec = {"id": row["pk"]}
+        for col in columns:
+            val = col.sql.value(row)
+            if val is not OMIT:
+                rec[col.name] = val
+        yield rec
+
+
+def iter_grid_records(qs, base, columns=None, chunk_size=None):
+    """Yield the grid rows of ``qs``, from the database when it can build them.
+
+    Falls back to the prefetch-based builder when ``GRID_SQL_ROWS`` is off,
+    the backend has no string aggregate, or a column has no SQL form."""
+    columns = columns or grid_columns(base)
+    if (settings.GRID_SQL_ROWS
+            and supports_string_agg(connections[qs.db])
+            and all(col.sql for col in columns)):
+        logger.debug('Building grid rows for base "%s" in the database', base)
+        yield from sql_grid_records(qs, base, columns, chunk_size=chunk_size)
+        return
+
+    qs = prefetch_for_grid(qs, base, columns=columns)
+    for obj in qs.iterator(chunk_size=chunk_size) if chunk_size else qs:
+        yield build_grid_record(obj, base, columns)
+
+
+# Display columns summarized in ``stats_info``.
+STATISTICS_FIELDS = frozenset(k for k, v in FIELD_CATEGORIES.items() if v == "Statistics")
+STATS_HISTOGRAM_BINS = 10
+
+
+def _column_stats(values, rows):
+    """Summarize one Statistics column; ``None`` when it is neither boolean nor numeric.
+
+    ``values`` are the column's cells (``None`` included) and ``rows`` the
+    number of records seen, so records without the column count as nulls."""
+    raw = np.asarray(values, dtype=object)
+    present = raw[raw != None]  # noqa: E711 - elementwise comparison
+    if not len(present):
+        return None
+    stats = {"count": int(len(present)), "nulls": rows - int(len(present))}
+    if set(map(type, present)) == {bool}:
+        true = int(np.count_nonzero(present.astype(bool)))
+        return {"type": "boolean", **stats, "true": true, "false": stats["count"] - true}
+    try:
+        nums = present.astype(np.float64)
+    except (TypeError, ValueError):
+        return None
+    p25, median, p75 = np.percentile(nums, [25, 50, 75])
+    counts, edges = np.histogram(nums, bins=STATS_HISTOGRAM_BINS)
+    return {
+        "type": "number",
+        "min": float(nums.min()),
+        "max": float(nums.max()),
+        **stats,
+        "sum": float(nums.sum()),
+        "mean": float(nums.mean()),
+        "median": float(median),
+        "p25": float(p25),
+        "p75": float(p75),
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+class GridSummary:
+    """Accumulates column metadata and ``stats_info`` one record at a time.
+
+    Only the Statistics cells are kept, one list per column, and summarized
+    with NumPy once every record has been seen, so the summary for a whole
+    filtered set never requires holding every record in memory."""
+
+    def __init__(self):
+        self._fields = {}
+        self._values = {}
+        self._rows = 0
+
+    def add(self, rec):
+        self._fields.update(dict.fromkeys(rec))
+        self._rows += 1
+        for key in STATISTICS_FIELDS.intersection(rec):
+            self._values.setdefault(key, []).append(rec[key])
+
+    def columns(self):
+        return [
+            {
+                "title": key,
+                "field": key,
+                "sqlField": DISPLAY_TO_PATH.get(key, key).split("__").pop(),
+                "category": FIELD_CATEGORIES.get(key, "Other"),
+            }
+            for key in self._fields
+        ]
+
+    def stats_info(self):
+        """Return the summary of each boolean or numeric Statistics field.
+
+        Booleans carry true/false/null counts; numbers carry min, max, sum,
+        mean, median, quartiles, null count and a histogram."""
+        stats_info = []
+        for field in self._fields:
+            if field not in self._values:
+                continue
+            stats = _column_stats(self._values[field], self._rows)
+            if stats is not None:
+                stats_info.append({"field": field, "display": field, **stats})
+        return stats_info
@@ -0,0 +1,140 @@
+"""Materialized Database grid rows (``PersonGridRow`` / ``LocationGridRow``).
+
+A stored row is dropped whenever the person or location, or any row the
+grid reads for it (see :func:`api.grid.grid_dependencies`), is saved or
+deleted. Missing rows are rebuilt in batches the next time a grid request
+reads them, so a warm request is two indexed queries.
+
+Only the person grid's current assignments depend on the date; run
+``manage.py refresh_grid_rows --expired`` daily to rebuild the rows of
+people whose assignments started or ended since their row was built.
+``QuerySet.update`` and ``bulk_create`` do not send signals; run
+``manage.py refresh_grid_rows`` after bulk loads.
+"""
+import logging
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .grid import grid_columns, iter_grid_records
+from .models import Location, LocationGridRow, Person, PersonGridRow
+from .utilities.pagination import apply_keyset, keyset_ordering
+
+logger = logging.getLogger('api')
+
+REFRESH_BATCH_SIZE = 500
+
+# Per base: (base model, read model, {flat column: grid column}).
+READ_MODELS = {
+    "person": (Person, PersonGridRow, {"name_last": "Last Name", "personType": "Person Type"}),
+    "location": (Location, LocationGridRow, {"name": "Name", "type": "Type"}),
+}
+
+
+def _read_model(base):
+    return READ_MODELS["person" if base == "person" else "location"]
+
+
+def refresh_grid_rows(base, pks=None, batch_size=REFRESH_BATCH_SIZE):
+    """Rebuild the stored rows of ``pks`` (every object when ``None``).
+
+    Returns the number of rows written."""
+    model, row_model, flat = _read_model(base)
+    if pks is None:
+        pks = model.objects.values_list("pk", flat=True)
+    pks = list(pks)
+    today = date.today()
+    written = 0
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        rows = [
+            row_model(pk=rec["id"], data=rec, built_on=today,
+                      **{field: rec[column] for field, column in flat.items()})
+            for rec in iter_grid_records(model.objects.filter(pk__in=batch), base)
+        ]
+        with transaction.atomic():
+            row_model.objects.filter(pk__in=batch).delete()
+            # Another request may have rebuilt the same rows meanwhile.
+            row_model.objects.bulk_create(rows, ignore_conflicts=True)
+        written += len(rows)
+    logger.info('Refreshed %d %s grid rows', written, base)
+    return written
+
+
+def expired_grid_rows(base, today=None):
+    """Return the pks of stored rows whose date-dependent columns changed.
+
+    A person row expires once one of the person's assignments started or
+    ended after the day it was built; location rows never expire."""
+    if base != "person":
+        return []
+    today = today or date.today()
+    built_on = F("grid_row__built_on")
+    return list(
+        Person.objects
+        .filter(Q(assignment__date_assigned__gt=built_on, assignment__date_assigned__lte=today)
+                | Q(assignment__date_released__gte=built_on, assignment__date_released__lt=today))
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+def _stored_rows(qs, base):
+    """Return the read-model rows of ``qs``, building missing ones first."""
+    _, row_model, _ = _read_model(base)
+    missing = list(qs.filter(grid_row__isnull=True).values_list("pk", flat=True))
+    if missing:
+        logger.debug('Building %d missing %s grid rows', len(missing), base)
+        refresh_grid_rows(base, missing)
+    return row_model.objects.filter(pk__in=qs.values("pk"))
+
+
+def _project(data, columns):
+    # Some JSON columns (e.g. jsonb) do not keep key order.
+    rec = {"id": data["id"]}
+    for col in columns:
+        if col.name in data:
+            rec[col.name] = data[col.name]
+    return rec
+
+
+def read_grid_records(qs, base, columns=None, chunk_size=None):
+    """Yield the grid rows of ``qs`` from the read model, building missing ones.
+
+    Rows come in the base model's ``Meta.ordering`` and hold ``columns``
+    (from :func:`api.grid.grid_columns`) in registry order."""
+    columns = columns or grid_columns(base)
+    rows = _stored_rows(qs, base)
+    rows = rows.order_by(*keyset_ordering(rows.model)).values_list("data", flat=True)
+    for data in rows.iterator(chunk_size=chunk_size) if chunk_size else rows:
+        yield _project(data, columns)
+
+
+def read_grid_page(qs, base, page_size, after=None, columns=None, summary=None):
+    """Return one keyset page of the grid rows of ``qs`` from the read model.
+
+    Stored rows are ordered by :func:`keyset_ordering` of the read model,
+    which matches the base model's, and ``after`` holds the cursor values
+    of the previous page's last row. Returns ``(records, last)`` where
+    ``last`` is the page's last stored row when more rows follow, else
+    ``None``. Every stored row of ``qs`` is added to ``summary`` (a
+    :class:`api.grid.GridSummary`) when one is given."""
+    columns = columns or grid_columns(base)
+    rows = _stored_rows(qs, base)
+    ordering = keyset_ordering(rows.model)
+    page = list(apply_keyset(rows, ordering, after)[:page_size + 1])
+    last = page[page_size - 1] if len(page) > page_size else None
+    records = [_project(row.data, columns) for row in page[:page_size]]
+    if summary is not None:
+        for data in rows.values_list("data", flat=True).iterator(chunk_size=REFRESH_BATCH_SIZE):
+            summary.add(_project(data, columns))
+    return records, last
+
+
+def invalidate_grid_rows(base, q):
+    """Drop the stored rows of the ``base`` objects matching ``q``.
+
+    Called by the receivers in :mod:`api.signals`."""
+    model, row_model, _ = _read_model(base)
+    row_model.objects.filter(pk__in=model.objects.filter(q).values("pk")).delete()
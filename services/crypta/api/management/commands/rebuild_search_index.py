@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.search import INDEX_BATCH_SIZE, SEARCH_MODELS, ensure_search_schema, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the search index behind /api/v1/search. Run after bulk "
+            "loads and after changing SEARCH_BACKEND.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', choices=sorted(SEARCH_MODELS), action='append',
+                            help='Only rebuild this base (may be repeated).')
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        ensure_search_schema()
+        for base in options['base'] or sorted(SEARCH_MODELS):
+            written = rebuild_search_index(base, batch_size=options['batch_size'])
+            self.stdout.write(f'{base}: {written} entries')
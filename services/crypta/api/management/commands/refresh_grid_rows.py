@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.gridrows import READ_MODELS, expired_grid_rows, refresh_grid_rows
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the stored Database grid rows. Run after bulk loads, and "
+            "daily with --expired, since current assignments depend on the date.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', choices=sorted(READ_MODELS), action='append',
+                            help='Only rebuild this base (may be repeated).')
+        parser.add_argument('--expired', action='store_true',
+                            help='Only rebuild rows whose current assignments changed '
+                                 'since they were built.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for base in options['base'] or sorted(READ_MODELS):
+            pks = expired_grid_rows(base) if options['expired'] else None
+            written = refresh_grid_rows(base, pks, batch_size=options['batch_size'])
+            self.stdout.write(f'{base}: {written} rows')
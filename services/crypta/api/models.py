@@ -1462,3 +1462,87 @@ class SocialOutreachProgram(models.Model):
 
     def __str__(self):
         return f'{self.name}'
+
+class PersonGridRow(models.Model):
+    """ Read model holding the flattened Database grid row of one Person.
+    Rows are rebuilt by api.gridrows when the person or any table the grid
+    reads from changes, so a grid request reads this one table instead of
+    joining the satellite tables. """
+    lkp_person_id = models.OneToOneField(Person,
+                                        on_delete=models.CASCADE,
+                                        primary_key=True,
+                                        related_name='grid_row')
+    data = models.JSONField()
+    name_last = models.CharField(max_length=255, db_index=True)
+    personType = models.CharField(max_length=255, db_index=True)
+    built_on = models.DateField(db_index=True)
+
+    class Meta:
+        ordering = ['name_last']
+        db_table = 'person_grid_row'
+
+    def __str__(self):
+        return f'{self.data.get("Full Name", self.pk)}'
+
+class LocationGridRow(models.Model):
+    """ Read model holding the flattened Database grid row of one Location.
+    See PersonGridRow. """
+    lkp_location_id = models.OneToOneField(Location,
+                                        on_delete=models.CASCADE,
+                                        primary_key=True,
+                                        related_name='grid_row')
+    data = models.JSONField()
+    name = models.CharField(max_length=255, db_index=True)
+    type = models.CharField(max_length=255, db_index=True)
+    built_on = models.DateField(db_index=True)
+
+    class Meta:
+        ordering = ['name']
+        db_table = 'location_grid_row'
+
+    def __str__(self):
+        return f'{self.name}'
+
+class SearchEntry(models.Model):
+    """ Search document of one Person or Location, kept current by api.search.
+    ``text`` is the lower-cased names, emails, phone numbers and addresses the
+    search box matches against; the backend index is built over it. """
+    choice_base = [
+        ('person', 'Person'),
+        ('location', 'Location'),
+    ]
+    base = models.CharField(max_length=20, choices=choice_base, null=False)
+    object_id = models.BigIntegerField(null=False)
+    title = models.CharField(max_length=255, null=False)
+    # Normalized display name, and last name first for people.
+    name = models.CharField(max_length=255, null=False)
+    sort_name = models.CharField(max_length=255, null=False)
+    text = models.TextField(null=False)
+
+    class Meta:
+        ordering = ['sort_name']
+        db_table = 'search_entry'
+        constraints = [
+            models.UniqueConstraint(fields=['base', 'object_id'], name='search_entry_unique_object'),
+        ]
+
+    def __str__(self):
+        return f'{self.base}: {self.title}'
+
+class SearchGram(models.Model):
+    """ Trigram postings of a SearchEntry, used when the database has no
+    native full-text or trigram index (see api.search.NgramIndex). """
+    entry = models.ForeignKey(SearchEntry,
+                              on_delete=models.CASCADE,
+                              null=False,
+                              related_name='grams')
+    gram = models.CharField(max_length=3, null=False)
+
+    class Meta:
+        db_table = 'search_gram'
+        indexes = [
+            models.Index(fields=['gram', 'entry'], name='search_gram_lookup'),
+        ]
+
+    def __str__(self):
+        return f'{self.gram}: {self.entry_id}'
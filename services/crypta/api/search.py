@@ -0,0 +1,360 @@
+"""Search index behind ``/api/v1/search``.
+
+Every Person and Location has one :class:`~api.models.SearchEntry` whose
+``text`` holds its lower-cased names, emails, phone numbers (as written and
+as bare digits) and addresses. The receivers in :mod:`api.signals` rewrite
+an entry whenever one of those rows changes; ``manage.py
+rebuild_search_index`` fills the index after bulk loads.
+
+Matching runs against an index picked per database (``SEARCH_BACKEND``):
+
+* SQLite: an FTS5 table with the ``trigram`` tokenizer;
+* PostgreSQL: a ``pg_trgm`` GIN index, which serves ``LIKE '%term%'``;
+* SQL Server: a full-text index on ``search_entry.text``, queried with
+  ``CONTAINSTABLE``. The catalog and index are created by a DBA; until
+  they exist the n-gram index is used;
+* anything else: :class:`NgramIndex`, trigram postings computed in Python
+  and stored in :class:`~api.models.SearchGram`.
+
+A query is split on whitespace and every term must match, as a substring
+of the document (SQL Server matches word prefixes). Terms shorter than a
+trigram are checked with ``LIKE`` on the entries the other terms matched.
+Matches are ranked by how the whole query meets the display name (the
+whole name, then whole words of it, then a word prefix, then anywhere in
+it, then only elsewhere in the document) and then by ``sort_name`` (last name, first name for people).
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Concat
+from django.db.models.expressions import RawSQL
+
+from .models import (
+    Address, Location, Location_Email, Location_Phone, Person, Person_Email, Person_Phone,
+    SearchEntry, SearchGram,
+)
+
+logger = logging.getLogger('api')
+
+GRAM_SIZE = 3
+INDEX_BATCH_SIZE = 500
+FTS_TABLE = 'search_fts'
+
+# Shorter queries match too much of the database to be worth answering.
+SEARCH_MIN_QUERY_LENGTH = 2
+# Results returned per type unless the request asks for fewer or more.
+SEARCH_RESULT_LIMITS = {"person": 20, "location": 10}
+SEARCH_MAX_RESULT_LIMIT = 100
+# Keyset ordering of matches, see :func:`search_entries`.
+SEARCH_ORDERING = ["-match_rank", "sort_name", "pk"]
+
+EXACT, WORD, PREFIX, SUBSTRING, ELSEWHERE = 4, 3, 2, 1, 0
+
+# Per base: (model, {model whose rows feed the document: lookups from the base}).
+SEARCH_MODELS = {
+    "person": (Person, {
+        Person: ("",),
+        Person_Email: ("person_email",),
+        Person_Phone: ("person_phone",),
+        Address: ("lkp_residence_id", "lkp_mailing_id"),
+    }),
+    "location": (Location, {
+        Location: ("",),
+        Location_Email: ("location_email",),
+        Location_Phone: ("location_phone",),
+        Address: ("lkp_physicalAddress_id", "lkp_mailingAddress_id"),
+    }),
+}
+
+_DIGITS = re.compile(r"\D+")
+
+
+def normalize(text):
+    """Lower-case ``text`` and collapse its whitespace."""
+    return " ".join(str(text).casefold().split())
+
+
+def query_terms(query):
+    return normalize(query).split()
+
+
+def grams(term):
+    """Return the distinct trigrams of one term (none when it is shorter)."""
+    return {term[idx:idx + GRAM_SIZE] for idx in range(len(term) - GRAM_SIZE + 1)}
+
+
+def _address_parts(address):
+    if address is None:
+        return []
+    return [address.address1, address.address2, address.city, address.state, address.zip_code]
+
+
+def _phone_parts(phones):
+    parts = []
+    for phone in phones:
+        parts.append(phone.phoneNumber)
+        parts.append(_DIGITS.sub("", phone.phoneNumber or ""))
+    return parts
+
+
+def _person_documents(pks):
+    people = (Person.objects.filter(pk__in=pks)
+              .select_related("lkp_residence_id", "lkp_mailing_id")
+              .prefetch_related("person_email_set", "person_phone_set"))
+    for person in people:
+        parts = [person.name_first, person.name_middle, person.name_last, person.suffix,
+                 *(email.email for email in person.person_email_set.all()),
+                 *_phone_parts(person.person_phone_set.all()),
+                 *_address_parts(person.lkp_residence_id),
+                 *_address_parts(person.lkp_mailing_id)]
+        title = " ".join(p for p in (person.name_first, person.name_last) if p)
+        sort_name = " ".join(p for p in (person.name_last, person.name_first) if p)
+        yield person.pk, title, sort_name, parts
+
+
+def _location_documents(pks):
+    locations = (Location.objects.filter(pk__in=pks)
+                 .select_related("lkp_physicalAddress_id", "lkp_mailingAddress_id")
+                 .prefetch_related("location_email_set", "location_phone_set"))
+    for location in locations:
+        parts = [location.name,
+                 *(email.email for email in location.location_email_set.all()),
+                 *_phone_parts(location.location_phone_set.all()),
+                 *_address_parts(location.lkp_physicalAddress_id),
+                 *_address_parts(location.lkp_mailingAddress_id)]
+        yield location.pk, location.name, location.name, parts
+
+
+_DOCUMENTS = {"person": _person_documents, "location": _location_documents}
+
+
+def _match_rank(query):
+    """Rank how ``query`` meets the normalized display name."""
+    return Case(
+        When(name=query, then=Value(EXACT)),
+        When(padded_name__contains=f" {query} ", then=Value(WORD)),
+        When(padded_name__contains=f" {query}", then=Value(PREFIX)),
+        When(name__contains=query, then=Value(SUBSTRING)),
+        default=Value(ELSEWHERE),
+        output_field=IntegerField(),
+    )
+
+
+class NgramIndex:
+    """Trigram postings in ``search_gram``; works on every database."""
+
+    name = "ngram"
+
+    def write(self, connection, entries):
+        SearchGram.objects.using(connection.alias).bulk_create(
+            [SearchGram(entry_id=pk, gram=gram) for pk, text in entries
+             for gram in sorted({g for word in text.split() for g in grams(word)})],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+    def clear(self, connection, entry_ids):
+        # Postings go with their entries (on_delete=CASCADE).
+        pass
+
+    def match(self, entries, terms):
+        for term in terms:
+            term_grams = grams(term)
+            postings = (SearchGram.objects.filter(gram__in=term_grams)
+                        .values("entry")
+                        .annotate(hits=Count("gram", distinct=True))
+                        .filter(hits=len(term_grams))
+                        .values("entry"))
+            # All trigrams present does not yet mean they are adjacent.
+            entries = entries.filter(pk__in=postings, text__contains=term)
+        return entries
+
+
+class SQLiteFTSIndex:
+    """FTS5 table with the ``trigram`` tokenizer (SQLite 3.34+)."""
+
+    name = "fts5"
+
+    def ensure(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(text, tokenize='trigram')"
+            )
+
+    def write(self, connection, entries):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)", list(entries))
+
+    def clear(self, connection, entry_ids):
+        with connection.cursor() as cursor:
+            for start in range(0, len(entry_ids), INDEX_BATCH_SIZE):
+                batch = entry_ids[start:start + INDEX_BATCH_SIZE]
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+
+    def match(self, entries, terms):
+        expression = " AND ".join('"%s"' % term.replace('"', '""') for term in terms)
+        return entries.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]))
+
+
+class PostgresTrigramIndex:
+    """``pg_trgm`` GIN index over ``search_entry.text``."""
+
+    name = "trigram"
+
+    def ensure(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute("CREATE INDEX IF NOT EXISTS search_entry_text_trgm "
+                           "ON search_entry USING gin (text gin_trgm_ops)")
+
+    def write(self, connection, entries):
+        pass
+
+    def clear(self, connection, entry_ids):
+        pass
+
+    def match(self, entries, terms):
+        for term in terms:
+            entries = entries.filter(text__contains=term)
+        return entries
+
+
+class SQLServerFullTextIndex:
+    """Full-text index over ``search_entry.text``, maintained by SQL Server."""
+
+    name = "fulltext"
+
+    def write(self, connection, entries):
+        pass
+
+    def clear(self, connection, entry_ids):
+        pass
+
+    def match(self, entries, terms):
+        expression = " AND ".join('"%s*"' % term.replace('"', '""') for term in terms)
+        return entries.filter(pk__in=RawSQL(
+            "SELECT [KEY] FROM CONTAINSTABLE(search_entry, text, %s)", [expression]))
+
+
+INDEXES = {index.name: index for index in (
+    NgramIndex(), SQLiteFTSIndex(), PostgresTrigramIndex(), SQLServerFullTextIndex(),
+)}
+
+# Native index per database vendor.
+NATIVE_INDEXES = {"sqlite": "fts5", "postgresql": "trigram", "microsoft": "fulltext"}
+
+_DETECTED = {}
+
+
+def _detect(connection):
+    """Return the native index of ``connection`` when it has been set up, else ``ngram``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            return "fts5" if cursor.fetchone() else "ngram"
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            return "trigram" if cursor.fetchone() else "ngram"
+        if connection.vendor == "microsoft":
+            cursor.execute("SELECT OBJECTPROPERTYEX(OBJECT_ID('search_entry'), "
+                           "'TableHasActiveFulltextIndex')")
+            row = cursor.fetchone()
+            return "fulltext" if row and row[0] == 1 else "ngram"
+    return "ngram"
+
+
+def search_index(connection):
+    """Return the index used on ``connection`` (``settings.SEARCH_BACKEND``)."""
+    name = settings.SEARCH_BACKEND
+    if name == "auto":
+        if connection.alias not in _DETECTED:
+            _DETECTED[connection.alias] = _detect(connection)
+            logger.info('Search index on %s: %s', connection.alias, _DETECTED[connection.alias])
+        name = _DETECTED[connection.alias]
+    return INDEXES[name]
+
+
+def ensure_search_schema(using="default"):
+    """Create the native index of the database where it can be; run after ``migrate``.
+
+    When that fails (no FTS5, no permission to create ``pg_trgm``) the
+    n-gram index is used instead."""
+    connection = connections[using]
+    index = INDEXES.get(NATIVE_INDEXES.get(connection.vendor))
+    if index is None or not hasattr(index, "ensure") or settings.SEARCH_BACKEND not in ("auto", index.name):
+        return
+    try:
+        with transaction.atomic(using=using):
+            index.ensure(connection)
+    except DatabaseError as exc:
+        logger.warning('Could not create the %s search index, using n-grams: %s', index.name, exc)
+    _DETECTED.pop(using, None)
+
+
+def index_objects(base, pks, using="default"):
+    """Rewrite the search entries of ``pks``; objects that no longer exist lose theirs.
+
+    Returns the number of entries written."""
+    connection = connections[using]
+    index = search_index(connection)
+    pks = list(pks)
+    written = 0
+    for start in range(0, len(pks), INDEX_BATCH_SIZE):
+        batch = pks[start:start + INDEX_BATCH_SIZE]
+        rows = [
+            SearchEntry(base=base, object_id=pk, title=title[:255],
+                        name=normalize(title)[:255], sort_name=normalize(sort_name)[:255],
+                        text=normalize(" \n ".join(str(p) for p in parts if p)))
+            for pk, title, sort_name, parts in _DOCUMENTS[base](batch)
+        ]
+        with transaction.atomic(using=using):
+            stale = SearchEntry.objects.using(using).filter(base=base, object_id__in=batch)
+            index.clear(connection, list(stale.values_list("pk", flat=True)))
+            stale.delete()
+            SearchEntry.objects.using(using).bulk_create(rows)
+            # Not every backend returns primary keys from bulk inserts.
+            index.write(connection, SearchEntry.objects.using(using)
+                        .filter(base=base, object_id__in=batch)
+                        .values_list("pk", "text"))
+        written += len(rows)
+    return written
+
+
+def rebuild_search_index(base, batch_size=INDEX_BATCH_SIZE, using="default"):
+    """Index every object of ``base`` and drop entries of deleted ones."""
+    model, _ = SEARCH_MODELS[base]
+    pks = list(model.objects.using(using).values_list("pk", flat=True))
+    orphans = (SearchEntry.objects.using(using).filter(base=base)
+               .exclude(object_id__in=model.objects.using(using).values("pk"))
+               .values_list("object_id", flat=True))
+    written = 0
+    for start in range(0, len(pks), batch_size):
+        written += index_objects(base, pks[start:start + batch_size], using=using)
+    index_objects(base, list(orphans), using=using)
+    logger.info('Indexed %d %s search entries', written, base)
+    return written
+
+
+def search_entries(query, base, using="default"):
+    """Return the matching ``SearchEntry`` rows of ``base``, best first.
+
+    Every whitespace separated term of ``query`` must match. Rows carry a
+    ``match_rank`` (``EXACT`` to ``ELSEWHERE``) and are ordered by
+    :data:`SEARCH_ORDERING`, which :func:`api.utilities.pagination.apply_keyset`
+    can page through."""
+    terms = query_terms(query)
+    entries = SearchEntry.objects.using(using).filter(base=base)
+    indexed = [term for term in terms if len(term) >= GRAM_SIZE]
+    if indexed:
+        entries = search_index(connections[using]).match(entries, indexed)
+    for term in terms:
+        if len(term) < GRAM_SIZE:
+            entries = entries.filter(text__contains=term)
+    return (entries
+            .alias(padded_name=Concat(Value(" "), F("name"), Value(" ")))
+            .annotate(match_rank=_match_rank(" ".join(terms)))
+            .order_by(*SEARCH_ORDERING))
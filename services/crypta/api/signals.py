@@ -0,0 +1,141 @@
+"""Signal receivers that invalidate cached, data-derived responses.
+
+Any save or delete on a model that a filter tree facet reads from bumps the
+data generation in :mod:`api.utilities.cache`. ``QuerySet.update`` and
+``bulk_create`` do not send these signals; callers using them should call
+``bump_data_generation()`` themselves (the cache timeout bounds staleness
+otherwise).
+
+Saves and deletes on anything a Database grid row is built from drop the
+stored rows of the affected people and locations (see :mod:`api.gridrows`).
+
+Saves and deletes on anything a search document is built from rewrite the
+search entries of the affected people and locations (see :mod:`api.search`),
+and saves and deletes of people and locations mark the typeahead index
+stale (see :mod:`api.typeahead`).
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from .constants import DYNAMIC_FILTER_FIELDS
+from .facets import facet_models
+from .grid import grid_dependencies
+from .gridrows import READ_MODELS, invalidate_grid_rows
+from .search import SEARCH_MODELS, ensure_search_schema, index_objects
+from .typeahead import TYPEAHEAD_MODELS, bump_typeahead_generation
+from .utilities.cache import bump_data_generation
+
+BASE_MODELS = {'person': 'Person', 'location': 'Location'}
+
+
+def watched_models():
+    """Return ``(models, through_models)`` referenced by ``DYNAMIC_FILTER_FIELDS``."""
+    models, through = set(), set()
+    for base, paths in DYNAMIC_FILTER_FIELDS.items():
+        found, found_through = facet_models(apps.get_model('api', BASE_MODELS[base]), paths)
+        models |= found
+        through |= found_through
+    return models, through
+
+
+def connect_cache_invalidation():
+    models, through = watched_models()
+    for model in models:
+        uid = f'crypta-invalidate-{model._meta.label_lower}'
+        post_save.connect(bump_data_generation, sender=model, dispatch_uid=f'{uid}-save')
+        post_delete.connect(bump_data_generation, sender=model, dispatch_uid=f'{uid}-delete')
+    for model in through:
+        m2m_changed.connect(bump_data_generation, sender=model,
+                            dispatch_uid=f'crypta-invalidate-{model._meta.label_lower}-m2m')
+
+
+def _lookup_q(lookups, values):
+    q = Q()
+    for lookup in lookups:
+        q |= Q(**{f"{lookup}__in" if lookup else "pk__in": values})
+    return q
+
+
+def _instance_receiver(base, lookups):
+    def receiver(sender, instance, raw=False, **kwargs):
+        if raw or not settings.GRID_READ_MODEL or instance.pk is None:
+            return
+        invalidate_grid_rows(base, _lookup_q(lookups, [instance.pk]))
+    return receiver
+
+
+def _m2m_receiver(base, dependencies):
+    def receiver(sender, instance, action, model, pk_set, **kwargs):
+        if not settings.GRID_READ_MODEL or action not in ("post_add", "post_remove", "pre_clear"):
+            return
+        q = _lookup_q(dependencies.get(type(instance), ()), [instance.pk])
+        if pk_set:
+            q |= _lookup_q(dependencies.get(model, ()), list(pk_set))
+        if q:
+            invalidate_grid_rows(base, q)
+    return receiver
+
+
+def connect_grid_row_invalidation():
+    """Drop stored grid rows whenever data they were built from changes.
+
+    ``pre_save`` and ``pre_delete`` catch rows reached through the old
+    relations, ``post_save`` those reached through the new ones."""
+    for base in READ_MODELS:
+        dependencies = grid_dependencies(base)
+        for model, lookups in dependencies.items():
+            receiver = _instance_receiver(base, sorted(lookups))
+            uid = f'crypta-grid-rows-{base}-{model._meta.label_lower}'
+            for signal, name in ((pre_save, 'pre-save'), (post_save, 'save'), (pre_delete, 'delete')):
+                signal.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}-{name}')
+            for field in model._meta.many_to_many:
+                m2m_changed.connect(_m2m_receiver(base, dependencies), sender=field.remote_field.through,
+                                    weak=False, dispatch_uid=f'{uid}-{field.name}-m2m')
+
+
+def _search_owners(base, lookups, instance):
+    model, _ = SEARCH_MODELS[base]
+    return set(model.objects.filter(_lookup_q(lookups, [instance.pk])).values_list("pk", flat=True))
+
+
+def _search_receivers(base, lookups):
+    """Remember the owners before a change and reindex old and new ones after it."""
+    attr = f'_search_owners_{base}'
+
+    def before(sender, instance, raw=False, **kwargs):
+        if raw or instance.pk is None:
+            return
+        setattr(instance, attr, _search_owners(base, lookups, instance))
+
+    def after(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        owners = getattr(instance, attr, set()) | _search_owners(base, lookups, instance)
+        if owners:
+            index_objects(base, sorted(owners))
+    return before, after
+
+
+def connect_search_index():
+    """Keep search entries current as the rows they are built from change."""
+    for base, (_, dependencies) in SEARCH_MODELS.items():
+        for model, lookups in dependencies.items():
+            before, after = _search_receivers(base, lookups)
+            uid = f'crypta-search-{base}-{model._meta.label_lower}'
+            pre_save.connect(before, sender=model, weak=False, dispatch_uid=f'{uid}-pre-save')
+            post_save.connect(after, sender=model, weak=False, dispatch_uid=f'{uid}-save')
+            pre_delete.connect(before, sender=model, weak=False, dispatch_uid=f'{uid}-pre-delete')
+            post_delete.connect(after, sender=model, weak=False, dispatch_uid=f'{uid}-delete')
+
+
+def connect_typeahead_invalidation():
+    for model, _, _ in TYPEAHEAD_MODELS.values():
+        uid = f'crypta-typeahead-{model._meta.label_lower}'
+        post_save.connect(bump_typeahead_generation, sender=model, dispatch_uid=f'{uid}-save')
+        post_delete.connect(bump_typeahead_generation, sender=model, dispatch_uid=f'{uid}-delete')
+
+
+def create_search_schema(sender, using='default', **kwargs):
+    ensure_search_schema(using)
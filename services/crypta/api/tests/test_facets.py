@@ -0,0 +1,166 @@
+import json
+import time
+from datetime import date
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.constants import DYNAMIC_FILTER_FIELDS
+from api.facets import compute_facets
+from api.utilities.cache import data_generation
+from api.models import (
+    Address, Assignment, AssignmentType, Church_Detail, County, Location,
+    Person, Person_Status, Priest_Detail, Status, Vicariate,
+)
+
+
+def _per_path_counts(qs, paths):
+    """The filter tree's original one-query-per-facet implementation."""
+    out = {}
+    for path in paths:
+        rows = qs.values(path).annotate(count=Count(path)).order_by()
+        out[path] = sorted((r[path], r['count']) for r in rows if r[path] is not None)
+    return out
+
+
+class FacetFixtureMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        county = County.objects.create(name='Mecklenburg')
+        vicariate = Vicariate.objects.create(name='Charlotte')
+        home = Address.objects.create(friendlyName='Home', address1='1 Main', city='Charlotte',
+                                      state='NC', zip_code='28202', country='US')
+        church = Location.objects.create(name='St. Mary', type='church', lkp_county_id=county,
+                                         lkp_vicariate_id=vicariate, lkp_mailingAddress_id=home)
+        school = Location.objects.create(name='St. Ann School', type='school')
+        Church_Detail.objects.create(lkp_location_id=church, parishUniqueName='St. Mary',
+                                     is_mission=False, is_doc=True, parish_id=1)
+        pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        active = Status.objects.create(name='Active', type='priest')
+        retired = Status.objects.create(name='Retired', type='priest')
+        for idx in range(4):
+            person = Person.objects.create(
+                personType='priest' if idx % 2 else 'deacon', name_first=f'P{idx}',
+                name_last=f'Doe{idx}', is_safeEnvironmentTraining=bool(idx % 2),
+                date_baptism=date(1980 + idx % 2, 1, 1),
+                lkp_residence_id=home if idx < 3 else None,
+            )
+            for loc in (church, school)[: idx % 3]:
+                Assignment.objects.create(lkp_person_id=person, lkp_location_id=loc,
+                                          lkp_assignmentType_id=pastor,
+                                          date_assigned=date(2020, 1, 1))
+            Person_Status.objects.create(lkp_person_id=person, lkp_status_id=active,
+                                         date_assigned=date(2020, 1, 1))
+            if idx == 0:
+                Person_Status.objects.create(lkp_person_id=person, lkp_status_id=retired,
+                                             date_assigned=date(2021, 1, 1))
+                Priest_Detail.objects.create(lkp_person_id=person, diocesanReligious='diocesan',
+                                             is_massEnglish=True)
+
+
+class ComputeFacetsTests(FacetFixtureMixin, TestCase):
+
+    def test_matches_per_path_counts(self):
+        for base, model in (('person', Person), ('location', Location)):
+            paths = DYNAMIC_FILTER_FIELDS[base]
+            with self.subTest(base=base):
+                self.assertEqual(compute_facets(model.objects.all(), paths),
+                                 _per_path_counts(model.objects.all(), paths))
+
+    def test_counts_respect_the_filtered_set(self):
+        qs = Person.objects.filter(personType='priest')
+        facets = compute_facets(qs, ['personType', 'person_status__lkp_status_id__name'])
+
+        self.assertEqual(facets['personType'], [('priest', 2)])
+        self.assertEqual(facets['person_status__lkp_status_id__name'], [('Active', 2)])
+
+    def test_values_keep_their_python_types(self):
+        facets = compute_facets(Person.objects.all(),
+                                ['is_safeEnvironmentTraining', 'date_baptism'])
+
+        self.assertEqual(facets['is_safeEnvironmentTraining'], [(False, 2), (True, 2)])
+        self.assertEqual(facets['date_baptism'], [(date(1980, 1, 1), 2), (date(1981, 1, 1), 2)])
+
+    def test_every_facet_is_answered_in_one_round_trip(self):
+        with CaptureQueriesContext(connection) as ctx:
+            compute_facets(Person.objects.filter(personType='priest'),
+                           DYNAMIC_FILTER_FIELDS['person'])
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_empty_queryset_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            facets = compute_facets(Person.objects.none(), ['personType'])
+        self.assertEqual(facets, {'personType': []})
+
+
+class FilterTreeViewTests(FacetFixtureMixin, APITestCase):
+
+    def test_filter_tree_lists_counts_per_field(self):
+        response = self.client.get(
+            '/api/v1/filter_tree', {'base': 'person'},
+            HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        tree = {f['field']: f for f in response.json()['filter_tree']}
+        self.assertEqual(tree['personType']['options'], [
+            {'value': 'deacon', 'label': 'deacon', 'count': 2},
+            {'value': 'priest', 'label': 'priest', 'count': 2},
+        ])
+        self.assertNotIn('date_deceased', tree)
+
+
+class FilterTreeCacheTests(FacetFixtureMixin, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _tree(self, perms, filters=None):
+        params = {'base': 'person'}
+        if filters is not None:
+            params['filters'] = json.dumps(filters)
+        response = self.client.get('/api/v1/filter_tree', params,
+                                   HTTP_X_QUERY_PERMISSIONS=json.dumps(perms))
+        return {f['field']: f['options'] for f in response.json()['filter_tree']}
+
+    def test_equivalent_requests_share_a_cache_entry(self):
+        perms = [{'resource': 'person', 'filters': {'personType': ['priest', 'deacon']}},
+                 {'resource': 'assignment', 'filters': {}}]
+        first = self._tree(perms, ['personType:priest', 'personType:deacon'])
+
+        with self.assertNumQueries(0):
+            second = self._tree(perms[::-1], ['personType:deacon', 'personType:priest'])
+        self.assertEqual(first, second)
+        self.assertEqual(len(first['personType']), 2)
+
+    def test_saving_a_watched_model_invalidates_the_tree(self):
+        perms = [{'resource': 'person', 'filters': {}}]
+        before = self._tree(perms)
+        Person.objects.create(personType='priest', name_first='New', name_last='Priest')
+        after = self._tree(perms)
+
+        self.assertIn({'value': 'priest', 'label': 'priest', 'count': 2}, before['personType'])
+        self.assertIn({'value': 'priest', 'label': 'priest', 'count': 3}, after['personType'])
+
+    def test_related_model_changes_invalidate_the_tree(self):
+        perms = [{'resource': 'person', 'filters': {}}]
+        before = self._tree(perms)
+        Status.objects.filter(name='Retired').get().delete()
+        after = self._tree(perms)
+
+        self.assertIn('Retired', [o['value'] for o in before['person_status__lkp_status_id__name']])
+        self.assertNotIn('Retired', [o['value'] for o in after['person_status__lkp_status_id__name']])
+
+    def test_generation_counter_expires(self):
+        # A process that missed a bump made elsewhere moves on once it lapses.
+        first = data_generation()
+        later = time.time() + settings.CACHE_GENERATION_TIMEOUT + 1
+        with patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertNotEqual(data_generation(), first)
@@ -0,0 +1,332 @@
+from datetime import date
+
+from django.db import connection
+from django.db.models import F, OuterRef
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.models import (
+    Assignment, AssignmentType, CampusMinistry_Detail, Church_Detail, Church_Language, EmailType,
+    Hospital_Detail, Language, LanguageProficiency, Location, Location_Email,
+    MissionConnection, OctoberMassCount, Offertory, OtherEntity_Detail, Person,
+    Person_Email, Person_Language, Person_Phone, Person_Relationship,
+    Person_Title, PhoneType, Priest_Detail, RelationshipType,
+    SocialOutreachProgram, StatusAnimarum, Title,
+)
+from api.grid import STATS_HISTOGRAM_BINS, GridSummary, grid_columns
+from api.utilities.aggregates import StringAgg
+from api.views import _get_grid_page, _get_grid_results
+
+PERSON_PERMS = [{'resource': 'person', 'filters': {}}]
+LOCATION_PERMS = [{'resource': 'location', 'filters': {}}]
+
+
+def _rows_both_ways(base, perms):
+    """Grid rows from the database path and from the Python builder."""
+    sql_rows, _, _ = _get_grid_results(base, perms, [])
+    with override_settings(GRID_SQL_ROWS=False):
+        python_rows, _, _ = _get_grid_results(base, perms, [])
+    return [list(r.items()) for r in sql_rows], [list(r.items()) for r in python_rows]
+
+
+@override_settings(GRID_READ_MODEL=False, GRID_SQL_ROWS=False)
+class PersonGridQueryCountTests(TestCase):
+    """The person grid must cost the same number of queries for any row count.
+
+    Runs the prefetch-based builder, which keyset pages use when the read
+    model is off."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personal = EmailType.objects.create(name='Personal')
+        cls.parish = EmailType.objects.create(name='Parish')
+        cls.cell = PhoneType.objects.create(name='Cell')
+        cls.english = Language.objects.create(name='English')
+        cls.fluent = LanguageProficiency.objects.create(name='Fluent')
+        cls.vicar = Title.objects.create(name='Vicar', personType='priest', is_ecclesiastical=True)
+        cls.pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        cls.church = Location.objects.create(name='St. Mary', type='church')
+        cls.sibling = RelationshipType.objects.create(name='Sibling')
+
+    def _make_person(self, idx):
+        person = Person.objects.create(
+            personType='priest', name_first=f'John{idx}', name_last=f'Doe{idx}',
+        )
+        Person_Email.objects.create(lkp_person_id=person, lkp_emailType_id=self.personal,
+                                    email=f'john{idx}@example.com', is_primary=True)
+        Person_Email.objects.create(lkp_person_id=person, lkp_emailType_id=self.parish,
+                                    email=f'parish{idx}@example.com', is_primary=False)
+        Person_Phone.objects.create(lkp_person_id=person, lkp_phoneType_id=self.cell,
+                                    phoneNumber='+15555555555', is_primary=True)
+        Person_Language.objects.create(lkp_person_id=person, lkp_language_id=self.english,
+                                       lkp_languageProficiency_id=self.fluent)
+        Person_Title.objects.create(lkp_person_id=person, lkp_title_id=self.vicar,
+                                    date_assigned=date(2020, 1, 1))
+        Assignment.objects.create(lkp_person_id=person, lkp_location_id=self.church,
+                                  lkp_assignmentType_id=self.pastor,
+                                  date_assigned=date(2020, 1, 1))
+        Assignment.objects.create(lkp_person_id=person, lkp_location_id=self.church,
+                                  lkp_assignmentType_id=self.pastor,
+                                  date_assigned=date(2010, 1, 1),
+                                  date_released=date(2015, 1, 1))
+        Priest_Detail.objects.create(lkp_person_id=person, lkp_placeOfBaptism_id=self.church,
+                                     diocesanReligious='diocesan')
+        return person
+
+    def _count_grid_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            records, _, _ = _get_grid_results('person', PERSON_PERMS, [])
+        return len(ctx.captured_queries), records
+
+    def test_query_count_is_independent_of_row_count(self):
+        first = self._make_person(0)
+        single, _ = self._count_grid_queries()
+
+        people = [first] + [self._make_person(i) for i in range(1, 6)]
+        Person_Relationship.objects.create(lkp_relationshipType_id=self.sibling,
+                                           lkp_firstPerson_id=people[0],
+                                           lkp_secondPerson_id=people[1])
+        many, records = self._count_grid_queries()
+
+        self.assertEqual(len(records), 6)
+        self.assertEqual(single, many)
+
+    def test_rows_are_partitioned_from_prefetched_data(self):
+        person = self._make_person(0)
+        records, _, _ = _get_grid_results('person', PERSON_PERMS, [])
+        rec = records[0]
+
+        self.assertEqual(rec['id'], person.pk)
+        self.assertEqual(rec['Personal Emails'], 'john0@example.com')
+        self.assertEqual(rec['Parish Emails'], 'parish0@example.com')
+        self.assertEqual(rec['Diocesan Emails'], '')
+        self.assertEqual(rec['Cell Phones'], '+15555555555')
+        self.assertEqual(rec['Ecclesiastical Offices'], 'Vicar')
+        self.assertEqual(rec['Assignments'].count('Pastor@St. Mary'), 1)
+        self.assertTrue(rec['Is Priest?'])
+        self.assertFalse(rec['Is Deacon?'])
+        self.assertEqual(rec['Place of Baptism'], 'St. Mary')
+
+    def test_page_query_count_is_independent_of_row_count(self):
+        self._make_person(0)
+        with CaptureQueriesContext(connection) as single:
+            _get_grid_page('person', PERSON_PERMS, [], 10)
+        for i in range(1, 6):
+            self._make_person(i)
+        with CaptureQueriesContext(connection) as many:
+            records, _, _, _ = _get_grid_page('person', PERSON_PERMS, [], 10)
+        self.assertEqual(len(records), 6)
+        self.assertEqual(len(single.captured_queries), len(many.captured_queries))
+
+
+@override_settings(GRID_SQL_ROWS=True)
+class PersonGridSQLRowsTests(PersonGridQueryCountTests):
+    """The person grid built in the database, checked against the builder."""
+
+    def test_sql_rows_match_python_builder(self):
+        people = [self._make_person(i) for i in range(3)]
+        Person_Relationship.objects.create(lkp_relationshipType_id=self.sibling,
+                                           lkp_firstPerson_id=people[0],
+                                           lkp_secondPerson_id=people[1])
+        Person.objects.create(personType='lay', name_first='ann', name_last='lee', prefix='ms',
+                              date_birth=date(1980, 5, 1))
+
+        sql_rows, python_rows = _rows_both_ways('person', PERSON_PERMS)
+        self.assertEqual(len(sql_rows), 4)
+        self.assertEqual(sql_rows, python_rows)
+        with self.assertNumQueries(1):
+            _get_grid_results('person', PERSON_PERMS, [])
+
+
+@override_settings(GRID_READ_MODEL=False, GRID_SQL_ROWS=False)
+class LocationGridQueryCountTests(TestCase):
+    """The location grid must cost the same number of queries for any row count.
+
+    Runs the prefetch-based builder, which keyset pages use when the read
+    model is off."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.email_type = EmailType.objects.create(name='Parish')
+        cls.spanish = Language.objects.create(name='Spanish')
+        cls.pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        cls.priest = Person.objects.create(personType='priest', name_first='John', name_last='Doe')
+
+    def _make_church(self, idx):
+        church = Location.objects.create(name=f'Church {idx}', type='church')
+        Church_Detail.objects.create(lkp_location_id=church, parishUniqueName=f'Parish {idx}',
+                                     is_mission=False, is_doc=True, parish_id=idx)
+        Church_Language.objects.create(lkp_church_id=church, lkp_language_id=self.spanish,
+                                       massTime='10:00')
+        Location_Email.objects.create(lkp_location_id=church, lkp_emailType_id=self.email_type,
+                                      email=f'church{idx}@example.com', is_primary=True)
+        Assignment.objects.create(lkp_person_id=self.priest, lkp_location_id=church,
+                                  lkp_assignmentType_id=self.pastor,
+                                  date_assigned=date(2020, 1, 1))
+        Hospital_Detail.objects.create(lkp_location_id=church, facilityType='hospital',
+                                       diocese='diocese_of_charlotte',
+                                       lkp_parishBoundary_id=church)
+        OtherEntity_Detail.objects.create(lkp_location_id=church)
+        for year, income in [('2022-23', 100), ('2024-25', 300), ('2023-24', 200)]:
+            Offertory.objects.create(lkp_church_id=church, year=year, income=income)
+            OctoberMassCount.objects.create(lkp_church_id=church, year=year,
+                                            week1=income, week2=0, week3=0, week4=0)
+            StatusAnimarum.objects.create(lkp_church_id=church, year=year, deaths=income)
+        return church
+
+    def _count_grid_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            records, _, stats_info = _get_grid_results('location', LOCATION_PERMS, [])
+        return len(ctx.captured_queries), records, stats_info
+
+    def test_query_count_is_independent_of_row_count(self):
+        churches = [self._make_church(0)]
+        single, _, _ = self._count_grid_queries()
+
+        churches += [self._make_church(i) for i in range(1, 6)]
+        MissionConnection.objects.create(lkp_mission_id=churches[0], lkp_parish_id=churches[1])
+        many, records, _ = self._count_grid_queries()
+
+        self.assertEqual(len(records), 6)
+        self.assertEqual(single, many)
+
+    def test_latest_year_statistics_are_used(self):
+        self._make_church(0)
+        _, records, stats_info = self._count_grid_queries()
+        rec = records[0]
+
+        self.assertEqual(rec['Offertory'], 300)
+        self.assertEqual(rec['October Mass Count'], 300)
+        self.assertEqual(rec['Deaths'], 300)
+        self.assertEqual(rec['Parish Name'], 'Parish 0')
+        self.assertEqual(rec['Parish Boundary'], 'Church 0')
+        self.assertTrue(rec['Is Other Entity'])
+        deaths = next(s for s in stats_info if s['field'] == 'Deaths')
+        self.assertEqual((deaths['min'], deaths['max']), (300.0, 300.0))
+
+    def test_page_query_count_is_independent_of_row_count(self):
+        self._make_church(0)
+        with CaptureQueriesContext(connection) as single:
+            _get_grid_page('location', LOCATION_PERMS, [], 10)
+        for i in range(1, 6):
+            self._make_church(i)
+        with CaptureQueriesContext(connection) as many:
+            records, _, _, _ = _get_grid_page('location', LOCATION_PERMS, [], 10)
+        self.assertEqual(len(records), 6)
+        self.assertEqual(len(single.captured_queries), len(many.captured_queries))
+
+
+@override_settings(GRID_SQL_ROWS=True)
+class LocationGridSQLRowsTests(LocationGridQueryCountTests):
+    """The location grid built in the database, checked against the builder."""
+
+    def test_sql_rows_match_python_builder(self):
+        churches = [self._make_church(i) for i in range(2)]
+        MissionConnection.objects.create(lkp_mission_id=churches[0], lkp_parish_id=churches[1])
+        SocialOutreachProgram.objects.create(name='Food Pantry').location.add(churches[0])
+        campus = Location.objects.create(name='Campus', type='campus_ministry', website='example.org')
+        CampusMinistry_Detail.objects.create(lkp_location_id=campus, lkp_church_id=churches[0],
+                                             is_massAtParish=True, universityServed='UNCC')
+
+        sql_rows, python_rows = _rows_both_ways('location', LOCATION_PERMS)
+        self.assertEqual(len(sql_rows), 3)
+        self.assertEqual(sql_rows, python_rows)
+
+    def test_latest_year_row_is_picked_once_per_row(self):
+        self._make_church(0)
+
+        def status_animarum_reads(names):
+            with CaptureQueriesContext(connection) as ctx:
+                _get_grid_results('location', LOCATION_PERMS, [], grid_columns('location', names))
+            return ctx.captured_queries[-1]['sql'].count('"statusAnimarum"')
+
+        self.assertEqual(
+            status_animarum_reads(['Deaths']),
+            status_animarum_reads(['Deaths', 'Baptisms 1-7', 'Confirmation', 'Volunteers', 'Max Mass Size']),
+        )
+
+
+@override_settings(GRID_READ_MODEL=False)
+class GridColumnProjectionTests(TestCase):
+    """``columns=`` limits the grid to the work its columns need."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personal = EmailType.objects.create(name='Personal')
+        cls.church = Location.objects.create(name='St. Mary', type='church')
+        cls.person = Person.objects.create(personType='priest', name_first='John', name_last='Doe')
+        Person_Email.objects.create(lkp_person_id=cls.person, lkp_emailType_id=cls.personal,
+                                    email='john@example.com', is_primary=True)
+        Priest_Detail.objects.create(lkp_person_id=cls.person, lkp_placeOfBaptism_id=cls.church,
+                                     birth_city='Charlotte', birth_state='NC')
+
+    def test_core_column_costs_a_single_query(self):
+        columns = grid_columns('person', ['Full Name'])
+        with self.assertNumQueries(1):
+            records, cols, _ = _get_grid_results('person', PERSON_PERMS, [], columns)
+        self.assertEqual(records, [{'id': self.person.pk, 'Full Name': 'John Doe'}])
+        self.assertEqual([c['field'] for c in cols], ['id', 'Full Name'])
+
+    def test_projected_values_match_the_full_row(self):
+        full, _, _ = _get_grid_results('person', PERSON_PERMS, [])
+        names = ['Birth (City,State)', 'Personal Emails', 'Is Deacon?']
+        projected, _, _ = _get_grid_results('person', PERSON_PERMS, [], grid_columns('person', names))
+        self.assertEqual(projected[0], {'id': self.person.pk, **{n: full[0][n] for n in names}})
+        self.assertEqual(projected[0]['Birth (City,State)'], 'Charlotte, NC')
+
+    def test_unknown_columns_are_rejected(self):
+        with self.assertRaises(ValueError):
+            grid_columns('location', ['Name', 'Nope'])
+        response = self.client.get(reverse('filter_results'), {
+            'base': 'person', 'columns': '["Full Name", "Nope"]',
+        }, HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('filter_results'), {
+            'base': 'person', 'columns': ['Full Name', 'Birth (City,State)'],
+        }, HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]')
+        self.assertEqual(set(response.json()['grid']['data'][0]), {'id', 'Full Name', 'Birth (City,State)'})
+
+
+class GridSummaryStatsTests(TestCase):
+
+    def test_numeric_boolean_and_mixed_columns(self):
+        summary = GridSummary()
+        for deaths, census, capacity in [(1, True, 100), (3, False, ''), (None, True, 200), (8, None, 300)]:
+            summary.add({'Deaths': deaths, 'Estimate Census?': census, 'Seating Capacity': capacity,
+                         'Name': 'x'})
+        summary.add({'Name': 'no stats'})
+        stats = {s['field']: s for s in summary.stats_info()}
+
+        deaths = stats['Deaths']
+        self.assertEqual(deaths['type'], 'number')
+        self.assertEqual((deaths['min'], deaths['max'], deaths['sum']), (1.0, 8.0, 12.0))
+        self.assertEqual((deaths['mean'], deaths['median']), (4.0, 3.0))
+        self.assertEqual((deaths['count'], deaths['nulls']), (3, 2))
+        self.assertEqual(sum(deaths['histogram']['counts']), 3)
+        self.assertEqual(len(deaths['histogram']['edges']), STATS_HISTOGRAM_BINS + 1)
+        census = stats['Estimate Census?']
+        self.assertEqual(census['type'], 'boolean')
+        self.assertEqual((census['true'], census['false'], census['nulls']), (2, 1, 2))
+        # A blank cell makes the column non-numeric, as before.
+        self.assertNotIn('Seating Capacity', stats)
+        self.assertNotIn('Name', stats)
+
+
+class StringAggTests(TestCase):
+    """Joined child rows keep the requested order on every backend."""
+
+    def test_rows_are_joined_in_order(self):
+        personal = EmailType.objects.create(name='Personal')
+        person = Person.objects.create(personType='lay', name_first='Ann', name_last='Doe')
+        for email in ['b@example.com', 'c@example.com', 'a@example.com']:
+            Person_Email.objects.create(lkp_person_id=person, lkp_emailType_id=personal,
+                                        email=email, is_primary=False)
+        emails = Person_Email.objects.filter(lkp_person_id=OuterRef('pk'))
+
+        def joined(ordering):
+            agg = StringAgg(emails, F('email'), ', ', ordering=ordering)
+            return Person.objects.values_list(agg, flat=True).get()
+
+        self.assertEqual(joined(['email']), 'a@example.com, b@example.com, c@example.com')
+        self.assertEqual(joined(['-email']), 'c@example.com, b@example.com, a@example.com')
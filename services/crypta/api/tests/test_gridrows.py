@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.grid import iter_grid_records
+from api.gridrows import expired_grid_rows, read_grid_records
+from api.utilities.pagination import decode_cursor
+from api.views import _get_grid_page, _get_grid_results
+from api.models import (
+    Assignment, AssignmentType, EmailType, Location, LocationGridRow, Person, Person_Email,
+    PersonGridRow, SocialOutreachProgram, StatusAnimarum,
+)
+
+
+PERSON_PERMS = [{'resource': 'person', 'filters': {}}]
+
+
+@override_settings(GRID_READ_MODEL=True)
+class GridReadModelTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personal = EmailType.objects.create(name='Personal')
+        cls.john = Person.objects.create(personType='priest', name_first='John', name_last='Doe')
+        cls.jane = Person.objects.create(personType='lay', name_first='Jane', name_last='Adams')
+        cls.church = Location.objects.create(name='St. Mary', type='church')
+        StatusAnimarum.objects.create(lkp_church_id=cls.church, year='2024-25', deaths=3)
+
+    def _read(self, base='person'):
+        qs = Person.objects.all() if base == 'person' else Location.objects.all()
+        return list(read_grid_records(qs, base))
+
+    def test_rows_are_built_once_then_read_from_the_table(self):
+        built = self._read()
+        self.assertEqual(PersonGridRow.objects.count(), 2)
+        self.assertEqual(built, list(iter_grid_records(Person.objects.all(), 'person')))
+        self.assertEqual([r['Last Name'] for r in built], ['Adams', 'Doe'])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self._read(), built)
+
+    def test_satellite_change_drops_only_affected_rows(self):
+        self._read()
+        email = Person_Email.objects.create(lkp_person_id=self.john, lkp_emailType_id=self.personal,
+                                            email='john@example.com', is_primary=True)
+        self.assertEqual(list(PersonGridRow.objects.values_list('pk', flat=True)), [self.jane.pk])
+        john = next(r for r in self._read() if r['id'] == self.john.pk)
+        self.assertEqual(john['Personal Emails'], 'john@example.com')
+
+        # Renaming the lookup row reaches the person through the email.
+        self.personal.name = 'Parish'
+        self.personal.save()
+        self.assertFalse(PersonGridRow.objects.filter(pk=self.john.pk).exists())
+        email.delete()
+        john = next(r for r in self._read() if r['id'] == self.john.pk)
+        self.assertEqual(john['Personal Emails'], '')
+
+    def test_many_to_many_changes_drop_rows(self):
+        self.assertEqual(self._read('location')[0]['Social Outreach Programs'], '')
+        SocialOutreachProgram.objects.create(name='Food Pantry').location.add(self.church)
+        self.assertFalse(LocationGridRow.objects.exists())
+        self.assertEqual(self._read('location')[0]['Social Outreach Programs'], 'Food Pantry')
+
+    def test_rows_from_an_earlier_day_are_not_rebuilt_inline(self):
+        self._read()
+        self._read('location')
+        yesterday = date.today() - timedelta(days=1)
+        PersonGridRow.objects.update(built_on=yesterday)
+        LocationGridRow.objects.update(built_on=yesterday)
+        with self.assertNumQueries(2):
+            self._read()
+        with self.assertNumQueries(2):
+            self._read('location')
+
+    def test_only_rows_with_changed_assignments_expire(self):
+        pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        mark = Person.objects.create(personType='priest', name_first='Mark', name_last='Lee')
+        today, yesterday = date.today(), date.today() - timedelta(days=1)
+        month_ago = today - timedelta(days=30)
+        for person, assigned, released in [(self.john, today, None),
+                                           (self.jane, month_ago, yesterday),
+                                           (mark, month_ago, None)]:
+            Assignment.objects.create(lkp_assignmentType_id=pastor, lkp_location_id=self.church,
+                                      lkp_person_id=person, date_assigned=assigned,
+                                      date_released=released)
+        self._read()
+        self._read('location')
+        self.assertEqual(expired_grid_rows('person'), [])
+
+        # Built yesterday: John's assignment began since, Jane's has ended.
+        PersonGridRow.objects.update(built_on=yesterday)
+        LocationGridRow.objects.update(built_on=yesterday)
+        self.assertEqual(sorted(expired_grid_rows('person')), sorted([self.john.pk, self.jane.pk]))
+        self.assertEqual(expired_grid_rows('location'), [])
+
+        out = StringIO()
+        call_command('refresh_grid_rows', '--expired', stdout=out)
+        self.assertEqual(out.getvalue().split(), ['location:', '0', 'rows', 'person:', '2', 'rows'])
+        self.assertEqual(PersonGridRow.objects.get(pk=mark.pk).built_on, yesterday)
+        self.assertEqual(expired_grid_rows('person'), [])
+
+    def test_refresh_command_rebuilds_every_row(self):
+        out = StringIO()
+        call_command('refresh_grid_rows', stdout=out)
+        self.assertEqual(out.getvalue().split(), ['location:', '1', 'rows', 'person:', '2', 'rows'])
+        self.assertEqual(LocationGridRow.objects.get().data['Deaths'], 3)
+
+    def test_pages_are_read_from_the_table(self):
+        for i in range(5):
+            Person.objects.create(personType='lay', name_first=f'P{i}', name_last='Baker')
+        whole, columns, stats_info = _get_grid_results('person', PERSON_PERMS, [])
+
+        first, first_columns, first_stats, cursor = _get_grid_page('person', PERSON_PERMS, [], 3)
+        self.assertEqual((first_columns, first_stats), (columns, stats_info))
+        records = list(first)
+        with self.assertNumQueries(2):
+            page, page_columns, _, cursor = _get_grid_page('person', PERSON_PERMS, [], 3, cursor)
+        self.assertIsNone(page_columns)
+        records += page
+        while cursor:
+            page, _, _, cursor = _get_grid_page('person', PERSON_PERMS, [], 3, cursor)
+            records += page
+        self.assertEqual(records, whole)
+
+    def test_page_cursor_matches_the_builder_path(self):
+        Person.objects.create(personType='lay', name_first='Ann', name_last='Doe')
+        _, _, _, stored = _get_grid_page('person', PERSON_PERMS, [], 2)
+        with override_settings(GRID_READ_MODEL=False):
+            _, _, _, built = _get_grid_page('person', PERSON_PERMS, [], 2)
+        self.assertEqual(decode_cursor(stored, ['name_last', 'pk']),
+                         decode_cursor(built, ['name_last', 'pk']))
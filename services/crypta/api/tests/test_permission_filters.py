@@ -1,6 +1,10 @@
+from datetime import date
+
+from django.db.models import Q
 from django.test import TestCase
-from api.models import Person
-from api.views import _apply_permission_filters
+from api.models import Assignment, AssignmentType, Location, Person, SocialOutreachProgram
+from api.utilities import compile_permissions
+from api.views import _apply_permission_filters, _apply_user_filters
 
 class ApplyPermissionFiltersTests(TestCase):
     def test_permission_on_related_resource(self):
@@ -18,3 +22,95 @@ class ApplyPermissionFiltersTests(TestCase):
         qs = Person.objects.all()
         filtered = _apply_permission_filters(qs, perms, 'person')
         self.assertQuerySetEqual(filtered, [person], transform=lambda x: x)
+
+
+class CompilePermissionsTests(TestCase):
+
+    def _compile(self, filters_list, base='location'):
+        perms = [{'resource': base, 'filters': f} for f in filters_list]
+        return compile_permissions(perms, base, Location)
+
+    def test_unknown_paths_drop_the_whole_permission(self):
+        self.assertIsNone(self._compile([{'type': 'church', 'no_such_field': 1}]))
+        self.assertEqual(self._compile([{'no_such_field': 1}, {'type': 'church'}]),
+                         Q(type='church'))
+
+    def test_in_clauses_differing_on_one_path_are_merged(self):
+        q = self._compile([{'type': 'church', 'lkp_county_id__name': 'Union'},
+                           {'type': ['school'], 'lkp_county_id__name': 'Union'}])
+        self.assertEqual(q, Q(lkp_county_id__name='Union', type__in=['church', 'school']))
+
+    def test_subsumed_permissions_are_dropped(self):
+        q = self._compile([{'type': 'church', 'name__icontains': 'mary'},
+                           {'type': ['church', 'school']}])
+        self.assertEqual(q, Q(type__in=['church', 'school']))
+
+    def test_clauses_on_one_path_are_intersected(self):
+        self.assertEqual(self._compile([{'type': ['church', 'school'], 'type__exact': 'church'}]),
+                         Q(type='church'))
+        self.assertIsNone(self._compile([{'type': 'church', 'type__exact': 'school'}]))
+
+    def test_unfiltered_permission_grants_everything(self):
+        self.assertEqual(self._compile([{'type': 'church'}, {}]), Q())
+
+    def test_compiled_q_is_memoized_on_canonical_permissions(self):
+        perms = [{'resource': 'location', 'filters': {'type': 'church'}},
+                 {'resource': 'church_detail', 'filters': {'name': 'St. Mary'}}]
+        first = compile_permissions(perms, 'location', Location)
+        second = compile_permissions(perms[::-1], 'location', Location)
+        self.assertIs(first, second)
+
+    def test_filtering_matches_the_permission_grants(self):
+        church = Location.objects.create(name='St. Mary', type='church')
+        school = Location.objects.create(name='St. Ann', type='school')
+        Location.objects.create(name='Hospice', type='hospital')
+        qs = _apply_permission_filters(Location.objects.all(), [
+            {'resource': 'location', 'filters': {'type': 'church'}},
+            {'resource': 'location', 'filters': {'type': 'school'}},
+            {'resource': 'person', 'filters': {'personType': 'priest'}},
+        ], 'location')
+        self.assertQuerySetEqual(qs.order_by('pk'), [church, school])
+
+
+class SemiJoinFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        vicar = AssignmentType.objects.create(title='Vicar', personType='priest')
+        doe = Person.objects.create(personType='priest', name_first='John', name_last='Doe')
+        smith = Person.objects.create(personType='priest', name_first='Tom', name_last='Smith')
+        cls.mixed = Location.objects.create(name='Mixed', type='church')
+        cls.match = Location.objects.create(name='Match', type='church')
+        for loc, person, kind in [(cls.mixed, smith, pastor), (cls.mixed, doe, vicar),
+                                  (cls.match, doe, pastor), (cls.match, smith, pastor)]:
+            Assignment.objects.create(lkp_person_id=person, lkp_location_id=loc,
+                                      lkp_assignmentType_id=kind, date_assigned=date(2020, 1, 1))
+        SocialOutreachProgram.objects.create(name='Food Pantry').location.add(cls.match)
+
+    def test_multi_valued_paths_become_exists_without_duplicates(self):
+        qs = _apply_user_filters(Location.objects.all(), ['assignment__lkp_assignmentType_id__title:Pastor'])
+        outer, _, subquery = str(qs.query).upper().partition(' WHERE EXISTS')
+
+        self.assertTrue(subquery)
+        self.assertNotIn('JOIN', outer)
+        self.assertQuerySetEqual(qs.order_by('name'), [self.match, self.mixed])
+
+    def test_permission_clauses_on_one_relation_match_the_same_row(self):
+        qs = _apply_permission_filters(Location.objects.all(), [{
+            'resource': 'location',
+            'filters': {'assignment__lkp_assignmentType_id__title': 'Pastor',
+                        'assignment__lkp_person_id__name_last': 'Doe'},
+        }], 'location')
+        self.assertQuerySetEqual(qs, [self.match])
+
+    def test_separate_user_filters_match_any_related_row(self):
+        qs = _apply_user_filters(Location.objects.all(), [
+            'assignment__lkp_assignmentType_id__title:Vicar',
+            'assignment__lkp_person_id__name_last:Smith',
+        ])
+        self.assertQuerySetEqual(qs, [self.mixed])
+
+    def test_many_to_many_paths(self):
+        qs = _apply_user_filters(Location.objects.all(), ['social_outreach_program__name:Food Pantry'])
+        self.assertQuerySetEqual(qs, [self.match])
@@ -0,0 +1,217 @@
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api.models import (
+    Address, EmailType, Location, Person, Person_Email, Person_Phone, PhoneType, SearchEntry,
+)
+from api.search import rebuild_search_index, search_entries, search_index
+from api.typeahead import typeahead
+
+
+class SearchIndexTests(TestCase):
+    """Search entries and matching on the database's native index."""
+
+    index = {'sqlite': 'fts5', 'postgresql': 'trigram'}.get(connection.vendor, 'ngram')
+
+    def setUp(self):
+        home = Address.objects.create(friendlyName='Home', address1='12 Maple Ave', city='Gastonia',
+                                      state='NC', zip_code='28052', country='US')
+        self.john = Person.objects.create(personType='priest', name_first='John', name_last='Smith',
+                                          lkp_residence_id=home)
+        self.johanna = Person.objects.create(personType='lay', name_first='Johanna', name_last='Ojohn')
+        self.email = Person_Email.objects.create(
+            lkp_person_id=self.john, lkp_emailType_id=EmailType.objects.create(name='Personal'),
+            email='jsmith@example.org', is_primary=True)
+        Person_Phone.objects.create(lkp_person_id=self.johanna,
+                                    lkp_phoneType_id=PhoneType.objects.create(name='Cell'),
+                                    phoneNumber='(704) 555-0199', is_primary=True)
+        Location.objects.create(name='St. John the Evangelist', type='church')
+
+    def test_index_in_use(self):
+        self.assertEqual(search_index(connection).name, self.index)
+
+    def _ids(self, query, base='person'):
+        return list(search_entries(query, base).values_list('object_id', flat=True))
+
+    def test_documents_cover_emails_phones_and_addresses(self):
+        self.assertEqual(self._ids('jsmith@example'), [self.john.pk])
+        self.assertEqual(self._ids('7045550199'), [self.johanna.pk])
+        self.assertEqual(self._ids('555-0199'), [self.johanna.pk])
+        self.assertEqual(self._ids('maple gastonia'), [self.john.pk])
+        self.assertEqual(self._ids('evangelist', 'location'), [Location.objects.get().pk])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self._ids('john smith'), [self.john.pk])
+        self.assertEqual(self._ids('JOHN 99'), [self.johanna.pk])
+
+    def test_entries_follow_changes(self):
+        self.email.delete()
+        self.assertEqual(self._ids('jsmith@example'), [])
+
+        self.johanna.name_last = 'Baker'
+        self.johanna.save()
+        self.assertEqual(self._ids('baker'), [self.johanna.pk])
+
+        self.john.delete()
+        self.assertFalse(SearchEntry.objects.filter(base='person', object_id=self.john.pk).exists())
+
+    def test_rebuild_restores_missing_entries(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(rebuild_search_index('person'), 2)
+        self.assertEqual(self._ids('smith'), [self.john.pk])
+        call_command('rebuild_search_index', '--base', 'location', stdout=StringIO())
+        self.assertEqual(len(self._ids('john', 'location')), 1)
+
+    def test_view_ranks_results_and_applies_permissions(self):
+        response = self.client.get(reverse('search'), {'q': 'john'},
+                                   HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data['results']['persons']],
+                         [self.john.pk, self.johanna.pk])
+        self.assertEqual(response.data['results']['persons'][0]['name_last'], 'Smith')
+
+        restricted = self.client.get(
+            reverse('search'), {'q': 'john'},
+            HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {"name_last": ["Ojohn"]}}]')
+        self.assertEqual([p['id'] for p in restricted.data['results']['persons']], [self.johanna.pk])
+
+
+@override_settings(SEARCH_BACKEND='ngram')
+class NgramSearchIndexTests(SearchIndexTests):
+    """The same behaviour on the portable n-gram index."""
+
+    index = 'ngram'
+
+
+class TypeaheadTests(TestCase):
+    """``/api/v1/search?mode=prefix`` answered from the in-process index."""
+
+    def setUp(self):
+        self.john = Person.objects.create(personType='priest', name_first='John', name_last='Smith')
+        self.johanna = Person.objects.create(personType='lay', name_first='Johanna', name_last='Ojohn')
+        self.church = Location.objects.create(name='St. John the Evangelist', type='church')
+
+    def _search(self, q, perms='[{"resource": "person", "filters": {}}, '
+                               '{"resource": "location", "filters": {}}]'):
+        response = self.client.get(reverse('search'), {'q': q, 'mode': 'prefix'},
+                                   HTTP_X_QUERY_PERMISSIONS=perms)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_words_are_matched_by_prefix(self):
+        results = self._search('jo')
+        self.assertEqual([p['id'] for p in results['persons']], [self.johanna.pk, self.john.pk])
+        self.assertEqual(results['persons'][1], {'id': self.john.pk, 'name_first': 'John',
+                                                 'name_last': 'Smith'})
+        self.assertEqual(self._search('JO sm')['persons'], [results['persons'][1]])
+        self.assertEqual(self._search('st. evan')['locations'],
+                         [{'id': self.church.pk, 'name': 'St. John the Evangelist'}])
+        self.assertEqual(self._search('ohn')['persons'], [])
+
+    def test_short_queries_and_paging_match_the_other_modes(self):
+        response = self.client.get(reverse('search'), {'q': 'j', 'mode': 'prefix'},
+                                   HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]')
+        self.assertEqual(response.data, {'results': {'persons': [], 'locations': []},
+                                         'next_cursor': {'persons': None, 'locations': None}})
+        response = self.client.get(reverse('search'), {'q': 'jo', 'mode': 'prefix'},
+                                   HTTP_X_QUERY_PERMISSIONS='[{"resource": "person", "filters": {}}]')
+        self.assertEqual(len(response.data['results']['persons']), 2)
+        self.assertEqual(response.data['next_cursor'], {'persons': None, 'locations': None})
+
+    def test_warm_lookups_do_not_query(self):
+        perms = [{'resource': 'person', 'filters': {'name_last': ['Smith']}}]
+        self.assertEqual([p['id'] for p in typeahead('jo', 'person', perms)], [self.john.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual([p['id'] for p in typeahead('joh', 'person', perms)], [self.john.pk])
+
+    def test_index_follows_changes(self):
+        self._search('jo')
+        self.johanna.name_first = 'Anna'
+        self.johanna.save()
+        Person.objects.create(personType='lay', name_first='Joseph', name_last='Adams')
+        self.assertEqual([p['name_first'] for p in self._search('jo')['persons']], ['Joseph', 'John'])
+
+    def test_index_is_rebuilt_once_too_old(self):
+        # Stands in for a write whose generation bump never reached this process.
+        perms = [{'resource': 'person', 'filters': {}}]
+        typeahead('jo', 'person', perms)
+        Person.objects.filter(pk=self.johanna.pk).update(name_first='Anna')
+        self.assertEqual(len(typeahead('jo', 'person', perms)), 2)
+        later = time.monotonic() + settings.TYPEAHEAD_MAX_AGE + 1
+        with patch('api.typeahead.time.monotonic', return_value=later):
+            self.assertEqual([p['id'] for p in typeahead('jo', 'person', perms)], [self.john.pk])
+
+
+class SearchPagingTests(TestCase):
+    """Ranking, budgets and paging of ``/api/v1/search``."""
+
+    perms = '[{"resource": "person", "filters": {}}, {"resource": "location", "filters": {}}]'
+
+    def setUp(self):
+        for first, last in [('Dana', 'Goldsmith'), ('Bob', 'Smith'), ('Carl', 'Smithers'),
+                            ('Ann', 'Smith'), ('Eve', 'Jones')]:
+            Person.objects.create(personType='lay', name_first=first, name_last=last)
+        Person_Email.objects.create(
+            lkp_person_id=Person.objects.get(name_last='Jones'),
+            lkp_emailType_id=EmailType.objects.create(name='Personal'),
+            email='smith.family@example.org', is_primary=True)
+        for idx in range(12):
+            Location.objects.create(name=f'Smithfield Mission {idx:02d}', type='church')
+
+    def _get(self, **params):
+        response = self.client.get(reverse('search'), params, HTTP_X_QUERY_PERMISSIONS=self.perms)
+        return response
+
+    def _names(self, response, key='persons'):
+        return [f"{p['name_first']} {p['name_last']}" for p in response.data['results'][key]]
+
+    def test_exact_then_prefix_then_substring_by_last_then_first_name(self):
+        response = self._get(q='smith')
+        self.assertEqual(self._names(response), ['Ann Smith', 'Bob Smith', 'Carl Smithers',
+                                                 'Dana Goldsmith', 'Eve Jones'])
+        # Locations have their own, smaller budget.
+        self.assertEqual(len(response.data['results']['locations']), 10)
+        self.assertIsNotNone(response.data['next_cursor']['locations'])
+        self.assertIsNone(response.data['next_cursor']['persons'])
+
+    def test_whole_name_ranks_above_whole_word(self):
+        for name in ['Chapel of Smith', 'Smith']:
+            Location.objects.create(name=name, type='church')
+        response = self._get(q='smith', type='location', limit=3)
+        self.assertEqual([loc['name'] for loc in response.data['results']['locations']],
+                         ['Smith', 'Chapel of Smith', 'Smithfield Mission 00'])
+
+    def test_limit_offset_and_cursor(self):
+        self.assertEqual(self._names(self._get(q='smith', limit=2, offset=1)),
+                         ['Bob Smith', 'Carl Smithers'])
+
+        names, cursor = [], None
+        while True:
+            params = {'q': 'smith', 'type': 'person', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            page = self._get(**params)
+            self.assertEqual(page.data['results']['locations'], [])
+            names += self._names(page)
+            cursor = page.data['next_cursor']['persons']
+            if not cursor:
+                break
+        self.assertEqual(names, self._names(self._get(q='smith')))
+
+    def test_short_queries_match_nothing(self):
+        for q in ['', ' ', 's']:
+            response = self._get(q=q)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'], {'persons': [], 'locations': []})
+
+    def test_invalid_parameters_return_400(self):
+        for params in [{'limit': 'ten'}, {'offset': '-1'}, {'type': 'parish'},
+                       {'cursor': 'abc'}, {'type': 'person', 'cursor': 'not-a-cursor'}]:
+            self.assertEqual(self._get(q='smith', **params).status_code, 400, params)
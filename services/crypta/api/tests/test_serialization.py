@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.test import TestCase
+
+from api.models import (
+    Address, Assignment, AssignmentType, Location, Person, SocialOutreachProgram,
+)
+from api.views import _prefetch_for_base, _serialize_instance
+
+
+class SerializeInstanceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = Address.objects.create(friendlyName='Home', address1='1 Main', city='Charlotte',
+                                          state='NC', zip_code='28202', country='US')
+        cls.church = Location.objects.create(name='St. Mary', type='church')
+        cls.person = Person.objects.create(personType='priest', name_first='John', name_last='Doe',
+                                           lkp_residence_id=cls.home)
+        cls.pastor = AssignmentType.objects.create(title='Pastor', personType='priest')
+        Assignment.objects.create(lkp_person_id=cls.person, lkp_location_id=cls.church,
+                                  lkp_assignmentType_id=cls.pastor, date_assigned=date(2020, 1, 1))
+        SocialOutreachProgram.objects.create(name='Food Pantry').location.add(cls.church)
+
+    def test_prefetched_rows_serialize_without_queries(self):
+        people = list(_prefetch_for_base(Person.objects.all(), 'person'))
+        locations = list(_prefetch_for_base(Location.objects.all(), 'location'))
+
+        with self.assertNumQueries(0):
+            person = _serialize_instance(people[0])
+            location = _serialize_instance(locations[0])
+
+        self.assertEqual(person['lkp_residence_id']['city'], 'Charlotte')
+        self.assertIsNone(person['lkp_mailing_id'])
+        self.assertNotIn('photo', person)
+        assignment = person['assignment_set'][0]
+        self.assertEqual(assignment['lkp_location_id'], self.church.pk)
+        self.assertEqual(assignment['lkp_assignmentType_id'], self.pastor.pk)
+        self.assertEqual([p['name'] for p in location['social_outreach_program']], ['Food Pantry'])
+
+    def test_relations_fall_back_to_the_manager_without_prefetch(self):
+        data = _serialize_instance(Person.objects.get())
+        self.assertEqual(len(data['assignment_set']), 1)
@@ -1,6 +1,247 @@
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from unittest.mock import patch
 import pyotp
+import json
 
+
+from api.models import (
+    EmailType, Ethnicity, Location, Location_Email, OctoberMassCount, Offertory, Vicariate,
+)
+from api.aggregation import time_series
+from api.views import _get_email_list
+
+
+LOCATION_PERMS = '[{"resource": "location", "filters": {}}]'
+# Cold grid read model (see api.gridrows): the missing-row check, one query
+# building the rows, the refresh (savepoint, delete, insert, release) and
+# the read itself.
+LOCATION_GRID_QUERIES = 7
+
+
+class FilterResultsPaginationTests(APITestCase):
+    """Keyset pagination mode of ``/api/v1/filter_results``."""
+
+    def setUp(self):
+        for name in ['Delta', 'Alpha', 'Charlie', 'Bravo', 'Echo']:
+            Location.objects.create(name=name, type='church')
+        self.url = reverse('filter_results')
+
+    def _get(self, **params):
+        return self.client.get(
+            self.url,
+            {'base': 'location', **params},
+            HTTP_X_QUERY_PERMISSIONS=LOCATION_PERMS,
+        )
+
+    def test_pages_follow_meta_ordering_and_cover_the_set(self):
+        first = self._get(page_size=2)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['Name'] for r in first.data['grid']['data']], ['Alpha', 'Bravo'])
+        self.assertIsNotNone(first.data['grid']['columns'])
+        self.assertIsNotNone(first.data['next_cursor'])
+
+        names = [r['Name'] for r in first.data['grid']['data']]
+        cursor = first.data['next_cursor']
+        while cursor:
+            page = self._get(page_size=2, cursor=cursor)
+            self.assertEqual(page.status_code, status.HTTP_200_OK)
+            self.assertIsNone(page.data['grid']['columns'])
+            self.assertIsNone(page.data['stats_info'])
+            names += [r['Name'] for r in page.data['grid']['data']]
+            cursor = page.data['next_cursor']
+
+        self.assertEqual(names, ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo'])
+
+    def test_duplicate_sort_keys_are_not_skipped(self):
+        Location.objects.create(name='Alpha', type='school')
+        first = self._get(page_size=1)
+        second = self._get(page_size=1, cursor=first.data['next_cursor'])
+        ids = {first.data['grid']['data'][0]['id'], second.data['grid']['data'][0]['id']}
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(second.data['grid']['data'][0]['Name'], 'Alpha')
+
+    def test_invalid_parameters_return_400(self):
+        self.assertEqual(self._get(page_size='abc').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._get(page_size=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._get(cursor='not-a-cursor').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unpaginated_response_is_unchanged(self):
+        response = self._get()
+        self.assertEqual(len(response.data['grid']['data']), 5)
+        self.assertNotIn('next_cursor', response.data)
+
+
+class FilterResultsStreamingTests(APITestCase):
+    """NDJSON streaming mode of ``/api/v1/filter_results``."""
+
+    def setUp(self):
+        for name in ['Alpha', 'Bravo', 'Charlie']:
+            Location.objects.create(name=name, type='church')
+        self.url = reverse('filter_results')
+
+    def test_rows_are_streamed_with_summary_trailer(self):
+        response = self.client.get(
+            self.url,
+            {'base': 'location', 'format': 'ndjson'},
+            HTTP_X_QUERY_PERMISSIONS=LOCATION_PERMS,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = [json.loads(line) for line in
+                 b''.join(response.streaming_content).decode().splitlines()]
+        rows, trailer = lines[:-1], lines[-1]
+        self.assertEqual([r['Name'] for r in rows], ['Alpha', 'Bravo', 'Charlie'])
+        self.assertEqual(trailer['type'], 'summary')
+        self.assertEqual(trailer['count'], 3)
+        self.assertIn('Name', [c['field'] for c in trailer['columns']])
+
+
+class AggregateViewTests(APITestCase):
+    """Grouped parish statistics from ``/api/v1/aggregate``."""
+
+    def setUp(self):
+        north = Vicariate.objects.create(name='North')
+        south = Vicariate.objects.create(name='South')
+        for name, vicariate, income, weeks in [
+            ('Alpha', north, 100, (10, 20, 30, 40)),
+            ('Bravo', north, 300, (1, 1, 1, 1)),
+            ('Charlie', south, 50, (5, 5, 5, 5)),
+        ]:
+            church = Location.objects.create(name=name, type='church', lkp_vicariate_id=vicariate)
+            Offertory.objects.create(lkp_church_id=church, year='2023-24', income=income)
+            OctoberMassCount.objects.create(lkp_church_id=church, year='2023-24',
+                                            week1=weeks[0], week2=weeks[1],
+                                            week3=weeks[2], week4=weeks[3])
+        Location.objects.create(name='Delta', type='school')
+        self.url = reverse('aggregate')
+
+    def _get(self, perms=LOCATION_PERMS, **params):
+        return self.client.get(self.url, {'base': 'location', **params},
+                               HTTP_X_QUERY_PERMISSIONS=perms)
+
+    def test_metrics_are_grouped_by_dimension(self):
+        response = self._get(group_by='vicariate',
+                             metrics='offertory.income:sum,october.total:max,offertory.income:avg')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['groups'], [
+            {'vicariate': 'North', 'offertory.income:sum': 400,
+             'october.total:max': 100, 'offertory.income:avg': 200.0},
+            {'vicariate': 'South', 'offertory.income:sum': 50,
+             'october.total:max': 20, 'offertory.income:avg': 50.0},
+        ])
+
+    def test_permission_filters_restrict_the_churches(self):
+        perms = '[{"resource": "location", "filters": {"name": ["Alpha", "Charlie"]}}]'
+        response = self._get(perms=perms, group_by='year', metrics=['offertory.income:sum'])
+        self.assertEqual(response.data['groups'], [{'year': '2023-24', 'offertory.income:sum': 150}])
+
+    def test_invalid_requests_return_400(self):
+        for params in [{'group_by': 'parish', 'metrics': 'offertory.income:sum'},
+                       {'group_by': 'year', 'metrics': 'offertory.lkp_church_id:sum'},
+                       {'group_by': 'year', 'metrics': 'offertory.income:median'},
+                       {'group_by': 'year'},
+                       {'group_by': 'year', 'metrics': 'offertory.income:sum', 'base': 'person'}]:
+            self.assertEqual(self._get(**params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class TimeSeriesViewTests(APITestCase):
+    """Columnar yearly history from ``/api/v1/timeseries``."""
+
+    def setUp(self):
+        north = Vicariate.objects.create(name='North')
+        alpha = Location.objects.create(name='Alpha', type='church', lkp_vicariate_id=north)
+        bravo = Location.objects.create(name='Bravo', type='church', lkp_vicariate_id=north)
+        for church, year, income in [(alpha, '2021-22', 10), (alpha, '2022-23', 20),
+                                     (alpha, '2023-24', 30), (bravo, '2023-24', 5)]:
+            Offertory.objects.create(lkp_church_id=church, year=year, income=income)
+        Ethnicity.objects.create(lkp_location_id=alpha, year='2022-23', percent_hispanic=12.5)
+        self.alpha = alpha
+        self.url = reverse('timeseries')
+
+    def _get(self, **params):
+        return self.client.get(self.url, {'base': 'location', **params},
+                               HTTP_X_QUERY_PERMISSIONS=LOCATION_PERMS)
+
+    def test_church_series_are_aligned_with_years(self):
+        response = self._get(metrics='offertory.income:sum,ethnicity.percent_hispanic:avg')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['years'], ['2021-22', '2022-23', '2023-24'])
+        alpha, bravo = response.data['series']
+        self.assertEqual((alpha['key'], alpha['label']), (self.alpha.pk, 'Alpha'))
+        self.assertEqual(alpha['values'], {
+            'offertory.income:sum': [10, 20, 30],
+            'ethnicity.percent_hispanic:avg': [None, 12.5, None],
+        })
+        self.assertEqual(bravo['values']['offertory.income:sum'], [None, None, 5])
+
+    def test_every_metric_is_answered_by_one_query(self):
+        metrics = ['offertory.income:sum', 'october.total:avg', 'ethnicity.percent_asian:max',
+                   'households.registeredHouseholds:sum', 'status_animarum.volunteers:sum']
+        with self.assertNumQueries(1):
+            time_series(Location.objects.all(), metrics, rollup='vicariate')
+
+    def test_rollups_and_year_range(self):
+        vicariates = self._get(metrics='offertory.income:sum', rollup='vicariate', year_from='2022-23')
+        self.assertEqual(vicariates.data['years'], ['2022-23', '2023-24'])
+        self.assertEqual([(s['label'], s['values']['offertory.income:sum'])
+                          for s in vicariates.data['series']], [('North', [20, 35])])
+
+        diocese = self._get(metrics='offertory.income:max', rollup='diocese', year_to='2022-23')
+        self.assertEqual(diocese.data['series'], [{
+            'key': 'diocese', 'label': 'Diocese',
+            'values': {'offertory.income:max': [10, 20]},
+        }])
+
+    def test_invalid_requests_return_400(self):
+        for params in [{'metrics': 'offertory.income:sum', 'rollup': 'county'},
+                       {'metrics': 'offertory.year:sum'},
+                       {}]:
+            self.assertEqual(self._get(**params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class FilterPipelineQueryCountTests(APITestCase):
+    """Filtering must not issue ``COUNT(*)`` queries just to log row counts."""
+
+    def setUp(self):
+        church = Location.objects.create(name='Alpha', type='church')
+        Location_Email.objects.create(lkp_location_id=church, email='alpha@example.com', is_primary=True,
+                                      lkp_emailType_id=EmailType.objects.create(name='Parish'))
+
+    def _count_queries(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()]
+
+    def _filter_results(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse('filter_results'),
+                {'base': 'location', 'filters': '["type:church"]'},
+                HTTP_X_QUERY_PERMISSIONS=LOCATION_PERMS,
+            )
+        self.assertEqual(response.status_code, 200)
+        return ctx
+
+    def test_filter_results_runs_no_counts(self):
+        ctx = self._filter_results()
+        self.assertEqual(self._count_queries(ctx), [])
+        self.assertEqual(len(ctx.captured_queries), LOCATION_GRID_QUERIES)
+
+    def test_email_list_runs_no_counts(self):
+        request = RequestFactory().post('/', {'base': 'location', 'filters': 'type:church'},
+                                        HTTP_X_QUERY_PERMISSIONS=LOCATION_PERMS)
+        with CaptureQueriesContext(connection) as ctx:
+            emails = _get_email_list(request, 'Parish')
+
+        self.assertEqual(emails, ['alpha@example.com'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    @override_settings(LOG_QUERYSET_COUNTS=True)
+    def test_instrumentation_mode_logs_counts(self):
+        ctx = self._filter_results()
+        self.assertEqual(len(self._count_queries(ctx)), 2)
@@ -0,0 +1,168 @@
+"""Per-process typeahead index behind ``/api/v1/search?mode=prefix``.
+
+Search-as-you-type asks for the same few thousand display names on every
+keystroke. Each process keeps them in a :class:`PrefixIndex`: the sorted
+words of every name beside the ids they came from, so the names starting
+with a term are one ``bisect`` range. An index is built on first use and
+rebuilt when the typeahead generation, bumped by the Person and Location
+signal receivers in :mod:`api.signals`, moves on, or once it is older than
+``settings.TYPEAHEAD_MAX_AGE`` seconds.
+
+Permission filters are applied by intersecting the matched ids with the
+ids a permission set may see. Those sets are read once per data
+generation (see :mod:`api.utilities.cache`), under the same age limit, and
+kept per process, so a warm lookup does not touch the database.
+
+Generation bumps only reach other processes through a shared cache
+backend; without one, the age limit bounds how long they serve stale
+suggestions.
+"""
+import bisect
+import heapq
+import json
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Location, Person
+from .utilities import compile_permissions
+from .utilities.cache import bump_generation, data_generation, fingerprint, generation
+
+logger = logging.getLogger('api')
+
+TYPEAHEAD_GENERATION_KEY = "crypta:typeahead-generation"
+TYPEAHEAD_LIMIT = 10
+# Permission id sets kept per process.
+ALLOWED_CACHE_SIZE = 128
+
+# Per base: (model, fields returned per match, fields of the display name).
+TYPEAHEAD_MODELS = {
+    "person": (Person, ("id", "name_first", "name_last"), ("name_first", "name_middle", "name_last")),
+    "location": (Location, ("id", "name"), ("name",)),
+}
+
+_END = "\U0010ffff"
+
+
+def words(text):
+    return str(text).casefold().split()
+
+
+class PrefixIndex:
+    """Sorted ``(word, id)`` pairs of display names, held as parallel arrays."""
+
+    __slots__ = ("words", "ids", "rows", "position")
+
+    def __init__(self, rows, name_fields, fields):
+        pairs = sorted(
+            (word, row["id"])
+            for row in rows
+            for word in {w for field in name_fields if row[field] for w in words(row[field])}
+        )
+        self.words = [word for word, _ in pairs]
+        self.ids = array("q", (pk for _, pk in pairs))
+        self.rows = {row["id"]: {field: row[field] for field in fields} for row in rows}
+        # Matches are returned in the order ``rows`` came in.
+        self.position = {row["id"]: idx for idx, row in enumerate(rows)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, term):
+        """Return the ids of names with a word starting with ``term``."""
+        lo = bisect.bisect_left(self.words, term)
+        hi = bisect.bisect_left(self.words, term + _END, lo)
+        return set(self.ids[lo:hi])
+
+    def match(self, terms, allowed=None, limit=TYPEAHEAD_LIMIT):
+        """Return the first ``limit`` ids matching every term and in ``allowed``."""
+        found = allowed
+        for term in terms:
+            ids = self.lookup(term)
+            found = ids if found is None else found & ids
+            if not found:
+                return []
+        if found is None:
+            return []
+        return heapq.nsmallest(limit, found, key=self.position.__getitem__)
+
+
+_INDEXES = {}
+_ALLOWED = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def _build(base):
+    model, fields, name_fields = TYPEAHEAD_MODELS[base]
+    rows = list(model.objects
+                .order_by(*model._meta.ordering, "pk")
+                .values(*dict.fromkeys(fields + name_fields)))
+    index = PrefixIndex(rows, name_fields, fields)
+    logger.info('Built %s typeahead index over %d names', base, len(index))
+    return index
+
+
+def _fresh(entry, current):
+    """Whether a per-process ``(generation, built_at, value)`` entry may be used."""
+    return (entry is not None and entry[0] == current
+            and time.monotonic() - entry[1] < settings.TYPEAHEAD_MAX_AGE)
+
+
+def prefix_index(base):
+    """Return the current index of ``base``, building it when it is stale."""
+    current = generation(TYPEAHEAD_GENERATION_KEY)
+    entry = _INDEXES.get(base)
+    if not _fresh(entry, current):
+        with _LOCK:
+            entry = _INDEXES.get(base)
+            if not _fresh(entry, current):
+                entry = _INDEXES[base] = (current, time.monotonic(), _build(base))
+    return entry[2]
+
+
+def allowed_ids(base, perms):
+    """Return the ids ``perms`` may see, or ``None`` when access is unrestricted."""
+    model = TYPEAHEAD_MODELS[base][0]
+    key = (base, fingerprint(sorted(json.dumps(p, sort_keys=True, default=str) for p in perms)))
+    current = data_generation()
+    with _LOCK:
+        entry = _ALLOWED.get(key)
+        if _fresh(entry, current):
+            _ALLOWED.move_to_end(key)
+            return entry[2]
+
+    perm_q = compile_permissions(perms, base, model)
+    if perm_q is None:
+        ids = frozenset()
+    elif not perm_q:
+        ids = None
+    else:
+        ids = frozenset(model.objects.filter(perm_q).values_list("pk", flat=True))
+
+    with _LOCK:
+        _ALLOWED[key] = (current, time.monotonic(), ids)
+        _ALLOWED.move_to_end(key)
+        while len(_ALLOWED) > ALLOWED_CACHE_SIZE:
+            _ALLOWED.popitem(last=False)
+    return ids
+
+
+def typeahead(query, base, perms, limit=TYPEAHEAD_LIMIT):
+    """Return the rows of ``base`` whose display name has a word starting
+    with each term of ``query``, in the model's ordering."""
+    terms = words(query)
+    if not terms:
+        return []
+    index = prefix_index(base)
+    return [index.rows[pk] for pk in index.match(terms, allowed_ids(base, perms), limit)]
+
+
+def bump_typeahead_generation(**kwargs):
+    """Mark the typeahead indexes stale; usable as a signal receiver.
+
+    Other processes see the bump only through a shared cache backend."""
+    bump_generation(TYPEAHEAD_GENERATION_KEY)
@@ -1,5 +1,5 @@
 """Utility helpers for the ``api`` package."""
 
-from .permissions import get_query_permissions
+from .permissions import compile_permissions, get_query_permissions
 
-__all__ = ["get_query_permissions"]
\ No newline at end of file
+__all__ = ["compile_permissions", "get_query_permissions"]
\ No newline at end of file
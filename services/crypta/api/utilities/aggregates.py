@@ -0,0 +1,105 @@
+"""Portable string aggregation over a correlated subquery.
+
+Django 5.2 only ships ``StringAgg`` for PostgreSQL. :class:`StringAgg` wraps
+a child queryset in ``(SELECT <agg>(v, delimiter) FROM (<queryset>) ...)``
+with the aggregate spelled for each backend, keeping the child rows in the
+queryset's order.
+"""
+from django.db.models import CharField, F, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+
+VALUE = "agg_value"
+ORDER = "agg_order_%d"
+
+_TEMPLATES = {
+    # SQLite has no ORDER BY inside aggregates before 3.44; there it keeps
+    # the order of the derived table, which StringAggTests pin down.
+    "sqlite": "(SELECT GROUP_CONCAT(%(value)s, %%s) FROM (%(subquery)s) %(alias)s)",
+    "postgresql": "(SELECT STRING_AGG(%(value)s, %%s ORDER BY %(order)s) FROM (%(subquery)s) %(alias)s)",
+    "microsoft": "(SELECT STRING_AGG(%(value)s, %%s) WITHIN GROUP (ORDER BY %(order)s) "
+                 "FROM (%(subquery)s) %(alias)s)",
+    "mysql": "(SELECT GROUP_CONCAT(%(value)s ORDER BY %(order)s SEPARATOR %%s) "
+             "FROM (%(subquery)s) %(alias)s)",
+}
+_SQLITE_ORDERED = "(SELECT GROUP_CONCAT(%(value)s, %%s ORDER BY %(order)s) FROM (%(subquery)s) %(alias)s)"
+
+
+def supports_string_agg(connection) -> bool:
+    return connection.vendor in _TEMPLATES
+
+
+def _template(connection):
+    if connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 44):
+        return _SQLITE_ORDERED
+    return _TEMPLATES[connection.vendor]
+
+
+def as_text(expression):
+    """Cast ``expression`` to text, keeping ``NULL`` as ``NULL``."""
+    return Cast(expression, TextField())
+
+
+class StringAgg(Subquery):
+    """Join ``expression`` over the rows of ``queryset`` with ``delimiter``.
+
+    ``queryset`` is usually correlated with ``OuterRef``. Rows are ordered
+    by ``ordering`` (default: the queryset's ordering, or the model's
+    ``Meta.ordering``, then ``pk``). Evaluates to ``NULL`` when there are no
+    rows."""
+
+    output_field = TextField()
+
+    def __init__(self, queryset, expression, delimiter, ordering=None):
+        if ordering is None:
+            ordering = list(queryset.query.order_by or queryset.model._meta.ordering) + ["pk"]
+        order = {}
+        self.descending = []
+        for idx, key in enumerate(ordering):
+            order[ORDER % idx] = F(key.lstrip("-"))
+            self.descending.append(key.startswith("-"))
+        queryset = (queryset
+                    .annotate(**{VALUE: expression}, **order)
+                    .order_by(*(ORDER % idx if not desc else f"-{ORDER % idx}"
+                                for idx, desc in enumerate(self.descending)))
+                    .values(VALUE, *order))
+        self.delimiter = delimiter
+        super().__init__(queryset)
+
+    def as_sql(self, compiler, connection, template=None, **extra_context):
+        connection.ops.check_expression_support(self)
+        query = self.query
+        template = _template(connection)
+        if "%(order)s" in template:
+            # Derived tables may not be ordered; the aggregate orders instead.
+            query = query.clone()
+            query.clear_ordering(force=True)
+        subquery_sql, params = query.as_sql(compiler, connection)
+        qn = connection.ops.quote_name
+        alias = qn("agg_rows")
+        template_params = {
+            "subquery": subquery_sql[1:-1],
+            "alias": alias,
+            "value": f"{alias}.{qn(VALUE)}",
+            "order": ", ".join(
+                f"{alias}.{qn(ORDER % idx)}{' DESC' if desc else ''}"
+                for idx, desc in enumerate(self.descending)
+            ),
+        }
+        sql = template % template_params
+        return sql, (self.delimiter, *params)
+
+
+def encode_row(parts, null, separator):
+    """Concatenate ``parts`` as text into one value for :class:`StringAgg`.
+
+    ``NULL`` parts are replaced by ``null`` so they survive concatenation."""
+
+    pieces = []
+    for idx, part in enumerate(parts):
+        if idx:
+            pieces.append(Value(separator, output_field=CharField()))
+        pieces.append(Coalesce(as_text(part), Value(null, output_field=CharField()),
+                               output_field=TextField()))
+    if len(pieces) == 1:
+        return pieces[0]
+    return Concat(*pieces, output_field=TextField())
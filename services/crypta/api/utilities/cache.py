@@ -0,0 +1,57 @@
+"""Helpers for caching derived API responses.
+
+Cached entries are keyed on a *data generation* counter that is bumped
+whenever a model feeding them is saved or deleted (see ``api.signals``), so
+stale entries are simply never read again and age out of the cache.
+
+Bumps only reach other processes through a shared cache backend. Counters
+expire after ``settings.CACHE_GENERATION_TIMEOUT`` and are reseeded, which
+bounds how long a process that missed a bump keeps an old generation.
+"""
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("api")
+
+GENERATION_KEY = "crypta:data-generation"
+
+
+def fingerprint(*parts) -> str:
+    """Return a stable hash of JSON-serialisable ``parts``."""
+
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def generation(key: str) -> int:
+    """Return the counter stored under ``key``.
+
+    A missing counter (first use, eviction, restart of a shared backend) is
+    seeded from the clock so it cannot fall back onto an older generation."""
+
+    return cache.get_or_set(key, time.time_ns, timeout=settings.CACHE_GENERATION_TIMEOUT)
+
+
+def bump_generation(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=settings.CACHE_GENERATION_TIMEOUT)
+
+
+def data_generation() -> int:
+    """Return the current data generation."""
+
+    return generation(GENERATION_KEY)
+
+
+def bump_data_generation(**kwargs) -> None:
+    """Invalidate every generation-keyed entry; usable as a signal receiver."""
+
+    bump_generation(GENERATION_KEY)
+    logger.debug("Data generation bumped by %s", kwargs.get("sender"))
@@ -1,10 +1,30 @@
 """Permission helpers used throughout the API package."""
 import json
 import logging
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+from ..constants import RELETIVE_RELATIONS
+from .semijoins import semijoin_q
 
 logger = logging.getLogger("api")
 
+PERMISSION_CACHE_SIZE = 256
+
+
+def _resources_for_base() -> Dict[str, frozenset]:
+    out: Dict[str, set] = {}
+    for resource, base in RELETIVE_RELATIONS.items():
+        out.setdefault(base, {base}).add(resource)
+    return {base: frozenset(resources) for base, resources in out.items()}
+
+
+# Resources whose permissions apply to each base, computed once.
+RESOURCES_FOR_BASE = _resources_for_base()
+
 
 def get_query_permissions(request) -> List[Dict[str, Any]]:
     """Return query permissions passed via the gateway."""
@@ -17,3 +37,182 @@ def get_query_permissions(request) -> List[Dict[str, Any]]:
     except json.JSONDecodeError as exc:
         logger.warning("Failed to parse permissions header: %s", exc)
         return []
+
+
+def _split_lookup(model, key: str):
+    """Validate ``key`` against ``model._meta``.
+
+    Returns ``(path, "exact")`` for equality tests, which can be merged,
+    and ``(key, None)`` for any other valid lookup. Raises ``ValueError``
+    when ``key`` does not resolve."""
+
+    parts = key.split("__")
+    field = None
+    idx = 0
+    while idx < len(parts):
+        if model is None:
+            break
+        name = parts[idx]
+        try:
+            field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        model = field.related_model if field.is_relation else None
+        idx += 1
+    if field is None:
+        raise ValueError(f"Unknown field {parts[0]!r}")
+
+    path, rest = "__".join(parts[:idx]), parts[idx:]
+    for pos, name in enumerate(rest):
+        last = pos == len(rest) - 1
+        if last and field.get_lookup(name):
+            break
+        transform = field.get_transform(name)
+        if transform is None:
+            raise ValueError(f"Unsupported lookup {name!r} in {key!r}")
+        field = transform(field).output_field
+    if not rest or rest == ["exact"]:
+        return path, "exact"
+    return key, None
+
+
+def _hashable(values) -> bool:
+    return all(v is not None and isinstance(v, (str, int, float, bool)) for v in values)
+
+
+def _normalize(model, filters: Dict[str, Any]) -> Optional[tuple]:
+    """Turn one permission's ``filters`` into a sorted tuple of clauses.
+
+    As before, a list value means ``<key>__in`` and a scalar means ``<key>``.
+    Equality and membership tests on the same path are intersected into one
+    ``(path, "in", frozenset)`` clause; anything else is kept verbatim as
+    ``(key, lookup, json)``. Returns ``None`` when the permission can never
+    match."""
+
+    sets: Dict[str, frozenset] = {}
+    other = []
+    for key, val in filters.items():
+        path, lookup = _split_lookup(model, key)
+        is_list = isinstance(val, list)
+        if is_list and lookup != "exact":
+            raise ValueError(f"List value for lookup {key!r}")
+        values = val if is_list else [val]
+        if lookup != "exact" or not _hashable(values):
+            other.append((key, "in" if is_list else None, json.dumps(val, sort_keys=True)))
+            continue
+        values = frozenset(values)
+        sets[path] = sets[path] & values if path in sets else values
+        if not sets[path]:
+            return None
+    clauses = [(path, "in", vals) for path, vals in sets.items()] + other
+    return tuple(sorted(clauses, key=lambda c: (c[0], str(c[1]))))
+
+
+def _subsumes(wide: tuple, narrow: tuple) -> bool:
+    """True when every row matching ``narrow`` also matches ``wide``."""
+
+    narrow_by_path = {(c[0], c[1]): c[2] for c in narrow}
+    for path, lookup, vals in wide:
+        other = narrow_by_path.get((path, lookup))
+        if other is None:
+            return False
+        if lookup == "in" and isinstance(vals, frozenset):
+            if not isinstance(other, frozenset) or not other <= vals:
+                return False
+        elif other != vals:
+            return False
+    return True
+
+
+def _merge(conjunctions: List[tuple]) -> List[tuple]:
+    """Drop subsumed permissions and union ``in`` clauses that differ on one path."""
+
+    changed = True
+    while changed:
+        changed = False
+        kept = []
+        for conj in conjunctions:
+            if any(_subsumes(k, conj) for k in kept):
+                changed = True
+                continue
+            kept = [k for k in kept if not _subsumes(conj, k)]
+            kept.append(conj)
+        conjunctions = kept
+
+        for i, a in enumerate(conjunctions):
+            for j in range(i + 1, len(conjunctions)):
+                b = conjunctions[j]
+                if [c[:2] for c in a] != [c[:2] for c in b]:
+                    continue
+                diff = [n for n, (ca, cb) in enumerate(zip(a, b)) if ca[2] != cb[2]]
+                if len(diff) == 1 and isinstance(a[diff[0]][2], frozenset) and isinstance(b[diff[0]][2], frozenset):
+                    n = diff[0]
+                    merged = a[:n] + ((a[n][0], "in", a[n][2] | b[n][2]),) + a[n + 1:]
+                    conjunctions = [c for k, c in enumerate(conjunctions) if k not in (i, j)] + [merged]
+                    changed = True
+                    break
+            if changed:
+                break
+    return conjunctions
+
+
+def _clause_condition(path: str, lookup, vals) -> Tuple[str, Any]:
+    """Return the ``(lookup, value)`` filter for a normalized clause."""
+
+    if isinstance(vals, frozenset):
+        if len(vals) == 1:
+            return path, next(iter(vals))
+        return f"{path}__in", sorted(vals, key=str)
+    value = json.loads(vals)
+    if lookup == "in":
+        return f"{path}__in", value
+    return path, value
+
+
+@lru_cache(maxsize=PERMISSION_CACHE_SIZE)
+def _compile(model, canonical: str) -> Optional[Q]:
+    conjunctions = []
+    for perm in json.loads(canonical):
+        filters = perm.get("filters") or {}
+        if not isinstance(filters, dict):
+            logger.warning("Ignoring permission with malformed filters: %s", perm)
+            continue
+        try:
+            conj = _normalize(model, filters)
+        except ValueError as exc:
+            # Dropping only the bad clause would widen the grant, so the
+            # whole permission object is ignored instead.
+            logger.warning("Ignoring permission %s: %s", perm, exc)
+            continue
+        if conj is None:
+            continue
+        if not conj:
+            return Q()
+        conjunctions.append(conj)
+    if not conjunctions:
+        return None
+
+    perm_q = Q()
+    for conj in _merge(conjunctions):
+        perm_q |= semijoin_q(model, [_clause_condition(*clause) for clause in conj])
+    return perm_q
+
+
+def compile_permissions(perms: List[Dict[str, Any]], base: str, model) -> Optional[Q]:
+    """Compile the permissions relevant to ``base`` into one ``Q``.
+
+    Field paths are validated against ``model``; permissions with unknown
+    paths are dropped. Returns ``None`` when nothing is granted and an
+    empty ``Q`` for unrestricted access. Results are memoized on the
+    canonical JSON of the relevant permissions, so callers must not mutate
+    the returned ``Q``."""
+
+    resources = RESOURCES_FOR_BASE.get(base, frozenset({base}))
+    relevant = [p for p in perms if isinstance(p, dict) and p.get("resource") in resources]
+    if not relevant:
+        return None
+    canonical = json.dumps(
+        sorted(relevant, key=lambda p: json.dumps(p, sort_keys=True, default=str)),
+        sort_keys=True, default=str,
+    )
+    return _compile(model, canonical)
@@ -0,0 +1,81 @@
+"""Rewrite multi-valued filter paths into ``EXISTS`` semi-joins.
+
+Filtering on a reverse or many-to-many path such as
+``assignment__lkp_location_id__name`` joins the related table and can
+return each row several times, which then needs ``DISTINCT``. The same
+conditions expressed as a correlated ``EXISTS`` keep one row per object and
+let the database plan a semi-join.
+"""
+import logging
+from typing import Any, Iterable, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Exists, OuterRef, Q
+
+logger = logging.getLogger("api")
+
+
+def _get_field(model, name):
+    return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+
+def _first_multi_hop(model, parts):
+    """Return ``(index, field)`` of the first multi-valued hop in ``parts``."""
+
+    for idx, name in enumerate(parts):
+        try:
+            field = _get_field(model, name)
+        except FieldDoesNotExist:
+            return None, None
+        if field.one_to_many or field.many_to_many:
+            return idx, field
+        if not field.is_relation:
+            return None, None
+        model = field.related_model
+    return None, None
+
+
+def back_reference(field) -> str:
+    """Name, on ``field.related_model``, of the relation pointing back."""
+
+    if field.auto_created:
+        return field.field.name
+    return field.related_query_name()
+
+
+def semijoin_q(model, conditions: Iterable[Tuple[str, Any]]) -> Q:
+    """AND ``conditions`` (``(lookup, value)`` pairs) into a ``Q`` on ``model``.
+
+    Conditions that pass through a reverse or many-to-many relation become
+    one ``Exists`` per relation, so conditions sharing a relation still have
+    to match the *same* related row, as they would in a single ``filter()``
+    call. Paths that do not resolve are passed through unchanged for
+    Django to report."""
+
+    q = Q()
+    groups = {}
+    for key, value in conditions:
+        parts = key.split("__")
+        idx, field = _first_multi_hop(model, parts)
+        if field is None:
+            q &= Q(**{key: value})
+            continue
+        related = field.related_model
+        rest = parts[idx + 1:]
+        try:
+            if not rest:
+                raise FieldDoesNotExist
+            _get_field(related, rest[0])
+        except FieldDoesNotExist:
+            rest = ["pk", *rest]
+        group = groups.setdefault("__".join(parts[: idx + 1]), (parts[:idx], field, []))
+        group[2].append(("__".join(rest), value))
+
+    for prefix, field, inner in groups.values():
+        related = field.related_model
+        outer = "__".join(prefix) if prefix else "pk"
+        subquery = related._default_manager.filter(
+            semijoin_q(related, inner), **{back_reference(field): OuterRef(outer)}
+        )
+        q &= Q(Exists(subquery))
+    return q
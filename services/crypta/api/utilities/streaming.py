@@ -0,0 +1,33 @@
+"""Newline-delimited JSON helpers for streamed API responses."""
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger("api")
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def ndjson_line(obj) -> bytes:
+    """Encode ``obj`` as one NDJSON line."""
+
+    return (json.dumps(obj, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n").encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Lets DRF negotiate ``?format=ndjson`` / ``Accept: application/x-ndjson``.
+
+    Streaming views bypass the renderer with a ``StreamingHttpResponse``;
+    this only renders the plain ``Response`` objects they return for errors,
+    as a single NDJSON line."""
+
+    media_type = NDJSON_CONTENT_TYPE
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return ndjson_line(data)
@@ -1,66 +1,74 @@
 import logging
 import json
-from datetime import date, datetime
+from datetime import datetime
 import os
 from django.conf import settings
-from django.db.models import Count, Q, Model
+from django.core.cache import cache
 from django.forms.models import model_to_dict
-from django.db.models.fields.files import FileField, ImageField
-from django.http import JsonResponse
+from django.db.models.fields.files import FileField
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import permissions, viewsets
+from rest_framework.settings import api_settings
+from rest_framework import permissions, status, viewsets
 from .serializers import PersonSerializer, LocationSerializer
-from .utilities import get_query_permissions
+from .utilities import compile_permissions, get_query_permissions
 from .utilities.emailingSys import message_creator, send_mail
+from .utilities.streaming import NDJSON_CONTENT_TYPE, NDJSONRenderer, ndjson_line
+from .grid import GridSummary, build_grid_record, grid_columns, iter_grid_records, prefetch_for_grid
+from .gridrows import read_grid_page, read_grid_records
+from .facets import compute_facets
+from .search import (
+    SEARCH_MAX_RESULT_LIMIT, SEARCH_MIN_QUERY_LENGTH, SEARCH_ORDERING, SEARCH_RESULT_LIMITS,
+    search_entries,
+)
+from .typeahead import typeahead
+from .aggregation import aggregate, time_series
+from .utilities.cache import data_generation, fingerprint
+from .utilities.semijoins import semijoin_q
+from .utilities.pagination import (
+    apply_keyset, cursor_values, decode_cursor, encode_cursor, keyset_ordering,
+    parse_page_size,
+)
 
 from .models import Person, Location, Person_Email, Location_Email
 from .constants import (
-    DYNAMIC_FILTER_FIELDS, FIELD_LABELS, RELETIVE_RELATIONS, DISPLAY_TO_PATH,
-    FIELD_CATEGORIES,
+    DYNAMIC_FILTER_FIELDS, FIELD_LABELS,
 )
 
 logger = logging.getLogger('api')
 
+# Rows fetched per round trip when walking a whole filtered set.
+GRID_CHUNK_SIZE = 500
+
 def _get_permissions(request):
     """Return query permissions passed via Gateway."""
     perms = get_query_permissions(request)
     logger.debug('Retrieved query permissions: %s', perms)
     return perms
 
+def _log_count(message, qs):
+    """Log ``qs.count()`` in instrumentation mode only.
+
+    Every count re-runs the full filtered join, so it is skipped unless
+    ``settings.LOG_QUERYSET_COUNTS`` is on and the ``api`` logger emits DEBUG."""
+    if settings.LOG_QUERYSET_COUNTS and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, qs.count())
+
 def _apply_permission_filters(qs, perms, base):
     """Filter ``qs`` using the provided permission objects."""
     logger.debug('Applying permission filters for base "%s"', base)
-    relevant = [
-        p
-        for p in perms
-        if p.get('resource') == base
-        or RELETIVE_RELATIONS.get(p.get('resource')) == base
-    ]
-    if not relevant:
+    perm_q = compile_permissions(perms, base, qs.model)
+    if perm_q is None:
         return qs.none()
         # return qs
 
-    logger.debug('Relevant permissions: %s', relevant)
-    perm_q = Q()
-    for perm in relevant:
-        conds = perm.get('filters') or {}
-
-        sub = Q()
-        for fld, val in conds.items():
-            if isinstance(val, list):
-                sub &= Q(**{f"{fld}__in": val})
-            else:
-                sub &= Q(**{fld: val})
-        if not conds:
-            sub &= Q()
-        perm_q |= sub
-
+    logger.debug('Compiled permission filter: %s', perm_q)
     filtered = qs.filter(perm_q)
-    logger.info('Permission filtering produced %d results', filtered.count())
+    _log_count('Permission filtering produced %d results', filtered)
     return filtered
 
 def _apply_user_filters(qs, filters):
@@ -71,8 +79,8 @@ def _apply_user_filters(qs, filters):
             fld, val = rf.split(":", 1)
             applied.setdefault(fld, []).append(val)
     for fld, vals in applied.items():
-        qs = qs.filter(**{f"{fld}__in": vals})
-    logger.info('User filtering resulted in %d records', qs.count())
+        qs = qs.filter(semijoin_q(qs.model, [(f"{fld}__in", vals)]))
+    _log_count('User filtering resulted in %d records', qs)
     return qs
 
 def _prefetch_for_base(qs, base):
@@ -129,70 +137,96 @@ def _prefetch_for_base(qs, base):
             "offertory_church",
             "statusAnimarum_church",
             "ethnicity_church",
+            "campusministry_lanaguage_set",
+            "registeredHousehold_church",
+            "building_on_site",
         )
 
+# Per-model serialization plans, built on first use by ``_serialization_plan``.
+_SERIALIZATION_PLANS = {}
+
+FIELD_VALUE, FIELD_FILE, FIELD_RELATED = 'value', 'file', 'related'
+
+def _serialization_plan(model):
+    """Return ``(fields, relations)`` describing how to serialize ``model``.
+
+    ``fields`` holds ``(name, attname, kind)`` for every concrete field and
+    ``relations`` holds ``(key, accessor, prefetch_cache_name)`` for every
+    reverse and many-to-many relation, both in ``_meta`` order."""
+    plan = _SERIALIZATION_PLANS.get(model)
+    if plan is not None:
+        return plan
+
+    fields = []
+    for f in model._meta.fields:
+        if isinstance(f, FileField):
+            kind = FIELD_FILE
+        elif f.is_relation:
+            kind = FIELD_RELATED
+        else:
+            kind = FIELD_VALUE
+        fields.append((f.name, f.attname, kind))
+
+    relations = []
+    for rel in model._meta.get_fields():
+        if rel.one_to_many and rel.auto_created:
+            relations.append((rel.get_accessor_name(), rel.get_accessor_name(), rel.cache_name))
+        elif rel.many_to_many and not rel.auto_created:
+            relations.append((rel.name, rel.name, rel.name))
+        elif rel.many_to_many and rel.auto_created:
+            relations.append((rel.get_accessor_name(), rel.get_accessor_name(),
+                              rel.field.related_query_name()))
+
+    plan = _SERIALIZATION_PLANS[model] = (tuple(fields), tuple(relations))
+    logger.debug('Built serialization plan for %s', model.__name__)
+    return plan
+
+def _related_rows(obj, accessor, cache_name):
+    """Rows of a to-many relation, from the prefetch cache when available."""
+    prefetched = getattr(obj, '_prefetched_objects_cache', None)
+    if prefetched is not None and cache_name in prefetched:
+        return prefetched[cache_name]
+    return getattr(obj, accessor).all()
+
 def _serialize_instance(obj):
     """Return ``obj`` as a dict including first-level related data."""
-    logger.debug('Serializing instance of %s with id %s', type(obj).__name__, getattr(obj, 'id', ''))
+    fields, relations = _serialization_plan(type(obj))
     data = {}
 
     # Handle fields, skipping file/image fields with no file
-    for f in obj._meta.fields:
-        val = getattr(obj, f.name)
-        if isinstance(f, (FileField, ImageField)):
-            if not val:
-                continue  # skip fields with no file
-            data[f.name] = val.url if val else None
+    for name, attname, kind in fields:
+        if kind is FIELD_VALUE:
+            data[name] = getattr(obj, attname)
+        elif kind is FIELD_FILE:
+            val = getattr(obj, name)
+            if val:
+                data[name] = val.url
+        elif getattr(obj, attname) is None:
+            data[name] = None
         else:
-            data[f.name] = val
+            # Reads the select_related cache; only unselected FKs hit the DB.
+            data[name] = _safe_model_to_dict(getattr(obj, name))
 
     # Handle relations
-    for rel in obj._meta.get_fields():
-        if rel.one_to_many and rel.auto_created:
-            mgr = getattr(obj, rel.get_accessor_name())
-            data[rel.get_accessor_name()] = [
-                # model_to_dict(child, fields=[f.name for f in child._meta.fields])
-                _safe_model_to_dict(child)
-                for child in mgr.all()
-            ]
-        elif rel.many_to_many and not rel.auto_created:
-            mgr = getattr(obj, rel.name)
-            data[rel.name] = [
-                # model_to_dict(child, fields=[f.name for f in child._meta.fields])
-                _safe_model_to_dict(child)
-                for child in mgr.all()
-            ]
-        elif rel.many_to_many and rel.auto_created:
-            mgr = getattr(obj, rel.get_accessor_name())
-            data[rel.get_accessor_name()] = [
-                # model_to_dict(child, fields=[f.name for f in child._meta.fields])
-                _safe_model_to_dict(child)
-                for child in mgr.all()
-            ]
-        elif (rel.many_to_one or rel.one_to_one) and rel.concrete:
-            val = getattr(obj, rel.name)
-            if val is not None:
-                # data[rel.name] = model_to_dict(
-                #     val, fields=[f.name for f in val._meta.fields]
-                # )
-                data[rel.name] = _safe_model_to_dict(val)
+    for key, accessor, cache_name in relations:
+        data[key] = [
+            _safe_model_to_dict(child)
+            for child in _related_rows(obj, accessor, cache_name)
+        ]
 
     return data
 
 def _safe_model_to_dict(obj):
-    logger.debug('Converting %s object to dict', type(obj).__name__)
+    """Return ``obj``'s concrete fields, with foreign keys as raw ids."""
+    fields, _ = _serialization_plan(type(obj))
     data = {}
-    for f in obj._meta.fields:
-        val = getattr(obj, f.name)
-        if isinstance(f, (FileField, ImageField)):
-            if not val:
-                continue
-            data[f.name] = val.url if hasattr(val, "url") else None
-        elif isinstance(val, Model):
-            data[f.name] = val.pk
+    for name, attname, kind in fields:
+        if kind is FIELD_FILE:
+            val = getattr(obj, name)
+            if val:
+                data[name] = val.url
         else:
-            data[f.name] = val
-    logger.debug('Converted dict keys: %s', list(data.keys()))
+            data[name] = getattr(obj, attname)
     return data
 
 def _get_full_results(base, perms, filters):
@@ -200,7 +234,6 @@ def _get_full_results(base, perms, filters):
     qs = Location.objects.all() if base == "location" else Person.objects.all()
     qs = _apply_permission_filters(qs, perms, base)
     qs = _apply_user_filters(qs, filters)
-    qs = qs.distinct()
     qs = _prefetch_for_base(qs, base)
 
     results = [_serialize_instance(obj) for obj in qs]
@@ -233,378 +266,129 @@ def _get_filters(request):
     logger.debug('Parsed filters: %s', filters)
     return filters
 
-def _get_grid_results(base, perms, filters):
-    """Return simplified records + columns for the Database grid."""
-    logger.debug('Building grid results for base "%s"', base)
+def _get_columns(request):
+    """Return the grid column names requested with ``columns=``, or ``None``.
+
+    Accepts a JSON list or repeated parameters. Names are not split on
+    commas since some contain them, e.g. ``Birth (City,State)``."""
+    raw = request.query_params.getlist('columns') or request.query_params.getlist('columns[]')
+    if len(raw) == 1:
+        try:
+            data = json.loads(raw[0])
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, list):
+            raw = [str(name) for name in data]
+    names = [name for name in raw if name]
+    logger.debug('Requested grid columns: %s', names)
+    return names or None
+
+def _grid_queryset(base, perms, filters):
+    """Return the filtered ``Person``/``Location`` queryset behind the grid."""
     qs = Location.objects.all() if base == "location" else Person.objects.all()
     qs = _apply_permission_filters(qs, perms, base)
-    qs = _apply_user_filters(qs, filters)
-    qs = qs.distinct()
-    qs = _prefetch_for_base(qs, base)
+    return _apply_user_filters(qs, filters)
 
-    today = date.today()
-    
-    records = []
-    if base == "person":
-        for obj in qs:
-            records.append({
-                "id":               obj.pk,
-                # core Person fields
-                "Full Name":        obj.name,
-                "First Name":       obj.name_first,
-                "Middle Name":      obj.name_middle,
-                "Last Name":        obj.name_last,
-                "Person Type":      obj.personType,
-                "Prefix":           obj.prefix or "",
-                "Suffix":           obj.suffix or "",
-                "Birth Date":       obj.date_birth and obj.date_birth.isoformat() or "",
-                "Baptism Date":     obj.date_baptism and obj.date_baptism.isoformat() or "",
-                "Retirement Date":  obj.date_retired and obj.date_retired.isoformat() or "",
-                "Deceased Date":    obj.date_deceased and obj.date_deceased.isoformat() or "",
-                "Safe Env Trng":    obj.is_safeEnvironmentTraining,
-                "Paid Employee":    obj.is_paidEmployee,
-
-                # flattened addresses
-                "Residence Addr":   obj.lkp_residence_id and obj.lkp_residence_id.address1 or "",
-                "Residence City":   obj.lkp_residence_id and obj.lkp_residence_id.city or "",
-                "Residence State":  obj.lkp_residence_id and obj.lkp_residence_id.state or "",
-                "Residence Zip Code":   obj.lkp_residence_id and obj.lkp_residence_id.zip_code or "",
-                "Residence Country":    obj.lkp_residence_id and obj.lkp_residence_id.country or "",    
-                "Mailing Addr":     obj.lkp_mailing_id and obj.lkp_mailing_id.address1 or "",
-                "Mailing City":     obj.lkp_mailing_id and obj.lkp_mailing_id.city or "",
-                "Mailing State":    obj.lkp_mailing_id and obj.lkp_mailing_id.state or "",
-                "Mailing Zip Code": obj.lkp_mailing_id and obj.lkp_mailing_id.zip_code or "",
-                "Mailing Country":  obj.lkp_mailing_id and obj.lkp_mailing_id.country or "",
-
-                # emails & phones
-                "Personal Emails":  ", ".join(e.email for e in obj.person_email_set
-                                                .filter(lkp_emailType_id__name__iexact="Personal")),
-                "Parish Emails":    ", ".join(e.email for e in obj.person_email_set
-                                                .filter(lkp_emailType_id__name__iexact="Parish")),
-                "Diocesan Emails":  ", ".join(e.email for e in obj.person_email_set
-                                                .filter(lkp_emailType_id__name__iexact="Diocesan")),
-
-                "Cell Phones":      ", ".join(p.phoneNumber for p in obj.person_phone_set
-                                                .filter(lkp_phoneType_id__name__iexact="Cell")),
-                "Home Phones":      ", ".join(p.phoneNumber for p in obj.person_phone_set
-                                                .filter(lkp_phoneType_id__name__iexact="Home")),
-
-                # languages
-                "Languages":        ", ".join(
-                                    f"{pl.lkp_language_id.name} ({pl.lkp_languageProficiency_id.name})"
-                                    for pl in obj.person_language_set.all()
-                                ),
-                
-                "Ecclesiastical Offices":       ", ".join(eo.lkp_title_id.name for oe in obj.person_title_set
-                                                          .filter(lkp_title_id__is_ecclesiastical__iexact="True")),
-
-                # degrees & certificates
-                "Degrees":          "; ".join(
-                                    f"{dc.lkp_degreeCertificate_id.institute}"
-                                    f" (acquired {dc.date_acquired}, expires {dc.date_expiration})"
-                                    for dc in obj.person_degreecertificate_set.all()
-                                ),
-
-                # faculties grants
-                "Faculties Grants": "; ".join(
-                                    f"{fg.lkp_faultiesGrantType_id.name}"
-                                    f" (granted {fg.date_granted})"
-                                    for fg in obj.person_facultiesgrant_set.all()
-                                    ),
-
-                # status history
-                "Status History":   "; ".join(
-                                    f"{st.lkp_status_id.name}"
-                                    f" ({st.date_assigned} → {st.date_released or 'present'})"
-                                    for st in obj.person_status_set.all()
-                                ),
-
-                # titles
-                "Titles":           "; ".join(
-                                    f"{t.lkp_title_id.name}"
-                                    f" ({t.date_assigned} → {t.date_expiration or 'present'})"
-                                    for t in obj.person_title_set.all()
-                                ),
-
-                # assignments
-                "Assignments":      "; ".join(
-                                    f"{a.lkp_assignmentType_id.title}@{a.lkp_location_id.name}"
-                                    f" (term {a.term}, {a.date_assigned}→{a.date_released or 'present'})"
-                                    for a in obj.assignment_set
-                                                .filter(date_assigned__lte=today,)
-                                                .filter(
-                                                    Q(date_released__isnull=True) |
-                                                    Q(date_released__gte=today)
-                                                )
-                                ),
-
-                # relationships (both directions)
-                "Relationships":    "; ".join(
-                                    f"{rel.lkp_relationshipType_id.name}: "
-                                    f"{(rel.lkp_secondPerson_id if rel in obj.first_person.all() else rel.lkp_firstPerson_id).name}"
-                                    for rel in list(obj.first_person.all()) + list(obj.second_person.all())
-                                ),
-
-                # detail flags
-                "Is Priest?":       obj.priest_detail_set.exists(),
-                "Is Deacon?":       obj.deacon_detail_set.exists(),
-                "Is Lay?":          obj.lay_detail_set.exists(),
-
-                # priest‐specific fields (if any)
-                **(
-                    {
-                        # take the first detail record
-                        "Priest Ordination": 
-                            pr_det.date_priestOrdination.isoformat() 
-                                if pr_det.date_priestOrdination else "",
-                        "Diocesan/Religious": 
-                            pr_det.diocesanReligious or "",
-                        "Place of Baptism":   
-                            pr_det.lkp_placeOfBaptism_id.name 
-                                if pr_det.lkp_placeOfBaptism_id else "",
-                        "Birth (City,State)":  
-                            f"{pr_det.birth_city or ''}, {pr_det.birth_state or ''}",
-                        "Priest Notes":        
-                            pr_det.notes or "",
-                        # …and guard any other fields the same way…
-                    }
-                    if (pr_det := obj.priest_detail_set.first())
-                    else {}
-                    ),
-            })
-    else:
-        for obj in qs:
-            rec = {
-                "id":               obj.pk,
-                # — Basic info —
-                "Name":             obj.name,
-                "Type":             obj.type,
-
-                # — Location & jurisdiction —
-                "Vicariate":        obj.lkp_vicariate_id.name if obj.lkp_vicariate_id else "",
-                "County":           obj.lkp_county_id.name    if obj.lkp_county_id    else "",
-
-                # — Addresses —
-                "Physical Addr":    f"{obj.lkp_physicalAddress_id.address1}, "
-                                    f"{obj.lkp_physicalAddress_id.city}"
-                                    if obj.lkp_physicalAddress_id else "",
-                "Mailing Addr":     f"{obj.lkp_mailingAddress_id.address1}, "
-                                    f"{obj.lkp_mailingAddress_id.city}"
-                                    if obj.lkp_mailingAddress_id else "",
-
-                # — Contact —
-                "Website":          obj.website or "",
-                "Emails":           ", ".join(e.email for e in obj.location_email_set.all()),
-                "Phones":           ", ".join(p.phoneNumber for p in obj.location_phone_set.all()),
-
-                # — Status history —
-                "Status History":   "; ".join(
-                                        f"{st.lkp_status_id.name}"
-                                        f" ({st.date_assigned}"
-                                        f"→{st.date_released or 'present'})"
-                                        for st in obj.location_status_set.all()
-                                    ),
-                
-                # — “Other Entity” flag —
-                "Is Other Entity": obj.otherentity_detail_set.exists(),
-
-                # — Assignments & relationships —
-                "Assignments":      "; ".join(
-                                        f"{a.lkp_assignmentType_id.title}"
-                                        f"@{a.lkp_person_id.name}"
-                                        f" ({a.date_assigned}"
-                                        f"→{a.date_released or 'present'})"
-                                        for a in obj.assignment_set.all()
-                                    ),
-                "Missions":         ", ".join(m.lkp_parish_id.name
-                                        for m in obj.mission.all()),
-                "Parishes":         ", ".join(p.lkp_mission_id.name
-                                        for p in obj.parish.all()),
-            }
-            
-            # — Church‐specific details (if any) —
-            cd = obj.churchDetail_location.first()
-            
-            if cd:
-                rec.update({
-                    "Parish Name":       cd.parishUniqueName,
-                    "Is Mission":        cd.is_mission,
-                    "Boundary File":     cd.boundary.name if cd.boundary else "",
-                    "City Served":       cd.cityServed or "",
-                    "Date Established":  cd.date_established.isoformat() if cd.date_established else "",
-                    "First Dedication":  cd.date_firstDedication.isoformat() if cd.date_firstDedication else "",
-                    "Second Dedication": cd.date_secondDedication.isoformat() if cd.date_secondDedication else "",
-                    "Church Notes":      cd.notes or "",
-                    "Mass Languages":   "; ".join(
-                                    f"{cl.lkp_language_id.name} @ {cl.massTime}"
-                                    for cl in obj.church_language_set.all()
-                                ),
-                    "Site Plan":        cd.pastoralPlan.name if cd.pastoralPlan else "",
-                    "DOC Parish":        cd.is_doc,
-                    "Tax ID":           cd.tax_id or "",
-                    "Geo ID":           cd.geo_id or "",
-                    "Parish ID":        cd.parish_id or "",
-                    "Church Type":      cd.type or "",
-                    "Seating Capacity": cd.seatingCapacity or "",
-                    "Has Home School Program": cd.has_homeschoolProgram,
-                    "Has Child Card Day Care": cd.has_childCareDayCare,
-                    "Has Scouting Program": cd.has_scoutingProgram,
-                    "Has Chapel on Campus": cd.has_chapelOnCampus,
-                    "Has Adoration Chapel on Campus": cd.has_adorationChapelOnCampus,
-                    "Has Columbarium": cd.has_columbarium,
-                    "Has Cemetary": cd.has_cemetary,
-                    "Has School on Site": cd.has_schoolOnSite,
-                    "Is Non-Parochial School Using Facilities": cd.is_nonParochialSchoolUsingFacilities,
-                    "Office Contact": cd.temp_officeContact,
-                    "Office Contact Email": cd.temp_officeContactEmail,
-                    
-                }),
-
-            # — Campus ministry details (if any) —
-            cm = obj.campusMinistry_location.first()
-            if cm:
-                rec.update({
-                    "Campus Mass At Parish": cm.is_massAtParish,
-                    "Served By":             cm.universityServed or "",
-                    "Mass Schedule":         cm.sundayMassSchedule or "",
-                    "Hours":                 cm.campusMinistryHours or "",
-                })
+def _grid_records(qs, base, columns=None, chunk_size=None):
+    """Yield grid rows from the read model, or build them when it is off."""
+    if settings.GRID_READ_MODEL:
+        return read_grid_records(qs, base, columns, chunk_size=chunk_size)
+    return iter_grid_records(qs, base, columns, chunk_size=chunk_size)
 
-            # — Hospital details (if any) —
-            hd = obj.hospital_location.first()
-            if hd:
-                rec.update({
-                    "Facility Type":   hd.facilityType,
-                    "Diocese":         hd.diocese,
-                    "Parish Boundary": hd.lkp_parishBoundary.name if hd.lkp_parishBoundary.name else "",
-                })
+def _get_grid_results(base, perms, filters, columns=None):
+    """Return simplified records + columns for the Database grid.
 
-            sc = obj.school_location.first()
-            if sc:
-                rec.update({
-                    "School Code":      sc.schoolCode,
-                    "School Type":      sc.schoolType,
-                    "Grade Levels":     sc.gradeLevels,
-                    "MACS School":      sc.is_MACS,
-                    "Priests Teaching": sc.academicPriest,
-                    "Brothers Teaching":    sc.academicBrother,
-                    "Sisters Teaching": sc.academicSister,
-                    "Lay Staff Teaching":   sc.academicLay,
-                    "Canonical Status": sc.canonicalStatus,
-                    "Chapel on Site":   sc.is_schoolChapel,
-                })
-                
-            offertory_qs = obj.offertory_church.order_by('-year')
-            offertory = offertory_qs.first()
-            if offertory:
-                rec.update({
-                    'Offertory': offertory.income,
-                })
-            
-            octMass_qs = obj.octoberCount_church.order_by('-year')
-            octMass = octMass_qs.first()
-            if octMass:
-                total = octMass.week1 + octMass.week2 + octMass.week3 + octMass.week4
-                rec.update({
-                'October Mass Count': total,
-                    
-                })
-            
-            """ Found an issue where this was pulling the oldest data and not the newest. """
-            # sa = obj.statusAnimarum_church.first()
-            sa_qs = obj.statusAnimarum_church.order_by('-year')
-            sa = sa_qs.first()
-            if sa:
-                rec.update({
-                    "# Deacons":  sa.fullTime_deacons,
-                    "# Brothers":  sa.fullTime_brothers,
-                    "# Sisters":  sa.fullTime_sisters,
-                    "# Lay":  sa.fullTime_other,
-                    "# Staff":  sa.partTime_staff,
-                    "Volunteers":  sa.volunteers,
-                    "Max Mass Size":  sa.maxMass,
-                    "Baptisms 1-7":  sa.baptismAge_1_7,
-                    "Baptisms 8-17":  sa.baptismAge_8_17,
-                    "Baptisms 18+":  sa.baptismAge_18,
-                    "Full Communion RCIA":  sa.fullCommunionRCIA,
-                    "First Communion":  sa.firstCommunion,
-                    "Confirmation":  sa.confirmation,
-                    "Catholic Marriages":  sa.marriage_catholic,
-                    "Interfaith Marriages":  sa.marriage_interfaith,
-                    "Deaths":  sa.deaths,
-                    "Children in Faith Formation":  sa.childrenInFaithFormation,
-                    "Kids: PreK - 5":  sa.school_prek_5,
-                    "Kids: 6-8":  sa.school_grade6_8,
-                    "Kids: 9-12":  sa.school_grade9_12,
-                    "Youth Ministy":  sa.youthMinistry,
-                    "Adult Education":  sa.adult_education,
-                    "Adult Sacrament Prep":  sa.adult_sacramentPrep,
-                    "# Paid Catechists":  sa.catechist_paid,
-                    "# Volunteer Catechists":  sa.catechist_vol,
-                    "RCIA/RCIC":  sa.rcia_rcic,
-                    "# Volunteers Youth":  sa.volunteersWorkingYouth,
-                    "# Referrals to Catholic Charities":  sa.referrals_catholicCharities,
-                })
-                rec["Social Outreach Programs"] = ", ".join(
-                    sop.name for sop in obj.social_outreach_program.all()
-                )
-            
-            records.append(rec)
-
-    # columns = []
-    # if records:
-    #     for key in records[0].keys():
-    #         columns.append({"title": key, "field": key})
-    # ---- Build column metadata --------------------------------------------
-    all_fields = []
-    for rec in records:
-        for key in rec.keys():
-            if key not in all_fields:
-                all_fields.append(key)
-
-    columns = [
-        {
-            "title": key,
-            "field": key,
-            "sqlField": DISPLAY_TO_PATH.get(key, key).split("__").pop(),
-            "category": FIELD_CATEGORIES.get(key, "Other"),
-        }
-        for key in all_fields
-    ]
-
-    # ---- Compute stats_info for numeric/boolean Statistics fields ---------
-    stats_info = []
-    for col in columns:
-        if col["category"] != "Statistics":
-            continue
-
-        field = col["field"]
-        vals = [rec.get(field) for rec in records if rec.get(field) is not None]
-
-        if not vals:
-            continue
-
-        if all(isinstance(v, bool) for v in vals):
-            stats_info.append({
-                "field": field,
-                "display": col["title"],
-                "type": "boolean",
-            })
-        else:
-            try:
-                nums = [float(v) for v in vals]
-            except (TypeError, ValueError):
-                continue
-            stats_info.append({
-                "field": field,
-                "display": col["title"],
-                "type": "number",
-                "min": min(nums),
-                "max": max(nums),
-            })
+    ``columns`` (from :func:`grid_columns`) limits the work to those columns."""
+    logger.debug('Building grid results for base "%s"', base)
+    summary = GridSummary()
+    records = []
+    for rec in _grid_records(_grid_queryset(base, perms, filters), base, columns):
+        summary.add(rec)
+        records.append(rec)
 
     logger.info('Grid results contain %d records', len(records))
-    return records, columns, stats_info
+    return records, summary.columns(), summary.stats_info()
+
+def _get_grid_page(base, perms, filters, page_size, cursor=None, columns=None):
+    """Return one keyset-paginated page of grid records.
+
+    Pages are ordered by the model's Meta ordering plus ``pk``. The first
+    page (``cursor`` is ``None``) walks the whole filtered set once to build
+    ``columns`` and ``stats_info``; later pages only touch their own rows and
+    return ``None`` for both so the client keeps the first page's summary.
+    With ``GRID_READ_MODEL`` on, pages and the summary read the stored rows.
+    """
+    logger.debug('Building grid page for base "%s" (size=%d, cursor=%s)', base, page_size, cursor)
+    qs = _grid_queryset(base, perms, filters)
+    ordering = keyset_ordering(qs.model)
+    after = decode_cursor(cursor, ordering) if cursor else None
+    if settings.GRID_READ_MODEL:
+        summary = GridSummary() if after is None else None
+        records, last = read_grid_page(qs, base, page_size, after, columns, summary)
+        columns, stats_info = ((summary.columns(), summary.stats_info()) if summary is not None
+                               else (None, None))
+        next_cursor = encode_cursor(cursor_values(last, ordering)) if last else None
+        logger.info('Grid page contains %d stored records (more=%s)', len(records), bool(last))
+        return records, columns, stats_info, next_cursor
+
+    qs = prefetch_for_grid(apply_keyset(qs, ordering, after), base, columns=columns)
+
+    records = []
+    last = None
+    has_more = False
+    if after is None:
+        summary = GridSummary()
+        for obj in qs.iterator(chunk_size=GRID_CHUNK_SIZE):
+            rec = build_grid_record(obj, base, columns)
+            summary.add(rec)
+            if len(records) < page_size:
+                records.append(rec)
+                last = obj
+            else:
+                has_more = True
+        columns, stats_info = summary.columns(), summary.stats_info()
+    else:
+        page = list(qs[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        records = [build_grid_record(obj, base, columns) for obj in page]
+        last = page[-1] if page else None
+        columns = stats_info = None
+
+    next_cursor = encode_cursor(cursor_values(last, ordering)) if has_more else None
+    logger.info('Grid page contains %d records (more=%s)', len(records), has_more)
+    return records, columns, stats_info, next_cursor
+
+def _stream_grid_results(base, perms, filters, columns=None):
+    """Yield grid records as NDJSON lines while they are built.
+
+    Rows are read with ``iterator(chunk_size=...)`` so only one chunk of
+    prefetched objects is alive at a time. ``columns`` and ``stats_info``
+    can only be known once every row has been seen, so they follow the rows
+    as a trailing ``{"type": "summary", ...}`` line."""
+    logger.debug('Streaming grid results for base "%s"', base)
+    records = _grid_records(_grid_queryset(base, perms, filters), base, columns,
+                            chunk_size=GRID_CHUNK_SIZE)
+
+    summary = GridSummary()
+    count = 0
+    try:
+        for rec in records:
+            summary.add(rec)
+            count += 1
+            yield ndjson_line(rec)
+    except Exception:
+        logger.exception('Grid stream for base "%s" failed after %d records', base, count)
+        yield ndjson_line({"type": "error", "detail": "Grid stream interrupted"})
+        return
+
+    logger.info('Streamed %d grid records', count)
+    yield ndjson_line({
+        "type": "summary",
+        "count": count,
+        "columns": summary.columns(),
+        "stats_info": summary.stats_info(),
+    })
 
 def _get_filtered_items(request):
     """Return queryset of ``Person`` or ``Location`` filtered by POST data."""
@@ -622,11 +406,40 @@ def _get_filtered_items(request):
     qs = Location.objects.all() if base == 'location' else Person.objects.all()
     qs = _apply_permission_filters(qs, perms, base)
     qs = _apply_user_filters(qs, filters)
-    qs = qs.distinct()
-    count = qs.count()
-    logger.info('Filtered queryset contains %d records', count)
+    _log_count('Filtered queryset contains %d records', qs)
     return qs
 
+def _build_filter_tree(base, perms, filters):
+    qs = Location.objects.all() if base == "location" else Person.objects.all()
+    qs = _apply_permission_filters(qs, perms, base)
+    qs = _apply_user_filters(qs, filters)
+
+    paths = DYNAMIC_FILTER_FIELDS.get(base, [])
+    facets = compute_facets(qs, paths)
+
+    filter_tree = []
+    for path in paths:
+        opts = [
+            {"value": val, "label": val, "count": count}
+            for val, count in facets[path]
+        ]
+        if opts:
+            filter_tree.append({
+                "field": path,
+                "display": FIELD_LABELS.get(path, path.replace("__", " ").title()),
+                "options": opts,
+            })
+    return filter_tree
+
+def _filter_tree_cache_key(base, perms, filters):
+    """Key a filter tree on the data generation and a canonical request hash.
+
+    Permission objects and filters are sorted so that equivalent requests
+    from different users share one entry."""
+    canonical_perms = sorted(json.dumps(p, sort_keys=True, default=str) for p in perms)
+    digest = fingerprint(base, canonical_perms, sorted(map(str, filters)))
+    return f"filter_tree:{data_generation()}:{digest}"
+
 class FilterTreeView_v1(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -640,30 +453,19 @@ class FilterTreeView_v1(APIView):
         perms = _get_permissions(request)
         logger.debug('Permission: %s', perms)
 
-        qs = Location.objects.all() if base == "location" else Person.objects.all()
-        qs = _apply_permission_filters(qs, perms, base)
-        qs = _apply_user_filters(qs, filters)
-
-        filter_tree = []
-        for path in DYNAMIC_FILTER_FIELDS.get(base, []):
-            buckets = qs.values(path).annotate(count=Count(path)).order_by()
-            opts = []
-            for r in buckets:
-                val = r[path]
-                if val is None:
-                    continue
-                opts.append({"value": val, "label": val, "count": r["count"]})
-            if opts:
-                filter_tree.append({
-                    "field": path,
-                    "display": FIELD_LABELS.get(path, path.replace("__", " ").title()),
-                    "options": opts,
-                })
+        key = _filter_tree_cache_key(base, perms, filters)
+        filter_tree = cache.get(key)
+        if filter_tree is None:
+            filter_tree = _build_filter_tree(base, perms, filters)
+            cache.set(key, filter_tree, settings.FILTER_TREE_CACHE_TIMEOUT)
+        else:
+            logger.debug('Filter tree served from cache (%s)', key)
 
         return Response({"filter_tree": filter_tree})
 
 class FilterResultsView_v1(APIView):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get(self, request, *args, **kwargs):
         base = request.query_params.get("base", "person")
@@ -672,37 +474,196 @@ class FilterResultsView_v1(APIView):
 
         perms = _get_permissions(request)
 
-        records, columns, stats_info = _get_grid_results(base, perms, filters)
+        try:
+            columns = grid_columns(base, _get_columns(request))
+        except ValueError as exc:
+            logger.warning('Invalid grid columns: %s', exc)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                _stream_grid_results(base, perms, filters, columns),
+                content_type=NDJSON_CONTENT_TYPE,
+            )
+
+        if "page_size" in request.query_params or "cursor" in request.query_params:
+            try:
+                page_size = parse_page_size(request.query_params.get("page_size"))
+                records, columns, stats_info, next_cursor = _get_grid_page(
+                    base, perms, filters, page_size,
+                    cursor=request.query_params.get("cursor") or None,
+                    columns=columns,
+                )
+            except ValueError as exc:
+                logger.warning('Invalid pagination parameters: %s', exc)
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                "grid": {"data": records, "columns": columns},
+                "stats_info": stats_info,
+                "next_cursor": next_cursor,
+                "page_size": page_size,
+                })
+
+        records, columns, stats_info = _get_grid_results(base, perms, filters, columns)
 
         return Response({
             "grid": {"data": records, "columns": columns},
             "stats_info": stats_info,
             })
 
+SEARCH_TYPES = {
+    "person": ("persons", Person, ("id", "name_first", "name_last")),
+    "location": ("locations", Location, ("id", "name")),
+}
+
+def _parse_count(raw, name, default, maximum=None):
+    """Validate a non-negative integer query parameter.
+
+    Raises ``ValueError`` when the value is not one."""
+    if raw in (None, ""):
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"{name} must be a non-negative integer") from exc
+    if value < 0:
+        raise ValueError(f"{name} must be a non-negative integer")
+    return min(value, maximum) if maximum is not None else value
+
+def _search_page(query, base, perms, limit, offset=0, cursor=None):
+    """Return one ranked page of ``base`` matches and the cursor of the next.
+
+    Matches are walked in ``SEARCH_ORDERING`` from ``cursor`` (skipping
+    ``offset`` more), restricted to the rows ``perms`` may see."""
+    _, model, fields = SEARCH_TYPES[base]
+    after = decode_cursor(cursor, SEARCH_ORDERING) if cursor else None
+    allowed = _apply_permission_filters(model.objects.all(), perms, base)
+    entries = apply_keyset(
+        search_entries(query, base).filter(object_id__in=allowed.values("pk")),
+        SEARCH_ORDERING, after,
+    )
+    page = list(entries.values_list("object_id", "match_rank", "sort_name", "pk")
+                [offset:offset + limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    rows = {row["id"]: row for row in model.objects.filter(pk__in=[p[0] for p in page]).values(*fields)}
+    results = [rows[p[0]] for p in page if p[0] in rows]
+    next_cursor = encode_cursor(page[-1][1:]) if has_more and page else None
+    return results, next_cursor
+
 class SearchResultsView_v1(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
         query = request.query_params.get("q", "").strip()
+        requested = request.query_params.get("type") or None
 
         perms = _get_permissions(request)
 
-        person_qs = Person.objects.filter(
-            Q(name_first__icontains=query)
-            | Q(name_last__icontains=query)
-            | Q(name_middle__icontains=query)
-        )
-        person_qs = _apply_permission_filters(person_qs, perms, "person")
+        if requested is not None and requested not in SEARCH_TYPES:
+            return Response({"detail": f"Unknown search type {requested!r}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        bases = [requested] if requested else list(SEARCH_TYPES)
+        if request.query_params.get("cursor") and len(bases) > 1:
+            return Response({"detail": "cursor requires type"}, status=status.HTTP_400_BAD_REQUEST)
 
-        location_qs = Location.objects.filter(name__icontains=query)
-        location_qs = _apply_permission_filters(location_qs, perms, "location")
+        try:
+            limits = {base: _parse_count(request.query_params.get("limit"), "limit",
+                                         SEARCH_RESULT_LIMITS[base], SEARCH_MAX_RESULT_LIMIT)
+                      for base in bases}
+            offset = _parse_count(request.query_params.get("offset"), "offset", 0)
+        except ValueError as exc:
+            logger.warning('Invalid search parameters: %s', exc)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = {key: [] for key, _, _ in SEARCH_TYPES.values()}
+        next_cursor = {key: None for key in results}
+
+        if len(" ".join(query.split())) < SEARCH_MIN_QUERY_LENGTH:
+            logger.debug('Search query %r is too short', query)
+            return Response({"results": results, "next_cursor": next_cursor})
+
+        if request.query_params.get("mode") == "prefix":
+            # Search-as-you-type: answered from the in-process name index,
+            # which has no further pages.
+            for base in bases:
+                results[SEARCH_TYPES[base][0]] = typeahead(query, base, perms, limits[base])
+            return Response({"results": results, "next_cursor": next_cursor})
+
+        for base in bases:
+            key = SEARCH_TYPES[base][0]
+            try:
+                results[key], next_cursor[key] = _search_page(
+                    query, base, perms, limits[base], offset,
+                    cursor=request.query_params.get("cursor") or None,
+                )
+            except ValueError as exc:
+                logger.warning('Invalid search cursor: %s', exc)
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        results = {
-            "persons": list(person_qs.values("id", "name_first", "name_last")),
-            "locations": list(location_qs.values("id", "name")),
-        }
+        return Response({"results": results, "next_cursor": next_cursor})
 
-        return Response({"results": results})
+def _get_metrics(request):
+    """Return the metric names passed as repeated or comma separated ``metrics``."""
+    raw = request.query_params.getlist('metrics') or request.query_params.getlist('metrics[]')
+    return [name.strip() for value in raw for name in value.split(",") if name.strip()]
+
+class AggregateView_v1(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        base = request.query_params.get("base", "location")
+        group_by = request.query_params.get("group_by", "")
+        metrics = _get_metrics(request)
+        filters = _get_filters(request)
+
+        perms = _get_permissions(request)
+
+        if base != "location":
+            # Parish statistics are kept per church.
+            return Response({"detail": "Aggregates are only available for base 'location'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            groups = aggregate(_grid_queryset(base, perms, filters), group_by, metrics)
+        except ValueError as exc:
+            logger.warning('Invalid aggregate request: %s', exc)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "group_by": group_by,
+            "metrics": list(dict.fromkeys(metrics)),
+            "groups": groups,
+            })
+
+class TimeSeriesView_v1(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        base = request.query_params.get("base", "location")
+        rollup = request.query_params.get("rollup", "church")
+        metrics = _get_metrics(request)
+        filters = _get_filters(request)
+
+        perms = _get_permissions(request)
+
+        if base != "location":
+            # Parish statistics are kept per church.
+            return Response({"detail": "Time series are only available for base 'location'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload = time_series(
+                _grid_queryset(base, perms, filters), metrics, rollup,
+                year_from=request.query_params.get("year_from") or None,
+                year_to=request.query_params.get("year_to") or None,
+            )
+        except ValueError as exc:
+            logger.warning('Invalid time series request: %s', exc)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(payload)
 
 class PersonViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet providing read-only access to ``Person`` objects."""
@@ -750,7 +711,7 @@ def upload_temp(request):
 
 def _get_email_list(request, email_type_name):
     items = _get_filtered_items(request)
-    logger.debug('Fetching %s email list for %d items', email_type_name, items.count())
+    logger.debug('Fetching %s email list', email_type_name)
 
     base = request.POST.get('base', 'person')
     if base == 'location':
@@ -862,17 +823,7 @@ def email_count_preview(request):
 
     qs = Location.objects.all() if base == 'location' else Person.objects.all()
     qs = _apply_permission_filters(qs, perms, base)
-
-    applied = {}
-    for rf in raw_f:
-        if ':' not in rf:
-            continue
-        fld, val = rf.split(':', 1)
-        applied.setdefault(fld, []).append(val)
-
-    for fld, vals in applied.items():
-        qs = qs.filter(**{f"{fld}__in": vals})
-    qs = qs.distinct()
+    qs = _apply_user_filters(qs, raw_f)
 
     recipients = []
     if data.get('personalEmail'):
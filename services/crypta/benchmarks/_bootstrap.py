@@ -0,0 +1,133 @@
+"""Shared setup for the crypta benchmark scripts.
+
+Configures Django against an in-memory SQLite database, creates the ``api``
+tables directly from the models and seeds a deterministic dataset shaped
+like the diocesan data (people with several assignments and statuses,
+churches with details and languages).
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+
+import django
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Add the project root so ``crypta_service`` can be imported when executing
+# the benchmarks directly.
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crypta_service.settings')
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+settings.DEBUG = False
+django.setup()
+
+import logging  # noqa: E402
+
+from django.apps import apps  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from api.models import (  # noqa: E402
+    Address, Assignment, AssignmentType, Church_Detail, Church_Language,
+    County, Language, Location, Person, Person_Status, Priest_Detail, Status,
+    Vicariate,
+)
+
+logging.getLogger('api').setLevel(logging.WARNING)
+
+CITIES = ['Charlotte', 'Gastonia', 'Hickory', 'Asheville', 'Concord', 'Salisbury',
+          'Boone', 'Monroe', 'Statesville', 'Shelby']
+
+
+def create_schema():
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('api').get_models():
+            editor.create_model(model)
+
+
+@transaction.atomic
+def seed(people=3000, locations=300, seed_value=0):
+    """Populate the database and return ``(people, locations)`` counts."""
+    rng = random.Random(seed_value)
+    counties = County.objects.bulk_create(County(name=f'County {i}') for i in range(10))
+    vicariates = Vicariate.objects.bulk_create(Vicariate(name=f'Vicariate {i}') for i in range(6))
+    addresses = Address.objects.bulk_create(
+        Address(friendlyName=f'Address {i}', address1=f'{i} Main St', city=rng.choice(CITIES),
+                state='NC', zip_code='28202', country='US')
+        for i in range(200)
+    )
+    languages = Language.objects.bulk_create(Language(name=n) for n in ('English', 'Spanish', 'Vietnamese'))
+    statuses = Status.objects.bulk_create(
+        Status(name=n, type='priest') for n in ('Active', 'Retired', 'Leave', 'Incardinated', 'Deceased')
+    )
+    assignment_types = AssignmentType.objects.bulk_create(
+        AssignmentType(title=t, personType='priest') for t in ('Pastor', 'Parochial Vicar', 'Chaplain', 'Administrator')
+    )
+
+    locs = Location.objects.bulk_create(
+        Location(name=f'Location {i}', type='church' if i % 3 else 'school',
+                 lkp_county_id=rng.choice(counties), lkp_vicariate_id=rng.choice(vicariates),
+                 lkp_physicalAddress_id=rng.choice(addresses), lkp_mailingAddress_id=rng.choice(addresses))
+        for i in range(locations)
+    )
+    churches = [loc for loc in locs if loc.type == 'church']
+    Church_Detail.objects.bulk_create(
+        Church_Detail(lkp_location_id=loc, parishUniqueName=loc.name, is_mission=rng.random() < 0.2,
+                      is_doc=True, parish_id=idx, cityServed=rng.choice(CITIES))
+        for idx, loc in enumerate(churches)
+    )
+    Church_Language.objects.bulk_create(
+        Church_Language(lkp_church_id=loc, lkp_language_id=lang, massTime='10:00')
+        for loc in churches for lang in rng.sample(languages, rng.randint(1, 2))
+    )
+
+    persons = Person.objects.bulk_create(
+        Person(personType=rng.choice(('priest', 'deacon', 'lay')), name_first=f'First{i}',
+               name_last=f'Last{i:05d}', prefix=rng.choice(('Mr.', 'Rev.', None)),
+               is_safeEnvironmentTraining=rng.random() < 0.8,
+               date_baptism=date(1950 + rng.randint(0, 50), 1, 1),
+               lkp_residence_id=rng.choice(addresses), lkp_mailing_id=rng.choice(addresses))
+        for i in range(people)
+    )
+    Assignment.objects.bulk_create(
+        Assignment(lkp_person_id=p, lkp_location_id=rng.choice(locs),
+                   lkp_assignmentType_id=rng.choice(assignment_types),
+                   date_assigned=date(2000 + rng.randint(0, 24), 7, 1))
+        for p in persons for _ in range(rng.randint(0, 3))
+    )
+    Person_Status.objects.bulk_create(
+        Person_Status(lkp_person_id=p, lkp_status_id=s, date_assigned=date(2020, 1, 1))
+        for p in persons for s in rng.sample(statuses, rng.randint(1, 2))
+    )
+    Priest_Detail.objects.bulk_create(
+        Priest_Detail(lkp_person_id=p, diocesanReligious=rng.choice(('diocesan', 'religious')),
+                      is_massEnglish=True, is_massSpanish=rng.random() < 0.3)
+        for p in persons if p.personType == 'priest'
+    )
+    return len(persons), len(locs)
+
+
+def measure(fn, repeat=5):
+    """Run ``fn`` ``repeat`` times; return ``(best_seconds, queries, result)``.
+
+    ``queries`` is the count of the first (cold) run."""
+    best, queries, result = None, None, None
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    for _ in range(repeat):
+        executed.clear()
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        queries = len(executed) if queries is None else queries
+    return best, queries, result
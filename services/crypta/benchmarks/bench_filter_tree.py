@@ -0,0 +1,59 @@
+"""Compare per-path facet queries with the batched facet engine.
+
+Usage::
+
+    python benchmarks/bench_filter_tree.py [people] [locations] [rtt_ms]
+
+In-memory SQLite has no network, so ``rtt_ms`` (default 1) adds a simulated
+round trip to every query to approximate a networked SQL Server.
+"""
+import sys
+import time
+
+from _bootstrap import create_schema, measure, seed
+
+from django.db import connection
+from django.db.models import Count
+
+from api.constants import DYNAMIC_FILTER_FIELDS
+from api.facets import compute_facets
+from api.models import Location, Person
+
+
+def per_path(qs, paths):
+    out = {}
+    for path in paths:
+        rows = qs.values(path).annotate(count=Count(path)).order_by()
+        out[path] = sorted((r[path], r['count']) for r in rows if r[path] is not None)
+    return out
+
+
+def main():
+    people = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    locations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rtt = (float(sys.argv[3]) if len(sys.argv) > 3 else 1.0) / 1000
+    create_schema()
+    print('Seeded %d people, %d locations' % seed(people, locations))
+
+    cases = [
+        ('person', Person.objects.all()),
+        ('person (priests)', Person.objects.filter(personType='priest')),
+        ('location', Location.objects.all()),
+    ]
+    def round_trip(execute, sql, params, many, context):
+        time.sleep(rtt)
+        return execute(sql, params, many, context)
+
+    print(f'Simulated round trip: {rtt * 1000:.1f} ms')
+    for label, qs in cases:
+        paths = DYNAMIC_FILTER_FIELDS['location' if qs.model is Location else 'person']
+        with connection.execute_wrapper(round_trip):
+            old_t, old_q, old = measure(lambda: per_path(qs, paths))
+            new_t, new_q, new = measure(lambda: compute_facets(qs, paths))
+        assert old == new, f'{label}: facet counts differ'
+        print(f'{label:<18} per-path {old_t * 1000:8.1f} ms / {old_q:2d} queries   '
+              f'batched {new_t * 1000:8.1f} ms / {new_q:2d} queries')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Microbenchmark of Database grid rows built in Python vs in the database.
+
+Usage::
+
+    python benchmarks/bench_grid_rows.py [people] [locations]
+
+The Python path prefetches related rows and formats model instances; the
+SQL path reads one ``values()`` row per object with ``StringAgg`` columns.
+Times are the best of five runs; query counts are from the first run.
+"""
+import sys
+
+from _bootstrap import create_schema, measure, seed
+
+from api.grid import build_grid_record, prefetch_for_grid, sql_grid_records
+from api.models import Location, Person
+
+
+def main():
+    people = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    locations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    create_schema()
+    print('Seeded %d people, %d locations' % seed(people, locations))
+
+    for base, model in (('person', Person), ('location', Location)):
+        py_t, py_q, py_rows = measure(lambda: [
+            build_grid_record(o, base) for o in prefetch_for_grid(model.objects.all(), base)
+        ])
+        sql_t, sql_q, sql_rows = measure(lambda: list(sql_grid_records(model.objects.all(), base)))
+        assert py_rows == sql_rows, f'{base}: grid rows differ'
+        print(f'{base:<9} {len(py_rows):5d} rows   python {py_t * 1000:8.1f} ms / {py_q} queries   '
+              f'sql {sql_t * 1000:8.1f} ms / {sql_q} queries   ({py_t / sql_t:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
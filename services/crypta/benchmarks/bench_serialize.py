@@ -0,0 +1,83 @@
+"""Microbenchmark of full-result serialization with and without plans.
+
+Usage::
+
+    python benchmarks/bench_serialize.py [people] [locations]
+
+Rows are fetched (with the usual prefetches) before timing, so only the
+serialization loop is measured. Times are the best of five runs; query
+counts are from the first run, before any lazily loaded FKs are cached.
+"""
+import sys
+
+from _bootstrap import create_schema, measure, seed
+
+from django.db.models import Model
+from django.db.models.fields.files import FileField, ImageField
+
+from api.models import Location, Person
+from api.views import _prefetch_for_base, _serialize_instance
+
+
+def legacy_safe_model_to_dict(obj):
+    data = {}
+    for f in obj._meta.fields:
+        val = getattr(obj, f.name)
+        if isinstance(f, (FileField, ImageField)):
+            if not val:
+                continue
+            data[f.name] = val.url if hasattr(val, "url") else None
+        elif isinstance(val, Model):
+            data[f.name] = val.pk
+        else:
+            data[f.name] = val
+    return data
+
+
+def legacy_serialize_instance(obj):
+    """``_serialize_instance`` as it was before serialization plans."""
+    data = {}
+    for f in obj._meta.fields:
+        val = getattr(obj, f.name)
+        if isinstance(f, (FileField, ImageField)):
+            if not val:
+                continue
+            data[f.name] = val.url if val else None
+        else:
+            data[f.name] = val
+    for rel in obj._meta.get_fields():
+        if rel.one_to_many and rel.auto_created:
+            mgr = getattr(obj, rel.get_accessor_name())
+            data[rel.get_accessor_name()] = [legacy_safe_model_to_dict(c) for c in mgr.all()]
+        elif rel.many_to_many and not rel.auto_created:
+            mgr = getattr(obj, rel.name)
+            data[rel.name] = [legacy_safe_model_to_dict(c) for c in mgr.all()]
+        elif rel.many_to_many and rel.auto_created:
+            mgr = getattr(obj, rel.get_accessor_name())
+            data[rel.get_accessor_name()] = [legacy_safe_model_to_dict(c) for c in mgr.all()]
+        elif (rel.many_to_one or rel.one_to_one) and rel.concrete:
+            val = getattr(obj, rel.name)
+            if val is not None:
+                data[rel.name] = legacy_safe_model_to_dict(val)
+    return data
+
+
+def main():
+    people = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    locations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    create_schema()
+    print('Seeded %d people, %d locations' % seed(people, locations))
+
+    for base, model in (('person', Person), ('location', Location)):
+        # Fresh rows for each run: the legacy path caches the FK objects it loads.
+        rows = list(_prefetch_for_base(model.objects.all(), base))
+        old_t, old_q, old = measure(lambda: [legacy_serialize_instance(o) for o in rows])
+        rows = list(_prefetch_for_base(model.objects.all(), base))
+        new_t, new_q, new = measure(lambda: [_serialize_instance(o) for o in rows])
+        assert old == new, f'{base}: serialized output differs'
+        print(f'{base:<9} {len(rows):5d} rows   legacy {old_t * 1000:8.1f} ms / {old_q} queries   '
+              f'planned {new_t * 1000:8.1f} ms / {new_q} queries   ({old_t / new_t:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
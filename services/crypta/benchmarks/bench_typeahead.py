@@ -0,0 +1,42 @@
+"""Microbenchmark of ``/api/v1/search`` lookups: indexed search vs typeahead.
+
+Usage::
+
+    python benchmarks/bench_typeahead.py [people] [locations]
+
+Times one search for each prefix of a few names, as search-as-you-type
+sends them, through :func:`api.search.search_entries` and through the
+in-process :func:`api.typeahead.typeahead` index (built before timing).
+Times are the best of five runs; query counts are from the first run.
+"""
+import sys
+
+from _bootstrap import create_schema, measure, seed
+
+from api.models import Person
+from api.search import ensure_search_schema, rebuild_search_index, search_entries
+from api.typeahead import typeahead
+
+PERMS = [{'resource': 'person', 'filters': {}}]
+
+
+def main():
+    people = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    locations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    create_schema()
+    ensure_search_schema()
+    print('Seeded %d people, %d locations' % seed(people, locations))
+    rebuild_search_index('person')
+
+    names = list(Person.objects.values_list('name_last', flat=True)[:5])
+    prefixes = [name[:size].lower() for name in names for size in range(1, len(name) + 1)]
+    typeahead(prefixes[0], 'person', PERMS)
+
+    db_t, db_q, _ = measure(lambda: [list(search_entries(p, 'person')[:10]) for p in prefixes])
+    mem_t, mem_q, _ = measure(lambda: [typeahead(p, 'person', PERMS) for p in prefixes])
+    print(f'{len(prefixes)} lookups   search index {db_t * 1000 / len(prefixes):7.3f} ms / {db_q} queries   '
+          f'typeahead {mem_t * 1000 / len(prefixes):7.3f} ms / {mem_q} queries')
+
+
+if __name__ == '__main__':
+    main()
@@ -60,6 +60,23 @@ LOGGING = {
     }
 }
 
+# Log row counts at each filtering step. Each count re-runs the whole filtered
+# query, so keep this off outside of debugging sessions.
+LOG_QUERYSET_COUNTS = os.getenv('LOG_QUERYSET_COUNTS', '') == '1'
+
+# Build Database grid rows with string aggregation in the database. Set to 0
+# to fall back to building them in Python from prefetched objects.
+GRID_SQL_ROWS = os.getenv('GRID_SQL_ROWS', '1') == '1'
+
+# Serve Database grid rows from the PersonGridRow/LocationGridRow read model
+# (see api.gridrows) instead of building them on every request.
+GRID_READ_MODEL = os.getenv('GRID_READ_MODEL', '1') == '1'
+
+# Index behind /api/v1/search (see api.search): 'auto' uses the database's
+# native full-text or trigram index when it is set up, 'ngram' the portable
+# one; any other name in api.search.INDEXES forces that index.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
 # Testing Settings
 TEST_RUNNER = 'django.test.runner.DiscoverRunner'
 
@@ -145,6 +162,30 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# Per-process local memory by default. The generation counters that invalidate
+# cached filter trees and typeahead data (see api.utilities.cache) live here,
+# so with more than one worker process, or writes from management commands,
+# CACHE_BACKEND/CACHE_LOCATION must point at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache). Otherwise a write only
+# invalidates the process that made it and the others serve stale data until
+# CACHE_GENERATION_TIMEOUT / FILTER_TREE_CACHE_TIMEOUT / TYPEAHEAD_MAX_AGE pass.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'crypta'),
+    }
+}
+
+# Seconds a computed filter tree stays cached (data changes invalidate it sooner).
+FILTER_TREE_CACHE_TIMEOUT = int(os.getenv('FILTER_TREE_CACHE_TIMEOUT', 300))
+# Seconds a generation counter lives before it is reseeded; keep it no longer
+# than the cache timeouts of the entries keyed on it.
+CACHE_GENERATION_TIMEOUT = int(os.getenv('CACHE_GENERATION_TIMEOUT', FILTER_TREE_CACHE_TIMEOUT))
+# Seconds a process keeps its typeahead index and permission id sets before
+# rereading them, even when no generation bump has reached it.
+TYPEAHEAD_MAX_AGE = int(os.getenv('TYPEAHEAD_MAX_AGE', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
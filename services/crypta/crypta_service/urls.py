@@ -21,6 +21,8 @@ from api.views import (
     FilterTreeView_v1,
     FilterResultsView_v1,
     SearchResultsView_v1,
+    AggregateView_v1,
+    TimeSeriesView_v1,
     PersonViewSet,
     LocationViewSet,
     upload_temp,
@@ -37,6 +39,8 @@ urlpatterns = [
     path('api/v1/filter_tree', FilterTreeView_v1.as_view(), name='filter_tree'),
     path('api/v1/filter_results', FilterResultsView_v1.as_view(), name='filter_results'),
     path('api/v1/search', SearchResultsView_v1.as_view(), name='search'),
+    path('api/v1/aggregate', AggregateView_v1.as_view(), name='aggregate'),
+    path('api/v1/timeseries', TimeSeriesView_v1.as_view(), name='timeseries'),
     path('api/v1/upload-tmp', upload_temp, name='upload_tmp'),
     path('api/v1/send-email', send_email, name='send_email'),
     path('api/v1/email-count-preview', email_count_preview, name='email_count_preview'),
@@ -0,0 +1,196 @@
+"""Async variants of the crypta data views, for the gateway under ASGI.
+
+With ``GATEWAY_ASYNC`` on, ``gateway/asgi.py`` serves the filter tree,
+filter results, search, aggregate, time series and database view endpoints
+(:data:`ASYNC_ROUTES`) from here. A request waiting on crypta then holds a
+coroutine rather than a worker thread, so one process can keep hundreds of
+proxied requests in flight over the pooled clients from
+:func:`api.upstream.async_client_for`.
+
+These paths go to :class:`AsyncDataHandler`, which keeps the security,
+common and CORS middleware but skips the session, auth, messages, CSRF and
+clickjacking middleware the rest of the gateway runs: under ASGI every hook
+of a sync middleware is a hop to a worker thread, and those hops cost more
+than the proxying itself. As in the sync views, crypta's status, content type,
+encoding and body are passed through unparsed; large or unsized bodies are
+streamed as they arrive. The other gateway views stay synchronous.
+"""
+import asyncio
+import json
+import logging
+
+import httpx
+from asgiref.sync import sync_to_async
+from corsheaders.middleware import CorsMiddleware
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.common import CommonMiddleware
+from django.middleware.security import SecurityMiddleware
+from django.urls import path
+from django.views import View
+
+from . import tokens, upstream
+from .views import (
+    CRYPTA_AGGREGATE_URL,
+    CRYPTA_FETCHTREE_URL,
+    CRYPTA_FILTERRESULTS_URL,
+    CRYPTA_SEARCH_URL,
+    CRYPTA_TIMESERIES_URL,
+    STREAM_CHUNK_SIZE,
+    _database_view,
+    _passthrough,
+)
+
+logger = logging.getLogger('api')
+
+
+async def _permission_headers(request):
+    """Async counterpart of ``views._permission_headers``.
+
+    Token checks can call the auth service, so they run off the event loop."""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return {}
+    perms = await sync_to_async(tokens.query_permissions, thread_sensitive=False)(auth_header)
+    return {} if perms is None else {'X-Query-Permissions': json.dumps(perms)}
+
+
+async def _stream_upstream(resp):
+    """Yield an upstream body as it arrives, still encoded, and release the
+    connection after."""
+    try:
+        async for chunk in resp.aiter_raw(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await resp.aclose()
+
+
+class CryptaProxyView(View):
+    """Async counterpart of ``views.CryptaProxyView``."""
+
+    upstream_url = None
+
+    async def get(self, request, *args, **kwargs):
+        logger.debug('Async proxy request recieved for %s', self.upstream_url)
+        headers = await _permission_headers(request)
+        headers['Accept-Encoding'] = request.headers.get('Accept-Encoding', 'identity')
+        params = [(key, value) for key, values in request.GET.lists() for value in values]
+        client = upstream.async_client_for(self.upstream_url)
+        try:
+            resp = await client.send(
+                client.build_request('GET', self.upstream_url, params=params, headers=headers),
+                stream=True,
+            )
+        except httpx.HTTPError as exc:
+            logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
+            return JsonResponse({'detail': 'Crypta service unavailable'}, status=503)
+        logger.info('Crypta Service returned status %s', resp.status_code)
+        length = resp.headers.get('Content-Length')
+        if length is not None and int(length) <= STREAM_CHUNK_SIZE:
+            body = b''.join([chunk async for chunk in _stream_upstream(resp)])
+            return _passthrough(resp, HttpResponse(body, status=resp.status_code))
+        return _passthrough(resp, StreamingHttpResponse(_stream_upstream(resp), status=resp.status_code))
+
+
+class FilterTreeView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_FETCHTREE_URL
+
+
+class FilterResultsView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_FILTERRESULTS_URL
+
+
+class SearchResultsView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_SEARCH_URL
+
+
+class AggregateView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_AGGREGATE_URL
+
+
+class TimeSeriesView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_TIMESERIES_URL
+
+
+async def _get_crypta_json(url, params, headers):
+    resp = await upstream.async_client_for(url).get(url, params=params, headers=headers)
+    logger.info('Crypta Service returned status %s for %s', resp.status_code, url)
+    try:
+        if resp.headers.get('Content-Type', '').startswith('application/json'):
+            return resp.status_code, resp.json()
+    except ValueError:
+        pass
+    return resp.status_code, resp.text
+
+
+class DatabaseView_v1(View):
+    """The filter tree and grid of the Database page, fetched concurrently."""
+
+    async def get(self, request, *args, **kwargs):
+        logger.debug('Async database view request recieved.')
+        headers = await _permission_headers(request)
+        params = [(key, value) for key, values in request.GET.lists() for value in values]
+        try:
+            tree, results = await asyncio.gather(
+                _get_crypta_json(CRYPTA_FETCHTREE_URL, params, headers),
+                _get_crypta_json(CRYPTA_FILTERRESULTS_URL, params, headers),
+            )
+        except httpx.HTTPError as exc:
+            logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
+            return JsonResponse({'detail': 'Crypta service unavailable'}, status=503)
+        data, status_code = _database_view(tree, results)
+        return JsonResponse(data, status=status_code, safe=False)
+
+
+# Path (as in gateway/urls.py) -> async view.
+ASYNC_ROUTES = {
+    'filter_tree/': FilterTreeView_v1,
+    'filter_results/': FilterResultsView_v1,
+    'search/': SearchResultsView_v1,
+    'aggregate/': AggregateView_v1,
+    'timeseries/': TimeSeriesView_v1,
+    'database_view/': DatabaseView_v1,
+}
+
+# URLconf of AsyncDataHandler, under the names gateway/urls.py gives them.
+urlpatterns = [path(route, view.as_view(), name=route.rstrip('/')) for route, view in ASYNC_ROUTES.items()]
+
+
+class AsyncDataHandler(ASGIHandler):
+    """ASGI handler for :data:`ASYNC_ROUTES` with a reduced middleware chain.
+
+    The data views get the same security headers, ``APPEND_SLASH``
+    handling and CORS headers as under WSGI, in ``settings.MIDDLEWARE``
+    order, but nothing from sessions, auth, messages, CSRF or clickjacking
+    protection, which they do not use."""
+
+    middleware = [SecurityMiddleware, CommonMiddleware, CorsMiddleware]
+    urlconf = __name__
+
+    def resolve_request(self, request):
+        request.urlconf = self.urlconf
+        return super().resolve_request(request)
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+        handler = convert_exception_to_response(self._get_response_async)
+        for middleware in reversed(self.middleware):
+            handler = convert_exception_to_response(middleware(handler))
+        self._middleware_chain = handler
+
+
+def dispatch(application):
+    """Wrap the gateway's ASGI ``application`` so that requests for
+    :data:`ASYNC_ROUTES` are handled by :class:`AsyncDataHandler`."""
+    data_handler = AsyncDataHandler()
+    paths = {f'/{route}' for route in ASYNC_ROUTES}
+
+    async def gateway(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in paths:
+            return await data_handler(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return gateway
@@ -0,0 +1,173 @@
+"""Used for testing the async data views in async_views.py."""
+import gzip
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from asgiref.testing import ApplicationCommunicator
+from django.test import AsyncRequestFactory, SimpleTestCase
+
+from api import async_views, upstream
+
+PERMS = [{'resource': 'person', 'filters': {}}]
+
+
+class _Crypta(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    calls = []
+
+    def do_GET(self):
+        self.calls.append((self.path, self.headers.get('X-Query-Permissions'), self.client_address[1]))
+        if self.path.startswith('/api/v1/filter_results') and 'format=ndjson' in self.path:
+            body, content_type, code = b'{"id": 1}\n{"id": 2}\n', 'application/x-ndjson', 200
+        elif self.path.startswith('/api/v1/filter_results'):
+            body, content_type, code = b'{"grid": {"data": []}}', 'application/json', 200
+        elif self.path.startswith('/api/v1/filter_tree'):
+            body, content_type, code = b'{"filter_tree": []}', 'application/json', 200
+        elif self.path.startswith('/api/v1/search?q=x'):
+            body, content_type, code = b'{"detail": "too short"}', 'application/json', 400
+        else:
+            body, content_type, code = b'{"results": []}', 'application/json', 200
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            body = gzip.compress(body)
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncProxyViewTests(SimpleTestCase):
+    """Used for testing the async proxy against a local upstream."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _Crypta)
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}/api/v1'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _Crypta.calls.clear()
+        self.factory = AsyncRequestFactory()
+        patcher = patch('api.async_views.tokens.query_permissions', return_value=PERMS)
+        self.query_permissions = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _get(self, view_class, endpoint, query='', **extra):
+        with patch.object(view_class, 'upstream_url', f'{self.base}/{endpoint}'):
+            response = await view_class.as_view()(self.factory.get(f'/{endpoint}/?{query}', **extra))
+            if response.streaming:
+                return response, b''.join([chunk async for chunk in response.streaming_content])
+        return response, response.content
+
+    async def test_request_and_response_are_passed_through(self):
+        response, body = await self._get(async_views.SearchResultsView_v1, 'search', 'q=smith&type=person',
+                                         headers={'Authorization': 'Bearer abc'})
+        self.assertEqual((response.status_code, response['Content-Type'], body),
+                         (200, 'application/json', b'{"results": []}'))
+        self.assertEqual(_Crypta.calls[0][:2], ('/api/v1/search?q=smith&type=person',
+                                                '[{"resource": "person", "filters": {}}]'))
+        self.query_permissions.assert_called_once_with('Bearer abc')
+
+        response, body = await self._get(async_views.SearchResultsView_v1, 'search', 'q=x')
+        self.assertEqual((response.status_code, body), (400, b'{"detail": "too short"}'))
+        await upstream.aclose_clients()
+
+    async def test_repeated_parameters_and_streams(self):
+        with patch.object(async_views, 'STREAM_CHUNK_SIZE', 8):
+            response, body = await self._get(async_views.FilterResultsView_v1, 'filter_results',
+                                             'format=ndjson&metric=a&metric=b')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(body, b'{"id": 1}\n{"id": 2}\n')
+        self.assertEqual(_Crypta.calls[0][0], '/api/v1/filter_results?format=ndjson&metric=a&metric=b')
+        await upstream.aclose_clients()
+
+    async def test_connections_are_reused(self):
+        with self.settings(UPSTREAM_ASYNC_SHARDS=2):
+            for _ in range(6):
+                await self._get(async_views.AggregateView_v1, 'aggregate')
+        # One connection per shard, taken in turn.
+        ports = [port for *_, port in _Crypta.calls]
+        self.assertEqual(len(set(ports)), 2)
+        self.assertEqual(ports[:2] * 3, ports)
+        await upstream.aclose_clients()
+
+    async def test_encoded_body_is_relayed_as_is(self):
+        response, body = await self._get(async_views.SearchResultsView_v1, 'search', 'q=smith',
+                                         headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), b'{"results": []}')
+
+        response, body = await self._get(async_views.SearchResultsView_v1, 'search', 'q=smith')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(body, b'{"results": []}')
+        await upstream.aclose_clients()
+
+    async def test_database_view_combines_tree_and_grid(self):
+        with patch.object(async_views, 'CRYPTA_FETCHTREE_URL', f'{self.base}/filter_tree'), \
+                patch.object(async_views, 'CRYPTA_FILTERRESULTS_URL', f'{self.base}/filter_results'):
+            request = self.factory.get('/database_view/?base=person', headers={'Authorization': 'Bearer abc'})
+            response = await async_views.DatabaseView_v1.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'filter_tree': [], 'grid': {'data': []}})
+        self.query_permissions.assert_called_once_with('Bearer abc')
+        self.assertEqual(sorted(path for path, *_ in _Crypta.calls),
+                         ['/api/v1/filter_results?base=person', '/api/v1/filter_tree?base=person'])
+        await upstream.aclose_clients()
+
+    async def test_unreachable_upstream_returns_503(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed = f'http://127.0.0.1:{sock.getsockname()[1]}/api/v1/timeseries'
+        with patch.object(async_views.TimeSeriesView_v1, 'upstream_url', closed), \
+                self.settings(UPSTREAM_RETRIES=0):
+            await upstream.aclose_clients()
+            response = await async_views.TimeSeriesView_v1.as_view()(self.factory.get('/timeseries/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'{"detail": "Crypta service unavailable"}')
+        await upstream.aclose_clients()
+
+    async def test_data_paths_run_a_reduced_middleware_chain(self):
+        other = []
+
+        async def application(scope, receive, send):
+            other.append(scope['path'])
+
+        gateway = async_views.dispatch(application)
+        scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                 'path': '/aggregate/', 'raw_path': b'/aggregate/', 'query_string': b'',
+                 'headers': [(b'host', b'testserver')], 'server': ('testserver', 80)}
+        with patch.object(async_views.AggregateView_v1, 'upstream_url', f'{self.base}/aggregate'):
+            communicator = ApplicationCommunicator(gateway, scope)
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output()
+            body = await communicator.receive_output()
+            await communicator.wait()
+        self.assertEqual((start['status'], body['body']), (200, b'{"results": []}'))
+        headers = {key.lower(): value for key, value in start['headers']}
+        # Set by the clickjacking middleware, which the data paths do not run.
+        self.assertNotIn(b'x-frame-options', headers)
+        # Set by the security middleware, which they keep.
+        self.assertEqual(headers[b'x-content-type-options'], b'nosniff')
+        self.assertIn(b'referrer-policy', headers)
+
+        await gateway({'type': 'http', 'path': '/tokens/'}, None, None)
+        self.assertEqual(other, ['/tokens/'])
+        await upstream.aclose_clients()
@@ -0,0 +1,198 @@
+"""Used for testing token verification and the claims cache in tokens.py."""
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import override_settings
+from django.urls import reverse
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.test import APITestCase
+
+from api import tokens
+
+KEY = 'current-shared-key-for-tests-0001'
+OLD_KEY = 'retired-shared-key-for-tests-0001'
+JWKS_URL = 'http://localhost:8002/api/v1/tokens/jwks/'
+PERMS = [{'resource': 'person', 'filters': {'name_last': ['Smith']}}]
+
+
+def _token(key=KEY, algorithm='HS256', headers=None, **claims):
+    payload = {'token_type': 'access', 'jti': uuid.uuid4().hex, 'exp': int(time.time()) + 300,
+               'queryPermissions': PERMS, **claims}
+    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+
+def _stored_jti(token):
+    """The ``jti`` of ``token`` as the auth service's ``Token.token`` holds it."""
+    return uuid.UUID(jwt.decode(token, options={'verify_signature': False})['jti'])
+
+
+def _response(data):
+    resp = MagicMock()
+    resp.status_code = 200
+    resp.json.return_value = data
+    return resp
+
+
+@override_settings(AUTH_JWT_SIGNING_KEY=KEY, AUTH_JWT_PREVIOUS_SIGNING_KEYS=[OLD_KEY],
+                   AUTH_REVOCATION_TTL=30, AUTH_REVOCATION_LIST_KEY='gateway-key')
+class LocalVerificationTests(APITestCase):
+    """Used for testing tokens verified without the decode endpoint."""
+
+    def setUp(self):
+        self.revoked = []
+        self.jwks = {'keys': []}
+        patcher = patch('api.tokens.upstream.get', side_effect=self._get)
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, state in [('_jwks', tokens._KeySet([])), ('_revoked', tokens._RevocationList(frozenset())),
+                            ('claims_cache', tokens.ClaimsCache())]:
+            patcher = patch.object(tokens, name, state)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _get(self, url, **kwargs):
+        return _response(self.jwks if url == JWKS_URL else {'revoked': self.revoked})
+
+    def _perms(self, token):
+        return tokens.query_permissions(f'Bearer {token}')
+
+    @patch('api.tokens.upstream.post')
+    def test_permissions_are_read_locally(self, mock_post):
+        self.assertEqual(self._perms(_token()), PERMS)
+        self.assertEqual(self._perms(_token(key=OLD_KEY)), PERMS)
+        mock_post.assert_not_called()
+
+    def test_untrusted_tokens_are_rejected(self):
+        self.assertIsNone(self._perms(_token(key='someone-elses-key-for-tests-01')))
+        self.assertIsNone(self._perms(_token(exp=int(time.time()) - 10)))
+        self.assertIsNone(self._perms(_token(token_type='refresh')))
+        self.assertIsNone(self._perms(jwt.encode({'queryPermissions': PERMS}, KEY)))
+        self.assertIsNone(self._perms('not-a-token'))
+        self.assertIsNone(tokens.query_permissions(f'Token {_token()}'))
+
+    def test_revoked_tokens_are_rejected(self):
+        token, old_token = _token(), _token()
+        self.assertEqual(self._perms(token), PERMS)
+        # The auth service lists the UUID it stored for the claim, as hex;
+        # older versions used the hyphenated form.
+        self.revoked.append(_stored_jti(token).hex)
+        self.revoked.append(str(_stored_jti(old_token)))
+        # The revocation list is only fetched again once it is older than the TTL.
+        self.assertEqual(self._perms(token), PERMS)
+        self.assertEqual(self.get.call_count, 1)
+        self.assertEqual(self.get.call_args.kwargs['headers'], {'X-Service-Key': 'gateway-key'})
+        with override_settings(AUTH_REVOCATION_TTL=0):
+            self.assertIsNone(self._perms(token))
+            self.assertIsNone(self._perms(old_token))
+            self.assertEqual(self._perms(_token()), PERMS)
+
+    @patch('api.tokens.JWKS_MIN_REFRESH', 0)
+    @patch('api.tokens.AUTH_JWKS_URL', JWKS_URL)
+    def test_public_keys_are_fetched_and_rotated(self):
+        old, new = (rsa.generate_private_key(public_exponent=65537, key_size=2048) for _ in range(2))
+        self.jwks = {'keys': [{**RSAAlgorithm.to_jwk(old.public_key(), as_dict=True), 'alg': 'RS256'}]}
+        self.assertEqual(self._perms(_token(key=old, algorithm='RS256')), PERMS)
+
+        self.jwks = {'keys': [{**RSAAlgorithm.to_jwk(new.public_key(), as_dict=True), 'alg': 'RS256'}]}
+        self.assertEqual(self._perms(_token(key=new, algorithm='RS256')), PERMS)
+        self.assertIsNone(self._perms(_token(key=old, algorithm='RS256')))
+
+    @patch('api.views.upstream.get')
+    def test_view_forwards_local_permissions(self, mock_get):
+        mock_get.return_value = _response({'results': {}})
+        mock_get.return_value.headers = {'Content-Type': 'application/json'}
+        mock_get.return_value.raw.stream.return_value = iter([b'{"results": {}}'])
+        with patch('api.views.upstream.post') as mock_post:
+            response = self.client.get(reverse('search'), {'q': 'smith'},
+                                       HTTP_AUTHORIZATION=f'Bearer {_token()}')
+        self.assertEqual(response.status_code, 200)
+        mock_post.assert_not_called()
+        self.assertEqual(mock_get.call_args.kwargs['headers']['X-Query-Permissions'],
+                         '[{"resource": "person", "filters": {"name_last": ["Smith"]}}]')
+
+
+@override_settings(AUTH_TOKEN_CACHE_TTL=60, AUTH_TOKEN_CACHE_SIZE=2, AUTH_REVOCATION_TTL=30)
+class RemoteDecodeTests(APITestCase):
+    """Used for testing the decode endpoint fallback and the claims cache."""
+
+    def setUp(self):
+        self.revoked = []
+        patcher = patch('api.tokens.upstream.get',
+                        side_effect=lambda url, **kwargs: _response({'revoked': self.revoked}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, state in [('_revoked', tokens._RevocationList(frozenset())),
+                            ('claims_cache', tokens.ClaimsCache())]:
+            patcher = patch.object(tokens, name, state)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('api.tokens.upstream.post', side_effect=self._decode)
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _decode(self, url, headers):
+        token = headers['Authorization'].split()[1]
+        if token == 'bad':
+            resp = _response({'detail': 'Invalid Token'})
+            resp.status_code = 400
+            return resp
+        return _response({'jti': token, 'exp': int(time.time()) + 300, 'queryPermissions': PERMS})
+
+    def test_decode_endpoint_is_used_without_keys(self):
+        self.assertEqual(tokens.query_permissions('Bearer abc'), PERMS)
+        self.post.assert_called_once_with(tokens.AUTH_DECODE_URL, headers={'Authorization': 'Bearer abc'})
+        self.assertIsNone(tokens.query_permissions('Bearer bad'))
+
+    def test_unreadable_decode_responses_give_no_claims(self):
+        resp = _response(None)
+        resp.json.side_effect = ValueError('Expecting value')
+        self.post.side_effect = [resp, _response(['not', 'claims'])]
+        self.assertIsNone(tokens.query_permissions('Bearer abc'))
+        self.assertIsNone(tokens.query_permissions('Bearer abc'))
+
+    def test_repeated_tokens_are_decoded_once(self):
+        for _ in range(3):
+            self.assertEqual(tokens.query_permissions('Bearer abc'), PERMS)
+        self.assertIsNone(tokens.query_permissions('Bearer bad'))
+        self.assertIsNone(tokens.query_permissions('Bearer bad'))
+        self.assertEqual(self.post.call_count, 3)
+        response = self.client.get(reverse('token_cache'))
+        self.assertEqual(response.data, {'size': 1, 'max_size': 2, 'ttl': 60, 'hits': 2,
+                                         'misses': 3, 'revoked': 0})
+
+    def test_entries_are_bounded_by_size_and_expiry(self):
+        for token in ['a', 'b', 'a', 'c']:
+            tokens.query_permissions(f'Bearer {token}')
+        # 'b' was least recently used when 'c' came in.
+        self.assertEqual(tokens.claims_cache.stats()['size'], 2)
+        self.assertIsNotNone(tokens.claims_cache.get('Bearer a'))
+        self.assertIsNone(tokens.claims_cache.get('Bearer b'))
+
+        tokens.claims_cache.set('Bearer old', {'jti': 'old', 'exp': int(time.time()) - 1})
+        self.assertIsNone(tokens.claims_cache.get('Bearer old'))
+
+    def test_revocation_list_evicts_cached_claims(self):
+        jtis = {token: uuid.uuid4().hex for token in ('revoked', 'live')}
+        self.post.side_effect = lambda url, headers: _response(
+            {'jti': jtis[headers['Authorization'].split()[1]], 'exp': int(time.time()) + 300,
+             'queryPermissions': PERMS})
+        self.assertEqual(tokens.query_permissions('Bearer revoked'), PERMS)
+        # As RevokedTokensView lists it: Token.token is a UUIDField, emitted as hex.
+        self.revoked.append(uuid.UUID(jtis['revoked']).hex)
+        with override_settings(AUTH_REVOCATION_TTL=0):
+            self.assertEqual(tokens.query_permissions('Bearer live'), PERMS)
+        # Fetching the list dropped the revoked token's claims, not only rejected them.
+        self.assertIsNone(tokens.claims_cache.get('Bearer revoked'))
+        self.assertIsNotNone(tokens.claims_cache.get('Bearer live'))
+        self.assertEqual(tokens.claims_cache.stats()['revoked'], 1)
+
+    def test_revocations_evict_entries(self):
+        self.assertEqual(tokens.query_permissions('Bearer abc'), PERMS)
+        self.revoked.append('abc')
+        with override_settings(AUTH_REVOCATION_TTL=0):
+            self.assertIsNone(tokens.query_permissions('Bearer abc'))
+        self.assertEqual(tokens.claims_cache.stats()['revoked'], 1)
+        self.assertIsNone(tokens.claims_cache.get('Bearer abc'))
@@ -0,0 +1,84 @@
+"""Used for testing the pooled upstream clients in upstream.py."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from api import upstream
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    calls = []
+
+    def _reply(self):
+        self.calls.append((self.command, self.path, self.client_address[1],
+                           self.headers.get('Cookie')))
+        code = 503 if self.path == '/unavailable' else 200
+        body = b'{}'
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'sessionid=someone-else; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(UPSTREAM_RETRIES=2, UPSTREAM_RETRY_BACKOFF=0)
+class UpstreamSessionTests(SimpleTestCase):
+    """Used for testing connection reuse, retries and isolation."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        upstream.close_sessions()
+        _Handler.calls.clear()
+
+    def tearDown(self):
+        upstream.close_sessions()
+
+    def test_one_bounded_executor_per_process(self):
+        pool = upstream.executor()
+        self.assertIs(upstream.executor(), pool)
+        self.assertEqual(pool._max_workers, settings.UPSTREAM_EXECUTOR_WORKERS)
+
+    def test_one_session_per_upstream(self):
+        self.assertIs(upstream.session_for(self.url + '/a'), upstream.session_for(self.url + '/b'))
+        self.assertIsNot(upstream.session_for('http://localhost:8001/api/v1/search'),
+                         upstream.session_for('http://localhost:8002/api/v1/users/'))
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(3):
+            self.assertEqual(upstream.get(self.url + '/ok').status_code, 200)
+        self.assertEqual(len({port for _, _, port, _ in _Handler.calls}), 1)
+
+    def test_only_idempotent_methods_are_retried(self):
+        self.assertEqual(upstream.get(self.url + '/unavailable').status_code, 503)
+        self.assertEqual(len(_Handler.calls), 3)
+
+        _Handler.calls.clear()
+        self.assertEqual(upstream.post(self.url + '/unavailable', json={}).status_code, 503)
+        self.assertEqual(len(_Handler.calls), 1)
+
+    def test_upstream_cookies_are_not_shared(self):
+        upstream.get(self.url + '/ok')
+        upstream.get(self.url + '/ok')
+        self.assertEqual([cookie for *_, cookie in _Handler.calls], [None, None])
@@ -1,9 +1,14 @@
 """Used for testing views.py in my application."""
+import gzip
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
+from api import upstream
+
 REGISTER_URL = os.getenv('AUTH_REGISTER_URL', 'http://localhost:8002/api/v1/users/register/')
 LOGIN_URL = os.getenv('AUTH_LOGIN_URL', 'http://localhost:8002/api/v1/tokens/retrieve/')
 REFRESH_URL = os.getenv('AUTH_REFRESH_URL', 'http://localhost:8002/api/v1/tokens/refresh/')
@@ -15,7 +20,7 @@ CRYPTA_FILTERRESULTS_URL = os.getenv('CRYPTA_FILTERRESULTS_URL', 'http://localho
 
 class RegisterViewTests(APITestCase):
     """Used for testing registration of users."""
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_register_route_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 201
@@ -47,7 +52,7 @@ class RegisterViewTests(APITestCase):
 class LoginViewTests(APITestCase):
     """Used for testing login of users."""
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_login_route_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -75,7 +80,7 @@ class LoginViewTests(APITestCase):
 class TokenRefreshViewTests(APITestCase):
     """Used for testing token refresh route."""
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_refresh_route_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -100,7 +105,7 @@ class TokenRefreshViewTests(APITestCase):
 class VerifyMfaViewTests(APITestCase):
     """Used for testing MFA verification."""
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_verify_route_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -126,7 +131,7 @@ class VerifyMfaViewTests(APITestCase):
         self.assertEqual(flat_data, data)
 
 class SSOLoginViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_sso_login_proxy(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 302
@@ -141,7 +146,7 @@ class SSOLoginViewTests(APITestCase):
         mock_get.assert_called_once_with(SSO_LOGIN_URL, allow_redirects=False)
 
 class SSOCallbackViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_sso_callback_proxy(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -156,7 +161,7 @@ class SSOCallbackViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class UsersViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_users_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -169,7 +174,7 @@ class UsersViewTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         mock_get.assert_called_once()
 
-    @patch('api.views.requests.delete')
+    @patch('api.views.upstream.delete')
     def test_users_delete_calls_auth_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 204
@@ -183,7 +188,7 @@ class UsersViewTests(APITestCase):
         mock_delete.assert_called_once()
 
 class RolesViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_roles_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -197,7 +202,7 @@ class RolesViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class RoleDetailViewTests(APITestCase):
-    @patch('api.views.requests.delete')
+    @patch('api.views.upstream.delete')
     def test_role_delete_calls_auth_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 204
@@ -210,7 +215,7 @@ class RoleDetailViewTests(APITestCase):
         self.assertEqual(response.status_code, 204)
         mock_delete.assert_called_once()
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_role_create_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 201
@@ -224,7 +229,7 @@ class RoleDetailViewTests(APITestCase):
         mock_post.assert_called_once()
 
 class TokensViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_tokens_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -238,7 +243,7 @@ class TokensViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class OrganizationsViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_orgs_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -252,7 +257,7 @@ class OrganizationsViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class OrganizationDetailViewTests(APITestCase):
-    @patch('api.views.requests.delete')
+    @patch('api.views.upstream.delete')
     def test_org_delete_calls_auth_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 204
@@ -265,7 +270,7 @@ class OrganizationDetailViewTests(APITestCase):
         self.assertEqual(response.status_code, 204)
         mock_delete.assert_called_once()
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_org_create_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 201
@@ -279,7 +284,7 @@ class OrganizationDetailViewTests(APITestCase):
         mock_post.assert_called_once()
 
 class LoginAttemptsViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_attempts_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -293,7 +298,7 @@ class LoginAttemptsViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class CryptaGroupsViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_groups_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -307,7 +312,7 @@ class CryptaGroupsViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class CryptaGroupDetailViewTests(APITestCase):
-    @patch('api.views.requests.delete')
+    @patch('api.views.upstream.delete')
     def test_group_delete_calls_auth_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 204
@@ -320,7 +325,7 @@ class CryptaGroupDetailViewTests(APITestCase):
         self.assertEqual(response.status_code, 204)
         mock_delete.assert_called_once()
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_group_create_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 201
@@ -334,7 +339,7 @@ class CryptaGroupDetailViewTests(APITestCase):
         mock_post.assert_called_once()
 
 class QueryPermissionsViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_perms_list_calls_auth_service(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -348,7 +353,7 @@ class QueryPermissionsViewTests(APITestCase):
         mock_get.assert_called_once()
 
 class QueryPermissionDetailViewTests(APITestCase):
-    @patch('api.views.requests.delete')
+    @patch('api.views.upstream.delete')
     def test_perm_delete_calls_auth_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 204
@@ -361,7 +366,7 @@ class QueryPermissionDetailViewTests(APITestCase):
         self.assertEqual(response.status_code, 204)
         mock_delete.assert_called_once()
 
-    @patch('api.views.requests.post')
+    @patch('api.views.upstream.post')
     def test_perm_create_calls_auth_service(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 201
@@ -375,7 +380,7 @@ class QueryPermissionDetailViewTests(APITestCase):
         mock_post.assert_called_once()
 
 class CryptaFilterTreeViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_crypta_filter_tree_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -389,7 +394,7 @@ class CryptaFilterTreeViewTests(APITestCase):
         mock_delete.assert_called_once()
 
 class CryptaFilterResultsViewTests(APITestCase):
-    @patch('api.views.requests.get')
+    @patch('api.views.upstream.get')
     def test_crypta_filter_results_service(self, mock_delete):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -401,3 +406,200 @@ class CryptaFilterResultsViewTests(APITestCase):
         
         self.assertEqual(response.status_code, 200)
         mock_delete.assert_called_once()
+
+class CryptaFilterResultsStreamingTests(APITestCase):
+    @patch('api.views.upstream.get')
+    def test_ndjson_is_passed_through(self, mock_get):
+        lines = [b'{"id":1}\n', b'{"type":"summary","count":1}\n']
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {'Content-Type': 'application/x-ndjson'}
+        mock_response.raw.stream.return_value = iter(lines)
+        mock_get.return_value = mock_response
+
+        url = reverse('filter_results')
+        response = self.client.get(url, {'base': 'location', 'format': 'ndjson'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(b''.join(response.streaming_content), b''.join(lines))
+        mock_response.json.assert_not_called()
+        mock_response.close.assert_called_once()
+        self.assertEqual(dict(mock_get.call_args.kwargs['params'])['format'], ['ndjson'])
+
+class CryptaAggregateViewTests(APITestCase):
+    @patch('api.views.upstream.get')
+    def test_repeated_metrics_are_forwarded(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {'Content-Type': 'application/json'}
+        mock_response.raw.stream.return_value = iter([b'{"groups": []}'])
+        mock_get.return_value = mock_response
+
+        url = reverse('aggregate')
+        response = self.client.get(url, {'group_by': 'year',
+                                         'metrics': ['offertory.income:sum', 'october.total:avg']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'{"groups": []}')
+        params = dict(mock_get.call_args.kwargs['params'])
+        self.assertEqual(params['metrics'], ['offertory.income:sum', 'october.total:avg'])
+
+class CryptaTimeSeriesViewTests(APITestCase):
+    @patch('api.views.upstream.get')
+    def test_crypta_timeseries_service(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {'Content-Type': 'application/json'}
+        mock_response.raw.stream.return_value = iter([b'{"years": [], "series": []}'])
+        mock_get.return_value = mock_response
+
+        url = reverse('timeseries')
+        response = self.client.get(url, {'metrics': 'offertory.income:sum', 'rollup': 'vicariate'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'{"years": [], "series": []}')
+        mock_get.assert_called_once()
+
+class CryptaDatabaseViewTests(APITestCase):
+    def _response(self, data, status_code=200):
+        mock_response = MagicMock()
+        mock_response.status_code = status_code
+        mock_response.headers = {'Content-Type': 'application/json'}
+        mock_response.json.return_value = data
+        return mock_response
+
+    @patch('api.views.tokens.query_permissions', return_value=[])
+    @patch('api.views.upstream.get')
+    def test_tree_and_grid_are_fetched_together(self, mock_get, mock_perms):
+        # Each call waits for the other, so this only passes if both are in flight at once.
+        both_sent = threading.Barrier(2, timeout=5)
+
+        def get(url, **kwargs):
+            both_sent.wait()
+            if url == CRYPTA_FETCHTREE_URL:
+                return self._response({'filter_tree': [{'label': 'Parish'}]})
+            return self._response({'grid': {'data': [], 'columns': []}, 'stats_info': []})
+        mock_get.side_effect = get
+
+        url = reverse('database_view')
+        response = self.client.get(url, {'base': 'location', 'filters': '["parish"]'},
+                                   HTTP_AUTHORIZATION='Bearer abc')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'filter_tree': [{'label': 'Parish'}],
+                                         'grid': {'data': [], 'columns': []}, 'stats_info': []})
+        mock_perms.assert_called_once_with('Bearer abc')
+        self.assertEqual({call.args[0] for call in mock_get.call_args_list},
+                         {CRYPTA_FETCHTREE_URL, CRYPTA_FILTERRESULTS_URL})
+        self.assertEqual(dict(mock_get.call_args.kwargs['params']),
+                         {'base': ['location'], 'filters': ['["parish"]']})
+
+    @patch('api.views.upstream.get')
+    def test_upstream_errors_are_reported_as_bad_gateway(self, mock_get):
+        mock_get.side_effect = lambda url, **kwargs: (
+            self._response({'filter_tree': []}) if url == CRYPTA_FETCHTREE_URL
+            else self._response({'detail': 'Unknown column'}, 400))
+
+        response = self.client.get(reverse('database_view'), {'columns': 'nope'})
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data, {'detail': 'Crypta service returned an error',
+                                         'upstream_status': 400,
+                                         'upstream_response': {'detail': 'Unknown column'}})
+
+    @patch('api.views.upstream.get')
+    def test_unexpected_bodies_are_reported_as_bad_gateway(self, mock_get):
+        for tree, results in [('<html>Server Error</html>', {'grid': {}}),
+                              ({'filter_tree': []}, [{'id': 1}]),
+                              ({'filter_tree': []}, {'detail': 'no grid'})]:
+            mock_get.side_effect = lambda url, **kwargs: (
+                self._response(tree) if url == CRYPTA_FETCHTREE_URL else self._response(results))
+
+            response = self.client.get(reverse('database_view'))
+
+            self.assertEqual(response.status_code, 502)
+            self.assertEqual(response.data['upstream_status'], 200)
+
+    @patch('api.views.upstream.get')
+    def test_malformed_json_is_reported_as_bad_gateway(self, mock_get):
+        broken = self._response(None)
+        broken.json.side_effect = ValueError('Expecting value')
+        broken.text = '{"filter_tree": ['
+        mock_get.side_effect = lambda url, **kwargs: (
+            broken if url == CRYPTA_FETCHTREE_URL else self._response({'grid': {}}))
+
+        response = self.client.get(reverse('database_view'))
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['upstream_response'], '{"filter_tree": [')
+
+    @patch('api.views.upstream.get')
+    def test_unreachable_crypta_returns_503(self, mock_get):
+        mock_get.side_effect = upstream.RequestException('refused')
+
+        response = self.client.get(reverse('database_view'))
+
+        self.assertEqual(response.status_code, 503)
+
+
+class _GzipCrypta(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    BODY = b'{"grid": {"data": [], "columns": []}}'
+    accept_encodings = []
+
+    def do_GET(self):
+        self.accept_encodings.append(self.headers.get('Accept-Encoding'))
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = gzip.compress(self.BODY) if compress else self.BODY
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class CryptaPassthroughTests(APITestCase):
+    """Used for testing that crypta bodies are relayed without being decoded."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _GzipCrypta)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.patcher = patch('api.views.FilterResultsView_v1.upstream_url',
+                            f'http://127.0.0.1:{cls.server.server_port}/api/v1/filter_results')
+        cls.patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _GzipCrypta.accept_encodings.clear()
+
+    def test_encoded_body_is_relayed_as_is(self):
+        response = self.client.get(reverse('filter_results'), HTTP_ACCEPT_ENCODING='gzip, br')
+
+        body = b''.join(response.streaming_content)
+        self.assertEqual(_GzipCrypta.accept_encodings, ['gzip, br'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual(gzip.decompress(body), _GzipCrypta.BODY)
+
+    def test_identity_is_requested_for_clients_without_accept_encoding(self):
+        response = self.client.get(reverse('filter_results'))
+
+        self.assertEqual(_GzipCrypta.accept_encodings, ['identity'])
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), _GzipCrypta.BODY)
@@ -0,0 +1,302 @@
+"""Access token verification for the gateway's data views.
+
+The data views only need the ``queryPermissions`` claim of the caller's
+access token. When the gateway has keys to check the token signature with,
+the token is verified here, in process:
+
+* ``AUTH_JWT_SIGNING_KEY`` is the key shared with the auth service for HS256
+  tokens; ``AUTH_JWT_PREVIOUS_SIGNING_KEYS`` keeps retired keys valid while
+  the tokens they signed are still live.
+* ``AUTH_JWKS_URL`` points at the public keys the auth service publishes for
+  RS256/ES256 tokens. The set is cached for ``AUTH_JWKS_TTL`` seconds and
+  fetched again early when a token does not verify against it, so a rotated
+  key is picked up without a restart.
+
+The auth service is then only asked which tokens have been revoked; that
+list is fetched at most every ``AUTH_REVOCATION_TTL`` seconds, with the
+``AUTH_REVOCATION_LIST_KEY`` service key. Without any
+keys configured, tokens are decoded by the auth service instead.
+
+Either way the claims are kept in :data:`claims_cache` for a short while,
+so a page that calls several data views with one token decodes it once.
+Tokens on the revocation list are evicted from it when the list is fetched.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+
+from . import upstream
+
+logger = logging.getLogger('api')
+
+AUTH_DECODE_URL = os.getenv('AUTH_DECODE_URL', 'http://localhost:8002/api/v1/tokens/decode/')
+AUTH_JWKS_URL = os.getenv('AUTH_JWKS_URL', '')
+AUTH_REVOKED_URL = os.getenv('AUTH_REVOKED_URL', 'http://localhost:8002/api/v1/tokens/revoked/')
+
+# A failed signature check fetches the key set again at most this often.
+JWKS_MIN_REFRESH = 30
+
+
+def _jti(value):
+    """A token id as simplejwt writes it: a UUID in 32 hex digits. Ids that
+    are not UUIDs are returned as they are."""
+    try:
+        return uuid.UUID(str(value)).hex
+    except ValueError:
+        return value
+
+
+class InvalidToken(Exception):
+    """The token is malformed, expired, revoked or not signed by a known key."""
+
+
+class ClaimsCache:
+    """Decoded claims by token hash, least recently used evicted first.
+
+    Entries live for ``AUTH_TOKEN_CACHE_TTL`` seconds or until the token's
+    ``exp``, whichever comes first; at most ``AUTH_TOKEN_CACHE_SIZE`` are
+    kept."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.revoked = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, claims):
+        expires = time.time() + settings.AUTH_TOKEN_CACHE_TTL
+        if isinstance(claims.get('exp'), (int, float)):
+            expires = min(expires, claims['exp'])
+        if expires <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def evict(self, jtis):
+        """Drop the claims of every token whose ``jti`` is in ``jtis``, a set
+        of ids normalised by :func:`_jti`."""
+        if not jtis:
+            return
+        with self._lock:
+            stale = [key for key, (_, claims) in self._entries.items() if _jti(claims.get('jti')) in jtis]
+            for key in stale:
+                del self._entries[key]
+            self.revoked += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.revoked = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': settings.AUTH_TOKEN_CACHE_SIZE,
+                'ttl': settings.AUTH_TOKEN_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revoked': self.revoked,
+            }
+
+
+claims_cache = ClaimsCache()
+
+
+class _Fetched:
+    """A value fetched from the auth service and kept for a while.
+
+    A failed fetch keeps the previous value, so revocations and keys already
+    known are still enforced while the auth service is unreachable."""
+
+    name = ''
+
+    def __init__(self, empty):
+        self.value = empty
+        self.fetched_at = None
+        self.lock = threading.Lock()
+
+    def _older_than(self, max_age):
+        return self.fetched_at is None or time.monotonic() - self.fetched_at > max_age
+
+    def get(self, max_age):
+        if self._older_than(max_age):
+            with self.lock:
+                if self._older_than(max_age):
+                    self.fetched_at = time.monotonic()
+                    try:
+                        self.value = self.fetch()
+                    except (upstream.RequestException, ValueError) as exc:
+                        logger.error('Failed to fetch %s, keeping the cached copy: %s', self.name, exc)
+        return self.value
+
+    def fetch(self):
+        raise NotImplementedError
+
+
+class _KeySet(_Fetched):
+    """Public keys published by the auth service, as ``(key, algorithm)``."""
+
+    name = 'token keys'
+
+    def fetch(self):
+        resp = upstream.get(AUTH_JWKS_URL)
+        resp.raise_for_status()
+        keys = []
+        for data in resp.json().get('keys', []):
+            try:
+                jwk = jwt.PyJWK(data)
+            except jwt.PyJWTError as exc:
+                logger.warning('Skipping unusable key %s: %s', data.get('kid'), exc)
+                continue
+            keys.append((jwk.key, jwk.algorithm_name))
+        logger.info('Loaded %d token verification keys', len(keys))
+        return keys
+
+
+class _RevocationList(_Fetched):
+    """Ids (``jti``) of revoked tokens."""
+
+    name = 'revoked tokens'
+
+    def fetch(self):
+        resp = upstream.get(AUTH_REVOKED_URL,
+                            headers={'X-Service-Key': settings.AUTH_REVOCATION_LIST_KEY})
+        resp.raise_for_status()
+        # Older auth services list the hyphenated form of the stored UUID.
+        jtis = frozenset(_jti(jti) for jti in resp.json().get('revoked', []))
+        claims_cache.evict(jtis)
+        return jtis
+
+
+_jwks = _KeySet([])
+_revoked = _RevocationList(frozenset())
+
+
+def _shared_keys():
+    return [key for key in [settings.AUTH_JWT_SIGNING_KEY, *settings.AUTH_JWT_PREVIOUS_SIGNING_KEYS] if key]
+
+
+def local_verification_enabled():
+    return bool(_shared_keys() or AUTH_JWKS_URL)
+
+
+def _candidates(algorithm, refresh=False):
+    if algorithm.startswith('HS'):
+        return _shared_keys()
+    if not AUTH_JWKS_URL:
+        return []
+    keys = _jwks.get(JWKS_MIN_REFRESH if refresh else settings.AUTH_JWKS_TTL)
+    return [key for key, key_algorithm in keys if key_algorithm == algorithm]
+
+
+def _is_revoked(claims):
+    return _jti(claims.get('jti')) in _revoked.get(settings.AUTH_REVOCATION_TTL)
+
+
+def _decode(token, algorithm, keys):
+    for key in keys:
+        try:
+            return jwt.decode(token, key, algorithms=[algorithm], options={'require': ['exp', 'jti']})
+        except jwt.InvalidSignatureError:
+            continue
+        except jwt.PyJWTError as exc:
+            raise InvalidToken(str(exc)) from exc
+    return None
+
+
+def verify(token):
+    """Return the claims of an access token, verified locally.
+
+    Raises :class:`InvalidToken` when it cannot be trusted."""
+    try:
+        algorithm = jwt.get_unverified_header(token).get('alg', '')
+    except jwt.PyJWTError as exc:
+        raise InvalidToken(str(exc)) from exc
+    if algorithm not in settings.AUTH_JWT_ALGORITHMS:
+        raise InvalidToken(f'Algorithm {algorithm!r} is not accepted')
+
+    claims = _decode(token, algorithm, _candidates(algorithm))
+    if claims is None and not algorithm.startswith('HS'):
+        # The auth service may have rotated its key since the set was fetched.
+        claims = _decode(token, algorithm, _candidates(algorithm, refresh=True))
+    if claims is None:
+        raise InvalidToken('Signature verification failed')
+    if claims.get('token_type') != 'access':
+        raise InvalidToken('Not an access token')
+    if _is_revoked(claims):
+        raise InvalidToken('Token has been revoked')
+    return claims
+
+
+def _remote_claims(auth_header):
+    try:
+        dec = upstream.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
+        claims = dec.json() if dec.status_code == 200 else None
+    except upstream.RequestException as exc:
+        logger.error('Failed to contact auth service: %s', exc, exc_info=True)
+        return None
+    except ValueError as exc:
+        logger.error('Auth service returned unreadable claims: %s', exc)
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def _claims(auth_header):
+    if not local_verification_enabled():
+        return _remote_claims(auth_header)
+    scheme, _, token = auth_header.partition(' ')
+    if scheme != 'Bearer' or not token:
+        return None
+    try:
+        return verify(token)
+    except InvalidToken as exc:
+        logger.warning('Rejected token: %s', exc)
+        return None
+
+
+def query_permissions(auth_header):
+    """Return the ``queryPermissions`` of the bearer token in ``auth_header``,
+    or ``None`` when there is no usable token."""
+    if not auth_header:
+        return None
+    claims = claims_cache.get(auth_header)
+    if claims is None:
+        claims = _claims(auth_header)
+        if claims is None:
+            return None
+        claims_cache.set(auth_header, claims)
+    # Cached and remotely decoded claims have not been checked against the
+    # current revocation list yet.
+    if _is_revoked(claims):
+        logger.warning('Rejected token: Token has been revoked')
+        return None
+    return claims.get('queryPermissions', [])
@@ -0,0 +1,178 @@
+"""Pooled HTTP clients for the services behind the gateway.
+
+Calling ``requests.get`` and friends builds a new session, and so a new TCP
+connection, for every proxied request. This module keeps one
+:class:`requests.Session` per upstream origin (scheme, host and port) for the
+life of the process, so connections to the auth and crypta services are
+kept alive and reused from a bounded pool.
+
+Every request gets the configured connect and read timeouts unless the caller
+passes its own. Idempotent methods are retried with exponential backoff on
+connection errors and on 502/503/504; ``POST`` and ``PATCH`` are never
+retried. Views that call two upstreams at once run one of the calls on
+:func:`executor`, a bounded thread pool shared by the process. Pool sizes,
+timeouts, retries and workers come from the ``UPSTREAM_*`` settings.
+
+The async views in :mod:`api.async_views` get the same per-upstream pooling
+from :func:`async_client_for`, backed by :class:`httpx.AsyncClient`. httpcore
+re-checks every pooled connection whenever a request starts or ends, which
+costs more CPU than the request itself with tens of connections open, so
+each upstream's pool is split across ``UPSTREAM_ASYNC_SHARDS`` clients
+taken in turn.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('api')
+
+RequestException = requests.RequestException
+
+RETRY_STATUSES = (502, 503, 504)
+
+_SESSIONS = {}
+_LOCK = threading.Lock()
+_EXECUTOR = None
+# Event loop -> {origin: [AsyncClient, ...]}; a client's connections belong
+# to the loop that opened them.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def _timeout():
+    return (settings.UPSTREAM_CONNECT_TIMEOUT, settings.UPSTREAM_READ_TIMEOUT)
+
+
+def _new_session():
+    retry = Retry(
+        total=settings.UPSTREAM_RETRIES,
+        backoff_factor=settings.UPSTREAM_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        # Hand the last upstream response back instead of raising.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.UPSTREAM_POOL_CONNECTIONS,
+        pool_maxsize=settings.UPSTREAM_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # The session is shared by every user of the gateway, so cookies set by an
+    # upstream must never be stored and replayed on someone else's request.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def session_for(url):
+    """Return the shared session of the upstream serving ``url``."""
+    origin = _origin(url)
+    session = _SESSIONS.get(origin)
+    if session is None:
+        with _LOCK:
+            session = _SESSIONS.get(origin)
+            if session is None:
+                session = _SESSIONS[origin] = _new_session()
+                logger.debug('Opened upstream session for %s', origin)
+    return session
+
+
+def close_sessions():
+    """Close every pooled connection; sessions are reopened on next use."""
+    with _LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
+def executor():
+    """Return the shared, bounded thread pool that runs upstream calls
+    alongside the request thread. When every worker is busy, calls wait
+    for one instead of starting more threads."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=settings.UPSTREAM_EXECUTOR_WORKERS,
+                                               thread_name_prefix='upstream')
+    return _EXECUTOR
+
+
+def request(method, url, **kwargs):
+    """Send ``method`` to ``url`` over the upstream's pooled session."""
+    kwargs.setdefault('timeout', _timeout())
+    return session_for(url).request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def _new_async_client():
+    shards = settings.UPSTREAM_ASYNC_SHARDS
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=max(1, settings.UPSTREAM_ASYNC_MAX_CONNECTIONS // shards),
+            max_keepalive_connections=max(1, settings.UPSTREAM_POOL_MAXSIZE // shards),
+        ),
+        # httpx only retries failed connects, which is safe for any method.
+        retries=settings.UPSTREAM_RETRIES,
+    )
+    client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(
+        settings.UPSTREAM_READ_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT))
+    client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return client
+
+
+def async_client_for(url):
+    """Return a shared async client of the upstream serving ``url`` on the
+    running event loop."""
+    clients = _ASYNC_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    origin = _origin(url)
+    shards = clients.get(origin)
+    if shards is None:
+        shards = clients[origin] = [_new_async_client() for _ in range(settings.UPSTREAM_ASYNC_SHARDS)]
+        logger.debug('Opened async upstream clients for %s', origin)
+    shards.append(shards.pop(0))
+    return shards[-1]
+
+
+async def aclose_clients():
+    """Close the async clients of the running event loop."""
+    clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for shards in clients.values():
+        for client in shards:
+            await client.aclose()
@@ -1,11 +1,14 @@
 import os
-import requests
 import logging
 import json
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 
+from . import tokens, upstream
+
 logger = logging.getLogger('api')
 
 AUTH_REGISTER_URL = os.getenv('AUTH_REGISTER_URL', 'http://localhost:8002/api/v1/users/register/')
@@ -21,14 +24,66 @@ AUTH_PERMS_URL = os.getenv('AUTH_PERMS_URL', 'http://localhost:8002/api/v1/query
 AUTH_VERIFY_MFA_URL = os.getenv('AUTH_VERIFY_MFA_URL', 'http://localhost:8002/api/v1/users/verify_mfa/')
 AUTH_SSO_LOGIN_URL = os.getenv('AUTH_SSO_LOGIN_URL', 'http://localhost:8002/api/v1/sso/login/')
 AUTH_SSO_CALLBACK_URL = os.getenv('AUTH_SSO_CALLBACK_URL', 'http://localhost:8002/api/v1/sso/callback/')
-AUTH_DECODE_URL = os.getenv('AUTH_DECODE_URL', 'http://localhost:8002/api/v1/tokens/decode/')
 CRYPTA_FETCHTREE_URL = os.getenv('CRYPTA_FETCHTREE_URL', 'http://localhost:8001/api/v1/filter_tree')
 CRYPTA_FILTERRESULTS_URL = os.getenv('CRYPTA_FILTERRESULTS_URL', 'http://localhost:8001/api/v1/filter_results')
 CRYPTA_SEARCH_URL = os.getenv('CRYPTA_SEARCH_URL', 'http://localhost:8001/api/v1/search')
+CRYPTA_AGGREGATE_URL = os.getenv('CRYPTA_AGGREGATE_URL', 'http://localhost:8001/api/v1/aggregate')
+CRYPTA_TIMESERIES_URL = os.getenv('CRYPTA_TIMESERIES_URL', 'http://localhost:8001/api/v1/timeseries')
 CRYPTA_UPLOAD_TMP_URL = os.getenv('CRYPTA_UPLOAD_TMP_URL', 'http://localhost:8001/api/v1/upload-tmp')
 CRYPTA_SEND_EMAIL_URL = os.getenv('CRYPTA_SEND_EMAIL_URL', 'http://localhost:8001/api/v1/send-email')
 CRYPTA_EMAIL_COUNT_URL = os.getenv('CRYPTA_EMAIL_COUNT_URL', 'http://localhost:8001/api/v1/email-count-preview')
 
+STREAM_CHUNK_SIZE = 64 * 1024
+# Upstream headers relayed with a body that is passed through unparsed.
+PASSTHROUGH_HEADERS = ('Content-Encoding', 'Content-Length')
+
+def _permission_headers(request):
+    """Headers passing the caller's query permissions on to crypta."""
+    perms = tokens.query_permissions(request.headers.get('Authorization'))
+    return {} if perms is None else {'X-Query-Permissions': json.dumps(perms)}
+
+def _database_view(tree, results):
+    """Combine crypta's ``(status, data)`` answers for the filter tree and the
+    grid into one Database page payload.
+
+    If either call failed or did not answer with the expected JSON object,
+    the result is a 502 carrying that upstream status and body."""
+    for (status_code, data), key in ((tree, 'filter_tree'), (results, 'grid')):
+        if status_code >= 400 or not isinstance(data, dict) or key not in data:
+            logger.error('Crypta Service returned an unusable %s response (status %s)', key, status_code)
+            return {
+                'detail': 'Crypta service returned an error',
+                'upstream_status': status_code,
+                'upstream_response': data,
+            }, status.HTTP_502_BAD_GATEWAY
+    return {'filter_tree': tree[1]['filter_tree'], **results[1]}, status.HTTP_200_OK
+
+def _get_crypta_json(url, params, headers):
+    resp = upstream.get(url, params=params, headers=headers)
+    logger.info('Crypta Service returned status %s for %s', resp.status_code, url)
+    try:
+        if resp.headers.get('Content-Type', '').startswith('application/json'):
+            return resp.status_code, resp.json()
+    except ValueError:
+        pass
+    return resp.status_code, resp.text
+
+def _stream_upstream(resp):
+    """Yield an upstream body as it arrives, still encoded, and release the
+    connection after."""
+    try:
+        yield from resp.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    finally:
+        resp.close()
+
+def _passthrough(resp, response):
+    """Give ``response`` the headers describing the upstream body."""
+    response['Content-Type'] = resp.headers.get('Content-Type', 'application/json')
+    for header in PASSTHROUGH_HEADERS:
+        if header in resp.headers:
+            response[header] = resp.headers[header]
+    return response
+
 # Create your views here.
 class CreateUserView_v1(APIView):
     """Proxy user registration to the authentication service."""
@@ -42,12 +97,12 @@ class CreateUserView_v1(APIView):
         try:
             logger.debug('Forwarding data to auth service at %s', AUTH_REGISTER_URL)
             logger.debug('data: %s', request.data)
-            resp = requests.post(AUTH_REGISTER_URL, json=request.data)
+            resp = upstream.post(AUTH_REGISTER_URL, json=request.data)
             logger.info('Auth service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -63,12 +118,12 @@ class LoginView_v1(APIView):
         try:
             logger.debug('Forwarding data to auth service at %s', AUTH_LOGIN_URL)
             logger.debug('data: %s', request.data)
-            resp = requests.post(AUTH_LOGIN_URL, json=request.data)
+            resp = upstream.post(AUTH_LOGIN_URL, json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response(
                 {'detail': 'Authentication service unavailable'},
@@ -87,12 +142,12 @@ class TokenRefreshView_v1(APIView):
         try:
             logger.debug('Forwarding data to auth service at %s', AUTH_REFRESH_URL)
             logger.debug('data %s', request.data)
-            resp = requests.post(AUTH_REFRESH_URL, json=request.data)
+            resp = upstream.post(AUTH_REFRESH_URL, json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response(
                 {'detail': 'Authentication service unavailable'},
@@ -106,11 +161,11 @@ class UsersView_v1(APIView):
         logger.debug('Received users request')
         try:
             logger.debug('Requesting %s', AUTH_USERS_URL)
-            resp = requests.get(AUTH_USERS_URL)
+            resp = upstream.get(AUTH_USERS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
@@ -118,22 +173,22 @@ class UsersView_v1(APIView):
         logger.debug('Update user %s request', pk)
         try:
             logger.debug('Requesting %s', f'{AUTH_USERS_URL}{pk}')
-            resp = requests.patch(f"{AUTH_USERS_URL}{pk}/", json=request.data)
+            resp = upstream.patch(f"{AUTH_USERS_URL}{pk}/", json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status = status.HTTP_503_SERVICE_UNAVAILABLE)
 
     def delete(self, request, pk, *args, **kwargs):
         logger.debug('Delete user %s request', pk)
         try:
-            resp = requests.delete(f"{AUTH_USERS_URL}{pk}/")
+            resp = upstream.delete(f"{AUTH_USERS_URL}{pk}/")
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -144,11 +199,11 @@ class RolesView_v1(APIView):
         logger.debug('Received roles request')
         try:
             logger.debug('Requesting %s', AUTH_ROLES_URL)
-            resp = requests.get(AUTH_ROLES_URL)
+            resp = upstream.get(AUTH_ROLES_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -158,22 +213,22 @@ class RoleDetailView_v1(APIView):
     def delete(self, request, pk, *args, **kwargs):
         logger.debug('Delete role %s request', pk)
         try:
-            resp = requests.delete(f"{AUTH_ROLES_URL}{pk}/")
+            resp = upstream.delete(f"{AUTH_ROLES_URL}{pk}/")
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     def post(self, request, *args, **kwargs):
         logger.debug('Create role request')
         try:
-            resp = requests.post(f'{AUTH_ROLES_URL}create/', json=request.data)
+            resp = upstream.post(f'{AUTH_ROLES_URL}create/', json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -184,14 +239,22 @@ class TokensView_v1(APIView):
         logger.debug('Received tokens request')
         try:
             logger.debug('Requesting %s', AUTH_TOKENS_URL)
-            resp = requests.get(AUTH_TOKENS_URL)
+            resp = upstream.get(AUTH_TOKENS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
+class TokenCacheView_v1(APIView):
+    """Report the size and hit/miss counters of this process's token cache."""
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return Response(tokens.claims_cache.stats())
+
 class OrganizationsView_v1(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -199,11 +262,11 @@ class OrganizationsView_v1(APIView):
         logger.debug('Received organizations request')
         try:
             logger.debug('Requesting %s', AUTH_ORGS_URL)
-            resp = requests.get(AUTH_ORGS_URL)
+            resp = upstream.get(AUTH_ORGS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -213,22 +276,22 @@ class OrganizationDetailView_v1(APIView):
     def delete(self, request, pk, *args, **kwargs):
         logger.debug('Delete organization %s request', pk)
         try:
-            resp = requests.delete(f"{AUTH_ORGS_URL}{pk}/")
+            resp = upstream.delete(f"{AUTH_ORGS_URL}{pk}/")
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     def post(self, request, *args, **kwargs):
         logger.debug('Create organization request')
         try:
-            resp = requests.post(f'{AUTH_ORGS_URL}create/', json=request.data)
+            resp = upstream.post(f'{AUTH_ORGS_URL}create/', json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -239,11 +302,11 @@ class LoginAttemptsView_v1(APIView):
         logger.debug('Received login attempts request')
         try:
             logger.debug('Requesting %s', AUTH_ATTEMPTS_URL)
-            resp = requests.get(AUTH_ATTEMPTS_URL)
+            resp = upstream.get(AUTH_ATTEMPTS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -254,11 +317,11 @@ class CryptaGroupsView_v1(APIView):
         logger.debug('Received crypta groups request')
         try:
             logger.debug('Requesting %s', AUTH_GROUPS_URL)
-            resp = requests.get(AUTH_GROUPS_URL)
+            resp = upstream.get(AUTH_GROUPS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -268,22 +331,22 @@ class CryptaGroupDetailView_v1(APIView):
     def delete(self, request, pk, *args, **kwargs):
         logger.debug('Delete crypta group %s request', pk)
         try:
-            resp = requests.delete(f"{AUTH_GROUPS_URL}{pk}/")
+            resp = upstream.delete(f"{AUTH_GROUPS_URL}{pk}/")
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     def post(self, request, *args, **kwargs):
         logger.debug('Create crypta group request')
         try:
-            resp = requests.post(f'{AUTH_GROUPS_URL}create/', json=request.data)
+            resp = upstream.post(f'{AUTH_GROUPS_URL}create/', json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -294,11 +357,11 @@ class QueryPermissionsView_v1(APIView):
         logger.debug('Received query permissions request')
         try:
             logger.debug('Requesting %s', AUTH_PERMS_URL)
-            resp = requests.get(AUTH_PERMS_URL)
+            resp = upstream.get(AUTH_PERMS_URL)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json()
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -308,22 +371,22 @@ class QueryPermissionDetailView_v1(APIView):
     def delete(self, request, pk, *args, **kwargs):
         logger.debug('Delete query permission %s request', pk)
         try:
-            resp = requests.delete(f"{AUTH_PERMS_URL}{pk}/")
+            resp = upstream.delete(f"{AUTH_PERMS_URL}{pk}/")
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     def post(self, request, *args, **kwargs):
         logger.debug('Create query permission request')
         try:
-            resp = requests.post(f'{AUTH_PERMS_URL}create/', json=request.data)
+            resp = upstream.post(f'{AUTH_PERMS_URL}create/', json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.text else ''
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -336,12 +399,12 @@ class VerifyMfaView_v1(APIView):
         logger.debug('Verify MFA request')
         try:
             logger.debug('Forwarding data to auth service at %s', AUTH_VERIFY_MFA_URL)
-            resp = requests.post(AUTH_VERIFY_MFA_URL, json=request.data)
+            resp = upstream.post(AUTH_VERIFY_MFA_URL, json=request.data)
             logger.info('Auth Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -352,14 +415,14 @@ class SSOLoginView_v1(APIView):
         logger.debug('Proxy SSO login request')
         try:
             # Don't follow redirects so the frontend can handle them
-            resp = requests.get(AUTH_SSO_LOGIN_URL, allow_redirects=False)
+            resp = upstream.get(AUTH_SSO_LOGIN_URL, allow_redirects=False)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.headers.get('Content-Type', '').startswith('application/json') else resp.text
             headers = {}
             if 'Location' in resp.headers:
                 headers['Location'] = resp.headers['Location']
             return Response(data, status=resp.status_code, headers=headers)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -369,97 +432,73 @@ class SSOCallbackView_v1(APIView):
     def get(self, request, *args, **kwargs):
         logger.debug('Proxy SSO callback request')
         try:
-            resp = requests.get(AUTH_SSO_CALLBACK_URL, params=request.query_params)
+            resp = upstream.get(AUTH_SSO_CALLBACK_URL, params=request.query_params)
             logger.info('Auth Service returned status %s', resp.status_code)
             data = resp.json() if resp.headers.get('Content-Type', '').startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact auth service: %s', exc, exc_info=True)
             return Response({'detail': 'Authentication service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-class FilterTreeView_v1(APIView):
-    permission_classes = [permissions.AllowAny]
-    
-    def get(self, request, *args, **kwargs):
-        logger.debug('Filter Tree request recieved.')
+class CryptaProxyView(View):
+    """Relay a GET to crypta as is: the query string and the caller's
+    permissions go up, the status, content type, encoding and body come back
+    without being parsed. Views that change the data use DRF instead."""
 
-        headers = {}
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                dec = requests.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
-                if dec.status_code == 200:
-                    perms = dec.json().get('queryPermissions', [])
-                    headers['X-Query-Permissions'] = json.dumps(perms)
-            except requests.RequestException as exc:
-                logger.error('Failed to contact auth service: %s', exc, exc_info=True)
-                
-        try:
-            logger.debug('Forwarding fetch request to crypta service at %s', CRYPTA_FETCHTREE_URL)
-            resp = requests.get(CRYPTA_FETCHTREE_URL, params=request.query_params, headers=headers)
-            logger.info('Crypta Service returned status %s', resp.status_code)
-            content_type = resp.headers.get('Content-Type', '')
-            data = resp.json() if content_type.startswith('application/json') else resp.text
-            return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
-            logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
-            return Response({'detail': 'Crypta Service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    upstream_url = None
 
-class FilterResultsView_v1(APIView):
-    permission_classes = [permissions.AllowAny]
-    
     def get(self, request, *args, **kwargs):
-        logger.debug('Filter Results request recieved.')
-        
-        headers = {}
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                dec = requests.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
-                if dec.status_code == 200:
-                    perms = dec.json().get('queryPermissions', [])
-                    headers['X-Query-Permissions'] = json.dumps(perms)
-            except requests.RequestException as exc:
-                logger.error('Failed to contact auth service: %s', exc, exc_info=True)
+        logger.debug('Proxy request recieved for %s', self.upstream_url)
 
+        headers = _permission_headers(request)
+        headers['Accept-Encoding'] = request.headers.get('Accept-Encoding', 'identity')
         try:
-            logger.debug('Forwarding fetch request to crypta service at %s', CRYPTA_FILTERRESULTS_URL)
-            resp = requests.get(CRYPTA_FILTERRESULTS_URL, params=request.query_params, headers=headers)
-            logger.info('Crypta Service returned status %s', resp.status_code)
-            content_type = resp.headers.get('Content-Type', '')
-            data = resp.json() if content_type.startswith('application/json') else resp.text
-            return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+            # Keep repeated parameters such as ``metrics``.
+            resp = upstream.get(self.upstream_url, params=list(request.GET.lists()), headers=headers, stream=True)
+        except upstream.RequestException as exc:
             logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
-            return Response({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return JsonResponse({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        logger.info('Crypta Service returned status %s', resp.status_code)
+        return _passthrough(resp, StreamingHttpResponse(_stream_upstream(resp), status=resp.status_code))
+
+class FilterTreeView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_FETCHTREE_URL
+
+class FilterResultsView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_FILTERRESULTS_URL
+
+class SearchResultsView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_SEARCH_URL
+
+class AggregateView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_AGGREGATE_URL
+
+class TimeSeriesView_v1(CryptaProxyView):
+    upstream_url = CRYPTA_TIMESERIES_URL
+
+class DatabaseView_v1(APIView):
+    """The filter tree and grid of the Database page in one round trip.
 
-class SearchResultsView_v1(APIView):
+    The token is checked once and both crypta requests run side by side, so
+    the page waits for the slower of the two rather than for both in turn."""
     permission_classes = [permissions.AllowAny]
-    
+
     def get(self, request, *args, **kwargs):
-        logger.debug('Search Results request recieved.')
-        
-        headers = {}
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                dec = requests.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
-                if dec.status_code == 200:
-                    perms = dec.json().get('queryPermissions', [])
-                    headers['X-Query-Permissions'] = json.dumps(perms)
-            except requests.RequestException as exc:
-                logger.error('Failed to contact auth service: %s', exc, exc_info=True)
+        logger.debug('Database view request recieved.')
 
+        headers = _permission_headers(request)
+        params = list(request.query_params.lists())
         try:
-            logger.debug('Forwarding search request to crypta service at %s', CRYPTA_SEARCH_URL)
-            resp = requests.get(CRYPTA_SEARCH_URL, params=request.query_params, headers=headers)
-            logger.info('Crypta Service returned status %s', resp.status_code)
-            content_type = resp.headers.get('Content-Type', '')
-            data = resp.json() if content_type.startswith('application/json') else resp.text
-            return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+            tree = upstream.executor().submit(_get_crypta_json, CRYPTA_FETCHTREE_URL, params, headers)
+            try:
+                results = _get_crypta_json(CRYPTA_FILTERRESULTS_URL, params, headers)
+            finally:
+                tree = tree.result()
+        except upstream.RequestException as exc:
             logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
             return Response({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        data, status_code = _database_view(tree, results)
+        return Response(data, status=status_code)
 
 class UploadTempView_v1(APIView):
     permission_classes = [permissions.AllowAny]
@@ -471,12 +510,12 @@ class UploadTempView_v1(APIView):
             if 'attachment' in request.FILES:
                 up = request.FILES['attachment']
                 files = {'attachment': (up.name, up.file, up.content_type)}
-            resp = requests.post(CRYPTA_UPLOAD_TMP_URL, files=files)
+            resp = upstream.post(CRYPTA_UPLOAD_TMP_URL, files=files)
             logger.info('Crypta Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
             return Response({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -486,23 +525,14 @@ class SendEmailView_v1(APIView):
 
     def post(self, request, *args, **kwargs):
         logger.debug('Send email request')
-        headers = {}
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                dec = requests.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
-                if dec.status_code == 200:
-                    perms = dec.json().get('queryPermissions', [])
-                    headers['X-Query-Permissions'] = json.dumps(perms)
-            except requests.RequestException as exc:
-                logger.error('Failed to contact auth service: %s', exc, exc_info=True)
+        headers = _permission_headers(request)
         try:
-            resp = requests.post(CRYPTA_SEND_EMAIL_URL, data=request.data, headers=headers)
+            resp = upstream.post(CRYPTA_SEND_EMAIL_URL, data=request.data, headers=headers)
             logger.info('Crypta Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
             return Response({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
@@ -512,23 +542,13 @@ class EmailCountPreviewView_v1(APIView):
 
     def post(self, request, *args, **kwargs):
         logger.debug('Email count preview request')
-        headers = {}
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                dec = requests.post(AUTH_DECODE_URL, headers={'Authorization': auth_header})
-                if dec.status_code == 200:
-                    perms = dec.json().get('queryPermissions', [])
-                    headers['X-Query-Permissions'] = json.dumps(perms)
-            except requests.RequestException as exc:
-                logger.error('Failed to contact auth service: %s', exc, exc_info=True)
-            
+        headers = _permission_headers(request)
         try:
-            resp = requests.post(CRYPTA_EMAIL_COUNT_URL, json=request.data, headers=headers)
+            resp = upstream.post(CRYPTA_EMAIL_COUNT_URL, json=request.data, headers=headers)
             logger.info('Crypta Service returned status %s', resp.status_code)
             content_type = resp.headers.get('Content-Type', '')
             data = resp.json() if content_type.startswith('application/json') else resp.text
             return Response(data, status=resp.status_code)
-        except requests.RequestException as exc:
+        except upstream.RequestException as exc:
             logger.error('Failed to contact crypta service: %s', exc, exc_info=True)
             return Response({'detail': 'Crypta service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
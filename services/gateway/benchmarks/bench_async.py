@@ -0,0 +1,163 @@
+"""Load test of the gateway's sync and async (``GATEWAY_ASYNC``) data views.
+
+Usage::
+
+    python benchmarks/bench_async.py [requests] [latency_ms] [concurrency ...]
+
+Starts a stand-in crypta on localhost that answers ``/api/v1/search`` with a
+small JSON body after ``latency_ms`` (default 50), as a real query would
+take, then runs the gateway twice against it:
+
+* sync: ``manage.py runserver`` as in the Dockerfile, DRF views over the
+  pooled ``requests`` sessions;
+* async: ``uvicorn gateway.asgi:application`` with ``GATEWAY_ASYNC=true``,
+  the views in ``api/async_views.py`` over the shared ``httpx`` clients.
+
+For each concurrency (default 10, 50, 200) ``requests`` searches are sent
+through the gateway, keeping that many in flight. Reported are successful
+requests per second, refused or reset connections, and latency percentiles in
+milliseconds.
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BODY = b'{"results": {"persons": [], "locations": []}, "next_cursor": {"persons": null, "locations": null}}'
+RESPONSE = (b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+            b'Content-Length: %d\r\n\r\n%s' % (len(BODY), BODY))
+
+
+def crypta(port, latency):
+    """Stand-in crypta: a minimal keep-alive HTTP server on asyncio, so the
+    machine's CPU goes to the gateway rather than to the stub."""
+    async def handle(reader, writer):
+        try:
+            while await reader.readuntil(b'\r\n\r\n'):
+                await asyncio.sleep(latency)
+                writer.write(RESPONSE)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=1024)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gateway(mode, port, crypta_url):
+    env = dict(os.environ, CRYPTA_SEARCH_URL=crypta_url, UPSTREAM_POOL_MAXSIZE='256')
+    if mode == 'async':
+        env['GATEWAY_ASYNC'] = 'true'
+        cmd = [sys.executable, '-m', 'uvicorn', 'gateway.asgi:application',
+               '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    else:
+        cmd = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    proc = subprocess.Popen(cmd, cwd=project_root, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/search/?q=warm', timeout=5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} gateway did not start')
+
+
+async def load(port, count, concurrency):
+    """Send ``count`` searches over ``concurrency`` keep-alive connections."""
+    request = (b'GET /search/?q=smith HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n\r\n' % port)
+    latencies = []
+    errors = 0
+    queue = iter(range(count))
+
+    async def send(reader, writer):
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200'), head
+        headers = head.lower()
+        if b'content-length:' in headers:
+            length = int(headers.split(b'content-length:')[1].split(b'\r\n')[0])
+            await reader.readexactly(length)
+        else:
+            # Chunked: read chunks up to the terminating zero-length one.
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+                await reader.readexactly(size + 2)
+                if not size:
+                    break
+        return b'connection: close' not in headers
+
+    async def worker():
+        nonlocal errors
+        connection = None
+        for _ in queue:
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection('127.0.0.1', port)
+                keep_alive = await send(*connection)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Refused or reset by an overloaded gateway.
+                errors += 1
+                keep_alive = False
+            else:
+                latencies.append(time.perf_counter() - start)
+            if not keep_alive and connection is not None:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000  # noqa: E731
+    return len(latencies) / elapsed, errors, statistics.median(latencies) * 1000, pct(0.95), pct(0.99)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    concurrencies = [int(c) for c in sys.argv[3:]] or [10, 50, 200]
+
+    crypta_port = free_port()
+    stub = multiprocessing.Process(target=crypta, args=(crypta_port, latency), daemon=True)
+    stub.start()
+    crypta_url = f'http://127.0.0.1:{crypta_port}/api/v1/search'
+
+    print(f'{count} searches per run, crypta latency {latency * 1000:.0f} ms')
+    print(f'{"mode":<6} {"in flight":>9} {"req/s":>8} {"errors":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for mode in ('sync', 'async'):
+        port = free_port()
+        proc = start_gateway(mode, port, crypta_url)
+        try:
+            for concurrency in concurrencies:
+                rate, errors, p50, p95, p99 = asyncio.run(load(port, count, concurrency))
+                print(f'{mode:<6} {concurrency:>9} {rate:>8.0f} {errors:>7} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}')
+        finally:
+            proc.terminate()
+            proc.wait()
+    stub.terminate()
+
+
+if __name__ == '__main__':
+    main()
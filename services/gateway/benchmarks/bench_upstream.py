@@ -0,0 +1,100 @@
+"""Throughput of proxied upstream calls: bare ``requests`` vs pooled sessions.
+
+Usage::
+
+    python benchmarks/bench_upstream.py [requests] [threads]
+
+Starts a keep-alive HTTP server on localhost that answers every request with
+a small JSON body, then sends it ``requests`` GETs the way the gateway views
+used to (``requests.get``, a new connection each time) and the way they do
+now (:func:`api.upstream.get`, connections reused from the pool). Each client
+runs once sequentially and once from ``threads`` worker threads, as under a
+threaded WSGI server. Figures are requests per second, best of three runs.
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Add the project root so ``gateway`` can be imported when executing the
+# benchmark directly.
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gateway.settings')
+django.setup()
+
+import logging  # noqa: E402
+
+import requests  # noqa: E402
+
+from api import upstream  # noqa: E402
+
+logging.getLogger('api').setLevel(logging.WARNING)
+
+BODY = b'{"results": {"persons": [], "locations": []}}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # kept-alive response waits on a delayed ACK, as it would not behind
+    # gunicorn or uWSGI.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def throughput(get, url, count, threads):
+    def call(_):
+        resp = get(url, timeout=10)
+        resp.json()
+        return resp.status_code
+
+    best = 0.0
+    for _ in range(3):
+        start = time.perf_counter()
+        if threads == 1:
+            codes = [call(i) for i in range(count)]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                codes = list(pool.map(call, range(count)))
+        elapsed = time.perf_counter() - start
+        assert codes == [200] * count
+        best = max(best, count / elapsed)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/v1/search'
+
+    print(f'{count} GETs per run, {threads} threads for the concurrent runs')
+    print(f'{"client":<20} {"sequential":>14} {"concurrent":>14}')
+    for name, get in [('requests.get', requests.get), ('upstream.get', upstream.get)]:
+        sequential = throughput(get, url, count, 1)
+        concurrent = throughput(get, url, count, threads)
+        print(f'{name:<20} {sequential:>10.0f} r/s {concurrent:>10.0f} r/s')
+
+    upstream.close_sessions()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gateway.settings')
 
 application = get_asgi_application()
+
+if settings.GATEWAY_ASYNC:
+    from api.async_views import dispatch
+
+    # The crypta data views skip the sync middleware (see api/async_views.py).
+    application = dispatch(application)
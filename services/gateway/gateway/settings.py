@@ -79,8 +79,8 @@ ALLOWED_HOSTS = ['*']
 # https://www.django-rest-framework.org/api-guide/authentication/#json-web-token-authentication
 # https://django-rest-framework-simplejwt.readthedocs.io/en/latest/getting_started.html
 REST_FRAMEWORK = {
-    # Gateway should not validate JWT tokens itself. Authentication is
-    # delegated to the Auth service which exposes a decode endpoint.
+    # DRF authentication stays off: the data views read the caller's query
+    # permissions from the bearer token through api/tokens.py.
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -92,6 +92,49 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Access token verification (see api/tokens.py)
+# AUTH_JWT_SIGNING_KEY is the auth service's JWT_SIGNING_KEY (its SECRET_KEY
+# by default) for HS256 tokens; retired keys are comma separated in
+# AUTH_JWT_PREVIOUS_SIGNING_KEYS. Leave both empty, and AUTH_JWKS_URL unset,
+# to have the auth service decode every token instead.
+AUTH_JWT_SIGNING_KEY = os.getenv('AUTH_JWT_SIGNING_KEY', '')
+AUTH_JWT_PREVIOUS_SIGNING_KEYS = [key for key in os.getenv('AUTH_JWT_PREVIOUS_SIGNING_KEYS', '').split(',') if key]
+AUTH_JWT_ALGORITHMS = os.getenv('AUTH_JWT_ALGORITHMS', 'HS256,RS256,ES256').split(',')
+AUTH_JWKS_TTL = int(os.getenv('AUTH_JWKS_TTL', '300'))
+AUTH_REVOCATION_TTL = int(os.getenv('AUTH_REVOCATION_TTL', '30'))
+# Sent as X-Service-Key when fetching the revocation list; the auth
+# service's REVOCATION_LIST_KEY.
+AUTH_REVOCATION_LIST_KEY = os.getenv('AUTH_REVOCATION_LIST_KEY', '')
+# Decoded claims are cached per token for at most AUTH_TOKEN_CACHE_TTL seconds
+# (never past the token's exp), for up to AUTH_TOKEN_CACHE_SIZE tokens.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', '60'))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '1024'))
+
+# Upstream connection pools (see api/upstream.py)
+# One pool per upstream host; POOL_MAXSIZE is the number of connections kept
+# alive to each host and should match the number of worker threads.
+UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', '4'))
+UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', '32'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '60'))
+# Retries apply to idempotent methods only (GET, HEAD, PUT, DELETE, ...).
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv('UPSTREAM_RETRY_BACKOFF', '0.2'))
+# Worker threads shared by views that call upstreams side by side.
+UPSTREAM_EXECUTOR_WORKERS = int(os.getenv('UPSTREAM_EXECUTOR_WORKERS', '16'))
+# In-flight requests per upstream in async mode; requests over the limit wait
+# for a connection.
+UPSTREAM_ASYNC_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_ASYNC_MAX_CONNECTIONS', '256'))
+# Clients each async upstream pool is split across; the connection limits are
+# divided between them.
+UPSTREAM_ASYNC_SHARDS = int(os.getenv('UPSTREAM_ASYNC_SHARDS', '8'))
+
+# Async gateway mode: serve the crypta data views (filter tree and results,
+# search, aggregate, time series, database view) from api/async_views.py. Only
+# for ASGI, e.g.
+#   GATEWAY_ASYNC=true uvicorn gateway.asgi:application --port 3000
+GATEWAY_ASYNC = os.getenv('GATEWAY_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -24,6 +24,7 @@ from api.views import (
     RolesView_v1,
     RoleDetailView_v1,
     TokensView_v1,
+    TokenCacheView_v1,
     OrganizationsView_v1,
     OrganizationDetailView_v1,
     LoginAttemptsView_v1,
@@ -37,6 +38,9 @@ from api.views import (
     FilterTreeView_v1,
     FilterResultsView_v1,
     SearchResultsView_v1,
+    AggregateView_v1,
+    TimeSeriesView_v1,
+    DatabaseView_v1,
     UploadTempView_v1,
     SendEmailView_v1,
     EmailCountPreviewView_v1,
@@ -51,6 +55,7 @@ urlpatterns = [
     path('roles/create/', RoleDetailView_v1.as_view(), name='roles-create'),
     path('roles/<int:pk>/', RoleDetailView_v1.as_view(), name='role-detail'),
     path('tokens/', TokensView_v1.as_view(), name='tokens'),
+    path('tokens/cache/', TokenCacheView_v1.as_view(), name='token_cache'),
     path('organizations/', OrganizationsView_v1.as_view(), name='organizations'),
     path('organizations/create/', OrganizationDetailView_v1.as_view(), name='organization-detail'),
     path('organizations/<int:pk>/', OrganizationDetailView_v1.as_view(), name='organization-detail'),
@@ -72,6 +77,9 @@ urlpatterns = [
     path('filter_tree/', FilterTreeView_v1.as_view(), name='filter_tree'),
     path('filter_results/', FilterResultsView_v1.as_view(), name='filter_results'),
     path('search/', SearchResultsView_v1.as_view(), name='search'),
+    path('aggregate/', AggregateView_v1.as_view(), name='aggregate'),
+    path('timeseries/', TimeSeriesView_v1.as_view(), name='timeseries'),
+    path('database_view/', DatabaseView_v1.as_view(), name='database_view'),
     path('upload-tmp/', UploadTempView_v1.as_view(), name='upload_tmp'),
     path('send-email/', SendEmailView_v1.as_view(), name='send_email'),
     path('email-count-preview/', EmailCountPreviewView_v1.as_view(), name='email_count_preview'),